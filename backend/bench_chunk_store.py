@@ -0,0 +1,94 @@
+"""
+Memory benchmark: columnar ChunkStore vs. the previous list of chunk dicts.
+
+Builds synthetic workspaces the way an upload does (~256-token chunks with
+hashes, offsets and pages), loads the dict version from JSON exactly like
+the old workspace.json loader, and reports resident bytes per chunk for
+both layouts, measured with tracemalloc. Also times a retrieval-sized read
+(decoding texts and previews for 20 random rows).
+
+Usage (from backend/):
+    python bench_chunk_store.py [chunks] [workspaces]
+"""
+
+import gc
+import hashlib
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from services.chunk_store import ChunkStore
+
+WORDS = (
+    "cell membrane transport energy mitochondria enzyme protein synthesis gradient diffusion "
+    "osmosis respiration glucose chlorophyll nucleus ribosome genotype phenotype allele meiosis"
+).split()
+
+
+def make_records(count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    records = []
+    offset = 0
+    for i in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(150)) + "."
+        records.append(
+            {
+                "namespace": "student_index",
+                "text": text,
+                "content_hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                "start": offset,
+                "end": offset + len(text),
+                "page": 1 + i // 4,
+                "page_end": 1 + i // 4,
+                "chunk_id": i + 1,
+                "doc_id": f"{seed:016x}",
+            }
+        )
+        offset += len(text) - 120
+    return records
+
+
+def measure(build) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, value
+
+
+def read_time(get_text, get_preview, count: int) -> float:
+    rows = random.Random(1).sample(range(count), min(20, count))
+    t0 = time.perf_counter()
+    for _ in range(50):
+        for row in rows:
+            get_text(row)
+            get_preview(row)
+    return (time.perf_counter() - t0) / 50
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    workspaces = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    payloads = [json.dumps({"chunks": make_records(count, seed)}) for seed in range(workspaces)]
+    text_bytes = sum(len(r["text"].encode("utf-8")) for r in make_records(count, 0))
+
+    dict_size, dicts = measure(lambda: [json.loads(p)["chunks"] for p in payloads])
+    store_size, stores = measure(
+        lambda: [ChunkStore.from_records(json.loads(p)["chunks"]) for p in payloads]
+    )
+    dict_read = read_time(lambda r: dicts[0][r]["text"], lambda r: dicts[0][r]["text"][:220], count)
+    store_read = read_time(stores[0].text, stores[0].preview, count)
+
+    per_chunk = count * workspaces
+    print(f"{workspaces} workspaces x {count} chunks, {text_bytes / count:.0f} bytes of text per chunk")
+    print(f"{'layout':<16}{'bytes/chunk':>14}{'overhead/chunk':>16}{'total MB':>12}{'20-row read':>14}")
+    for label, size, read in (("list of dicts", dict_size, dict_read), ("ChunkStore", store_size, store_read)):
+        print(
+            f"{label:<16}{size / per_chunk:>14.0f}{size / per_chunk - text_bytes / count:>16.0f}"
+            f"{size / 1e6:>12.1f}{read * 1e6:>11.0f} us"
+        )
+    print(f"reduction: {dict_size / store_size:.2f}x")
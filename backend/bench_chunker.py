@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: token-aware chunker vs. the previous word-split chunker.
+
+Usage (from backend/):
+    python bench_chunker.py [size_in_bytes]
+"""
+
+import random
+import re
+import sys
+import time
+
+from services.chunker import chunk_document, count_tokens
+
+TARGET_TOKENS = 256
+OVERLAP_TOKENS = 48
+WORDS = (
+    "photosynthesis converts light energy into chemical energy stored in glucose "
+    "mitochondria produce adenosine triphosphate through oxidative phosphorylation "
+    "the cell membrane regulates transport of ions and molecules enzymes lower "
+    "activation energy of biochemical reactions"
+).split()
+
+
+def _legacy_split_sentences(text: str) -> list[str]:
+    parts = re.split(r"(?<=[.!?])\s+|\n+", text)
+    return [p.strip() for p in parts if p and p.strip()]
+
+
+def legacy_chunk_text(text: str, target_tokens: int = 500, overlap: int = 60) -> list[str]:
+    """The original student_routes._chunk_text implementation."""
+    sentences = _legacy_split_sentences(text)
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for sentence in sentences:
+        sent_tokens = max(1, len(sentence.split()))
+        if current and current_tokens + sent_tokens > target_tokens:
+            chunks.append(" ".join(current).strip())
+            overlap_words = " ".join(current).split()[-overlap:]
+            current = [" ".join(overlap_words)] if overlap_words else []
+            current_tokens = len(overlap_words)
+        current.append(sentence)
+        current_tokens += sent_tokens
+    if current:
+        chunks.append(" ".join(current).strip())
+    return [c for c in chunks if c]
+
+
+def make_document(size: int) -> str:
+    rng = random.Random(42)
+    parts: list[str] = []
+    total = 0
+    while total < size:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 30)))
+        sentence = sentence.capitalize() + rng.choice([". ", "? ", ".\n", "! "])
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)[:size]
+
+
+def bench(label: str, fn, text: str, repeat: int = 3) -> list:
+    best = float("inf")
+    result = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - t0)
+    mb = len(text.encode()) / 1_000_000
+    print(f"{label:<12} {best * 1000:9.1f} ms  {mb / best:7.2f} MB/s  {len(result):6d} chunks")
+    return result
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    doc = make_document(size)
+    page_len = max(1, len(doc) // 50)
+    page_starts = list(range(0, len(doc), page_len))
+    print(f"Document: {len(doc):,} chars")
+
+    legacy = bench("legacy", legacy_chunk_text, doc)
+    fast = bench(
+        "token-aware",
+        lambda t: chunk_document(t, TARGET_TOKENS, OVERLAP_TOKENS, page_starts=page_starts),
+        doc,
+    )
+
+    over = sum(1 for c in legacy if count_tokens(c) > TARGET_TOKENS)
+    print(f"legacy chunks over the {TARGET_TOKENS}-token model limit: {over}/{len(legacy)}")
+    print(f"token-aware max chunk tokens: {max(c['tokens'] for c in fast)}")
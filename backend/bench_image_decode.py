@@ -0,0 +1,96 @@
+"""
+Benchmark: image decoding for the authenticity heuristic.
+
+Compares the previous inline decode (full-resolution ``convert("RGB")`` and
+``resize``) with the draft-mode decode used now, which also extracts the
+local forensic features, for synthetic 4K and 20MP JPEGs and a 4K PNG.
+Reports per-image latency, and the longest event-loop stall while 8
+requests are served concurrently — decoded inline on the loop (before) vs.
+in the decode pool (after).
+
+Usage (from backend/):
+    python bench_image_decode.py [repeats]
+"""
+
+import asyncio
+import io
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from image_detector_routes import THUMBNAIL_SIZE, _decode_image, _decode_off_loop
+
+SIZES = {"4K": (3840, 2160), "20MP": (5472, 3648)}
+CONCURRENT_REQUESTS = 8
+
+
+def make_image(size: tuple[int, int], fmt: str) -> bytes:
+    width, height = size
+    rng = np.random.default_rng(0)
+    # Smooth gradients plus fine noise, so the encoder does real work.
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, fmt, quality=90)  # quality is ignored for PNG
+    return buffer.getvalue()
+
+
+def legacy_decode(image_bytes: bytes) -> np.ndarray:
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    return np.asarray(img.resize(THUMBNAIL_SIZE))
+
+
+def latency(fn, image_bytes: bytes, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(image_bytes)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+async def max_loop_stall(handler, image_bytes: bytes) -> float:
+    """Longest gap between 1ms ticks of a heartbeat task while requests run."""
+    stall = 0.0
+    done = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    await asyncio.gather(*(handler(image_bytes) for _ in range(CONCURRENT_REQUESTS)))
+    done.set()
+    await beat
+    return stall
+
+
+async def inline_handler(image_bytes: bytes) -> np.ndarray:
+    return legacy_decode(image_bytes)
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    cases = [(f"{label} JPEG", make_image(size, "JPEG")) for label, size in SIZES.items()]
+    cases.append(("4K PNG", make_image(SIZES["4K"], "PNG")))
+
+    print(f"{'input':<12}{'bytes':>11}{'legacy ms':>12}{'draft ms':>11}{'loop stall before':>20}{'after':>10}")
+    for label, image_bytes in cases:
+        before = latency(legacy_decode, image_bytes, repeats)
+        after = latency(_decode_image, image_bytes, repeats)
+        stall_before = asyncio.run(max_loop_stall(inline_handler, image_bytes))
+        stall_after = asyncio.run(max_loop_stall(_decode_off_loop, image_bytes))
+        print(
+            f"{label:<12}{len(image_bytes):>11}{before * 1000:>12.1f}{after * 1000:>11.1f}"
+            f"{stall_before * 1000:>17.1f} ms{stall_after * 1000:>7.1f} ms"
+        )
@@ -0,0 +1,135 @@
+"""
+Accuracy and latency harness for the local (offline) AI-image detector.
+
+Expects a labeled folder with one subfolder per class:
+    <folder>/ai/...    (also accepted: fake, generated, synthetic)
+    <folder>/real/...  (also accepted: authentic, camera)
+
+Reports accuracy, precision/recall for the AI class and per-image latency of
+decoding + feature extraction and of the model, for the local detector and
+for the previous two-statistic heuristic. With ``--train``, fits the
+logistic model (standardization, L2-regularized gradient descent), reports
+5-fold cross-validated accuracy and writes the weights as JSON for
+IMAGE_DETECTOR_WEIGHTS.
+
+Usage (from backend/):
+    python bench_image_detector.py <folder> [--weights weights.json] [--train weights.json]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from image_detector_routes import _decode_image
+from services.image_forensics import CLIP_Z, LinearDetector, load_detector
+
+LABELS = {
+    "ai": 1, "fake": 1, "generated": 1, "synthetic": 1,
+    "real": 0, "authentic": 0, "camera": 0,
+}
+EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+
+def load_folder(folder: Path) -> tuple[list[Path], np.ndarray]:
+    paths, labels = [], []
+    for sub in sorted(p for p in folder.iterdir() if p.is_dir()):
+        label = LABELS.get(sub.name.lower())
+        if label is None:
+            continue
+        for path in sorted(sub.rglob("*")):
+            if path.suffix.lower() in EXTENSIONS:
+                paths.append(path)
+                labels.append(label)
+    return paths, np.asarray(labels, dtype=np.int64)
+
+
+def legacy_scores(thumbnails: np.ndarray) -> np.ndarray:
+    """The original edge-density / colour-variance heuristic."""
+    arr = thumbnails.astype(np.float32)
+    gray = arr @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    edge = (np.abs(np.diff(gray, axis=2)).mean(axis=(1, 2)) + np.abs(np.diff(gray, axis=1)).mean(axis=(1, 2))) / 2
+    color_std = arr.reshape(arr.shape[0], -1).std(axis=1)
+    return np.clip(0.5 + (edge - 12.0) / 50.0 - (color_std - 50.0) / 200.0, 0.15, 0.85)
+
+
+def report(name: str, probabilities: np.ndarray, labels: np.ndarray) -> None:
+    predicted = probabilities >= 0.5
+    truth = labels == 1
+    accuracy = float((predicted == truth).mean())
+    precision = float((predicted & truth).sum() / max(1, predicted.sum()))
+    recall = float((predicted & truth).sum() / max(1, truth.sum()))
+    print(f"{name:<22}{accuracy:>10.3f}{precision:>11.3f}{recall:>9.3f}")
+
+
+def fit(features: np.ndarray, labels: np.ndarray, l2: float = 0.01, steps: int = 3000) -> LinearDetector:
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0) + 1e-6
+    x = np.clip((features - mean) / scale, -CLIP_Z, CLIP_Z)  # as LinearDetector scores them
+    weights = np.zeros(x.shape[1], dtype=np.float64)
+    bias = 0.0
+    rate = 0.5
+    for _ in range(steps):
+        p = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+        error = p - labels
+        weights -= rate * (x.T @ error / len(labels) + l2 * weights)
+        bias -= rate * float(error.mean())
+    return LinearDetector(mean, scale, weights, bias)
+
+
+def cross_validate(features: np.ndarray, labels: np.ndarray, folds: int = 5) -> float:
+    order = np.random.default_rng(0).permutation(len(labels))
+    correct = 0
+    for fold in np.array_split(order, folds):
+        train = np.setdiff1d(order, fold)
+        model = fit(features[train], labels[train])
+        correct += int(((model.predict(features[fold]) >= 0.5) == (labels[fold] == 1)).sum())
+    return correct / len(labels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", type=Path)
+    parser.add_argument("--weights", help="detector weights JSON (default: IMAGE_DETECTOR_WEIGHTS or priors)")
+    parser.add_argument("--train", help="fit weights on the folder and write them to this path")
+    args = parser.parse_args()
+
+    paths, labels = load_folder(args.folder)
+    if not paths:
+        raise SystemExit(f"No labeled images under {args.folder} (expected ai/ and real/ subfolders).")
+
+    thumbnails, features, decode_times = [], [], []
+    for path in paths:
+        data = path.read_bytes()
+        t0 = time.perf_counter()
+        thumbnail, vector = _decode_image(data)
+        decode_times.append(time.perf_counter() - t0)
+        thumbnails.append(thumbnail)
+        features.append(vector)
+    thumbnails = np.stack(thumbnails)
+    features = np.stack(features)
+
+    detector = LinearDetector.from_file(args.weights) if args.weights else load_detector()
+    t0 = time.perf_counter()
+    probabilities = detector.predict(features)
+    model_time = (time.perf_counter() - t0) / len(paths)
+
+    print(f"{len(paths)} images ({int(labels.sum())} AI, {int((labels == 0).sum())} real)")
+    print(f"{'detector':<22}{'accuracy':>10}{'precision':>11}{'recall':>9}")
+    report("legacy heuristic", legacy_scores(thumbnails), labels)
+    report("local detector", probabilities, labels)
+    print(
+        f"decode+features: p50 {np.percentile(decode_times, 50) * 1000:.1f} ms, "
+        f"p95 {np.percentile(decode_times, 95) * 1000:.1f} ms; model: {model_time * 1e6:.1f} us/image"
+    )
+
+    if args.train:
+        if len(set(labels.tolist())) < 2:
+            raise SystemExit("Training needs both AI and real images.")
+        print(f"5-fold cross-validated accuracy of a fitted model: {cross_validate(features, labels):.3f}")
+        model = fit(features, labels)
+        Path(args.train).write_text(json.dumps(model.to_dict(), indent=2))
+        report("fitted (train set)", model.predict(features), labels)
+        print(f"Wrote {args.train}; set IMAGE_DETECTOR_WEIGHTS={args.train} to use it.")
@@ -0,0 +1,122 @@
+"""
+Micro-benchmark: single-pass JSON extraction vs. the previous regex parsers.
+
+Runs every parser over adversarial ~50KB LLM outputs (unbalanced braces,
+braces inside strings, deep nesting, prose wrapped around the answer) and
+checks that the new extractor finds the same object as the old parsers.
+
+Usage (from backend/):
+    python bench_json_extract.py [size_in_bytes]
+"""
+
+import json
+import re
+import sys
+import time
+
+from utils.json_extract import JSONObjectScanner, extract_json_object
+
+ANSWER = '{"label": "Fake", "confidence": 0.91, "reasoning_summary": "No credible source {cited}."}'
+
+
+def legacy_classifier(text: str) -> dict | None:
+    """The JSON strategies of the original classifier._extract_json."""
+    text = text.strip()
+    if "```" in text:
+        for part in text.split("```"):
+            part = part.strip()
+            if part.startswith("json"):
+                part = part[4:].strip()
+            if part.startswith("{"):
+                try:
+                    return json.loads(part)
+                except json.JSONDecodeError:
+                    pass
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    for m in re.findall(r"\{[^{}]*\}", text):
+        try:
+            return json.loads(m)
+        except json.JSONDecodeError:
+            pass
+    start = text.find("{")
+    end = text.rfind("}") + 1
+    if start != -1 and end > start:
+        try:
+            return json.loads(text[start:end])
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def legacy_student(text: str) -> dict | None:
+    """The original student_routes._extract_json_blob."""
+    fenced = re.findall(r"```json\s*(\{.*?\})\s*```", text, flags=re.DOTALL | re.IGNORECASE)
+    candidates = fenced if fenced else re.findall(r"(\{.*\})", text, flags=re.DOTALL)
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def make_inputs(size: int) -> dict[str, str]:
+    filler = "The claim circulates widely. " * (size // 29)
+    return {
+        "prose+answer": filler + ANSWER,
+        "open braces": "{ " * (size // 2) + ANSWER,
+        "no closing brace": "{ label: Fake " * (size // 14),
+        "fence no close": "```json\n" + "{ \"a\": [" * (size // 9) + "\n```\n" + ANSWER,
+        "flat junk": "{x} " * (size // 4) + ANSWER,
+        "braces in string": '{"note": "' + "} { " * (size // 4) + '", "label": "Real"}',
+        "deep nesting": '{"a":' * (size // 10) + "1" + "}" * (size // 10),
+    }
+
+
+def stream_extract(text: str, piece: int = 4) -> dict | None:
+    scanner = JSONObjectScanner()
+    for i in range(0, len(text), piece):
+        objects = scanner.feed(text[i : i + piece])
+        if objects:
+            return objects[0]
+    objects = scanner.close()
+    return objects[0] if objects else None
+
+
+def bench(fn, text: str, repeat: int = 3) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        try:
+            result = fn(text)
+        except RecursionError:
+            result = "RecursionError"
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _found(result) -> str:
+    if isinstance(result, dict):
+        return "ok" if result.get("label") in ("Fake", "Real") else "other"
+    return "none" if result is None else str(result)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    parsers = [
+        ("legacy classifier", legacy_classifier),
+        ("legacy student", legacy_student),
+        ("single-pass", extract_json_object),
+        ("single-pass stream", stream_extract),
+    ]
+    print(f"{'input':<18}" + "".join(f"{name:>22}" for name, _ in parsers))
+    for label, text in make_inputs(size).items():
+        cells = []
+        for _, fn in parsers:
+            elapsed, result = bench(fn, text)
+            cells.append(f"{elapsed * 1000:9.2f} ms {_found(result):>9}")
+        print(f"{label:<18}" + "".join(f"{c:>22}" for c in cells))
@@ -1,74 +1,118 @@
 """
 AI Image Authenticity Detector routes.
-Provides a lightweight endpoint to classify images as AI-generated or Real.
+Provides a lightweight endpoint to classify images as AI-generated or Real,
+and a batch endpoint that checks many images in one request.
 """
 
 from __future__ import annotations
 
+import asyncio
 import io
 import os
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 
 import httpx
 import numpy as np
 from fastapi import APIRouter, File, HTTPException, UploadFile
 from PIL import Image
 
+from services.image_forensics import analysis_crop, image_features, load_detector
+from services.image_forensics import verdict as forensic_verdict
+from services.image_hash_cache import PerceptualHashCache, dhash
+from services.image_metadata import ProvenanceFinding, scan_provenance
+from services.image_preprocess import MODEL_INPUT_SIZE, PreparedImage, prepare_for_detector, preprocess_stats
+from utils.uploads import IMAGE_TYPES, MAX_IMAGE_UPLOAD_BYTES, Upload, read_upload
+
 router = APIRouter(prefix="/api/image", tags=["image-detector"])
 
 HF_API_KEY = os.getenv("HF_API_KEY")
 HF_MODEL_ID = "dima806/deepfake_vs_real_image_detection"
 HF_ENDPOINT = f"https://api-inference.huggingface.co/models/{HF_MODEL_ID}"
 
+THUMBNAIL_SIZE = (128, 128)
+MAX_BATCH_IMAGES = int(os.getenv("IMAGE_BATCH_MAX_FILES", "50"))
+HF_CONCURRENCY = int(os.getenv("IMAGE_HF_CONCURRENCY", "4"))
+DECODE_WORKERS = int(os.getenv("IMAGE_DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_HASH_CACHE_SIZE = int(os.getenv("IMAGE_HASH_CACHE_SIZE", "10000"))
+IMAGE_HASH_THRESHOLD = int(os.getenv("IMAGE_HASH_THRESHOLD", "6"))
+IMAGE_HASH_CACHE_PATH = os.getenv("IMAGE_HASH_CACHE_PATH", "").strip()
+
+# Pillow releases the GIL while decoding and resampling, so threads scale.
+_decode_pool = ThreadPoolExecutor(max_workers=max(1, DECODE_WORKERS), thread_name_prefix="image-decode")
+# Verdicts by perceptual hash, so recompressed or resized copies skip inference.
+_verdict_cache = PerceptualHashCache(IMAGE_HASH_CACHE_SIZE, IMAGE_HASH_THRESHOLD, IMAGE_HASH_CACHE_PATH or None)
+# Offline detector for when the HF model is unavailable (IMAGE_DETECTOR_WEIGHTS overrides the priors).
+_detector = load_detector()
 
-def _validate_image(file: UploadFile) -> bytes:
+
+async def _validate_image(file: UploadFile) -> Upload:
     if file is None:
         raise HTTPException(status_code=400, detail="No image uploaded.")
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Invalid file type. Please upload an image.")
-    content = file.file.read()
-    if not content:
-        raise HTTPException(status_code=400, detail="Empty file uploaded.")
-    return content
+    return await read_upload(
+        file, MAX_IMAGE_UPLOAD_BYTES, IMAGE_TYPES, unsupported_detail="Invalid file type. Please upload an image."
+    )
 
 
-def _heuristic_detector(image_bytes: bytes) -> Tuple[str, int, str]:
+def _decode_image(image: bytes | Upload) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode an image into its RGB thumbnail (uint8) and local forensic features."""
+    thumbnail, features, _ = _decode_for_check(image, for_model=False)
+    return thumbnail, features
+
+
+def _decode_for_check(image: bytes | Upload, for_model: bool) -> Tuple[np.ndarray, np.ndarray, PreparedImage | None]:
     """
-    Lightweight heuristic fallback if HF API is unavailable.
-    Uses edge density and color variance to produce a low-confidence guess.
+    Decode once for everything a check needs: the thumbnail, the local
+    forensic features and, with ``for_model``, the model-input-sized copy
+    posted to the HF model instead of the original file.
+
+    The forensic crop is always cut from the native-resolution pixels. For
+    the thumbnail and the model input, JPEGs are then decoded a second time
+    at 1/2, 1/4 or 1/8 scale via draft mode, never below what the model input
+    needs, and other formats are box-reduced by an integer factor before the
+    thumbnail resample, so a 20MP photo never has to be resampled at full
+    resolution.
     """
     try:
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        with io.BytesIO(image) if isinstance(image, bytes) else image.open() as stream:
+            img = Image.open(stream)
+            quantization = getattr(img, "quantization", None)
+            gray = analysis_crop(img)
+            if img.format == "JPEG":
+                stream.seek(0)
+                img = Image.open(stream)
+                img.draft("RGB", (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+            img = img.convert("RGB")
+        thumbnail = np.asarray(img.resize(THUMBNAIL_SIZE, reducing_gap=2.0))
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Invalid image file: {exc}")
+    model_input = None
+    if for_model:
+        model_input = prepare_for_detector(img, len(image) if isinstance(image, bytes) else image.size)
+    return thumbnail, image_features(gray, thumbnail, quantization), model_input
 
-    img_small = img.resize((128, 128))
-    arr = np.asarray(img_small).astype(np.float32)
-    gray = np.asarray(img_small.convert("L")).astype(np.float32)
-
-    gx = np.abs(np.diff(gray, axis=1))
-    gy = np.abs(np.diff(gray, axis=0))
-    edge_score = float((gx.mean() + gy.mean()) / 2.0)
-    color_std = float(np.std(arr))
 
-    # Normalize into a soft AI likelihood
-    ai_score = 0.5 + (edge_score - 12.0) / 50.0 - (color_std - 50.0) / 200.0
-    ai_score = max(0.15, min(0.85, ai_score))
+async def _decode_off_loop(image: bytes | Upload) -> Tuple[np.ndarray, np.ndarray, PreparedImage | None]:
+    """Run ``_decode_for_check`` in the decode pool so the event loop keeps serving."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_decode_pool, _decode_for_check, image, bool(HF_API_KEY))
 
-    if ai_score >= 0.5:
-        confidence = int(round(ai_score * 100))
-        explanation = (
-            "Heuristic scan detected higher edge density and lower color variance, "
-            "which can align with synthetic generation patterns."
-        )
-        return "AI-generated", confidence, explanation
 
-    confidence = int(round((1.0 - ai_score) * 100))
-    explanation = (
-        "Heuristic scan detected natural texture variation and color dispersion, "
-        "which often aligns with real-world imagery."
-    )
-    return "Real", confidence, explanation
+def _local_verdicts(features: np.ndarray) -> list[dict]:
+    """
+    Offline verdicts for a stacked (N, F) feature matrix, in one model
+    evaluation. Verdicts of the untrained built-in priors carry
+    ``"heuristic": True``.
+    """
+    probabilities = _detector.predict(features)
+    results = []
+    for row, probability in zip(features, probabilities):
+        classification, confidence, explanation = forensic_verdict(_detector, row, float(probability))
+        result = {"classification": classification, "confidence": confidence, "explanation": explanation}
+        if not _detector.trained:
+            result["heuristic"] = True
+        results.append(result)
+    return results
 
 
 def _map_hf_label(label: str) -> str:
@@ -78,44 +122,211 @@ def _map_hf_label(label: str) -> str:
     return "Real"
 
 
+async def _hf_classify(client: httpx.AsyncClient, image_bytes: bytes) -> dict | None:
+    """Classify with the HF model; None when the call fails or returns nothing usable."""
+    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
+    try:
+        response = await client.post(HF_ENDPOINT, headers=headers, content=image_bytes)
+        if response.status_code >= 400:
+            return None
+        payload = response.json()
+    except Exception:
+        return None
+    if not isinstance(payload, list) or not payload:
+        return None
+
+    top = max(payload, key=lambda item: item.get("score", 0))
+    label = _map_hf_label(str(top.get("label", "Real")))
+    confidence = int(round(float(top.get("score", 0.5)) * 100))
+    explanation = (
+        "Model detected visual cues consistent with synthetic generation."
+        if label == "AI-generated"
+        else "Model detected natural texture and lighting distributions typical of real images."
+    )
+    return {
+        "classification": label,
+        "confidence": confidence,
+        "explanation": explanation,
+    }
+
+
+def _provenance_verdict(finding: ProvenanceFinding) -> dict:
+    return {
+        "classification": "AI-generated",
+        "confidence": finding.confidence,
+        "explanation": finding.explanation,
+        "provenance": finding.markers,
+    }
+
+
+def _from_model(verdict: dict) -> bool:
+    return verdict.get("source") == "model"
+
+
+def _cached_verdict(image_hash: int | None) -> dict | None:
+    """
+    Cached verdict of a near-duplicate image. While the HF model is
+    configured, only verdicts it produced are reused; local ones (and
+    entries written before sources were recorded) are passed over.
+    """
+    if image_hash is None:
+        return None
+    found = _verdict_cache.get(image_hash, accept=_from_model if HF_API_KEY else None)
+    if found is None:
+        return None
+    verdict, _distance = found
+    return {**{k: v for k, v in verdict.items() if k != "source"}, "cached": True}
+
+
+def _remember_verdict(image_hash: int | None, verdict: dict, from_model: bool) -> None:
+    # Local guesses are only cached when there is no model to ask instead.
+    if image_hash is not None and (from_model or not HF_API_KEY):
+        _verdict_cache.put(image_hash, {**verdict, "source": "model" if from_model else "local"})
+
+
+async def _check_upload(upload: Upload) -> dict:
+    """Verdict for one validated upload: provenance, cache, HF model, then the local detector."""
+    finding = scan_provenance(upload.head)
+    if finding is not None:
+        return _provenance_verdict(finding)
+
+    try:
+        (thumbnail, features, model_input), decode_error = await _decode_off_loop(upload), None
+    except HTTPException as exc:
+        # The model may still read formats Pillow cannot.
+        thumbnail, features, model_input, decode_error = None, None, None, exc
+    image_hash = dhash(thumbnail) if thumbnail is not None else None
+
+    cached = _cached_verdict(image_hash)
+    if cached is not None:
+        return cached
+
+    # Use HF inference API when available
+    if HF_API_KEY:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            result = await _hf_classify(client, model_input.data if model_input else upload.to_bytes())
+        if result is not None:
+            _remember_verdict(image_hash, result, from_model=True)
+            return result
+
+    # Local forensic detector when no HF API key or inference fails
+    if thumbnail is None:
+        raise decode_error
+    result = _local_verdicts(features[np.newaxis])[0]
+    _remember_verdict(image_hash, result, from_model=False)
+    return result
+
+
+async def _check_uploads(contents: list[Upload | None], results: list[dict]) -> None:
+    """Fill ``results`` for the uploads still without a verdict (``None`` entries are skipped)."""
+    pending = [i for i, content in enumerate(contents) if content is not None]
+    decoded = await asyncio.gather(*(_decode_off_loop(contents[i]) for i in pending), return_exceptions=True)
+    features: dict[int, np.ndarray] = {}
+    hashes: dict[int, int] = {}
+    model_inputs: dict[int, PreparedImage] = {}
+    undecoded: dict[int, str] = {}
+    for i, outcome in zip(pending, decoded):
+        if isinstance(outcome, HTTPException):
+            undecoded[i] = outcome.detail
+        elif isinstance(outcome, BaseException):
+            undecoded[i] = f"Invalid image file: {outcome}"
+        else:
+            thumbnail, features[i], model_inputs[i] = outcome
+            hashes[i] = dhash(thumbnail)
+            cached = _cached_verdict(hashes[i])
+            if cached is not None:
+                results[i].update(cached)
+                del features[i]
+
+    if HF_API_KEY and (features or undecoded):
+        semaphore = asyncio.Semaphore(max(1, HF_CONCURRENCY))
+
+        async def classify(client: httpx.AsyncClient, i: int) -> None:
+            # The model may still read formats Pillow cannot, so undecoded uploads go as they are.
+            image_bytes = model_inputs[i].data if i in model_inputs else contents[i].to_bytes()
+            async with semaphore:
+                verdict = await _hf_classify(client, image_bytes)
+            if verdict is not None:
+                results[i].update(verdict)
+                if i in features:
+                    _remember_verdict(hashes[i], verdict, from_model=True)
+                    del features[i]
+                else:
+                    del undecoded[i]
+
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            await asyncio.gather(*(classify(client, i) for i in [*features, *undecoded]))
+
+    for i, detail in undecoded.items():
+        results[i]["error"] = detail
+
+    # Local detector for everything the model did not classify, as one stacked matrix.
+    if features:
+        order = sorted(features)
+        for i, verdict in zip(order, _local_verdicts(np.stack([features[i] for i in order]))):
+            results[i].update(verdict)
+            _remember_verdict(hashes[i], verdict, from_model=False)
+
+
 @router.post("/check")
 async def check_image(file: UploadFile = File(...)):
     """
     Check image authenticity using a free Hugging Face model.
     Returns classification, confidence, and explanation.
+    Images whose metadata declares AI generation, and near-duplicates of an
+    already checked image, are answered without inference.
     """
-    image_bytes = _validate_image(file)
+    with await _validate_image(file) as upload:
+        return await _check_upload(upload)
+
+
+@router.post("/check/batch")
+async def check_image_batch(files: List[UploadFile] = File(...)):
+    """
+    Check several images in one request.
+
+    Metadata provenance markers are checked first. Other images are decoded
+    and downscaled in a thread pool and looked up in the perceptual-hash
+    cache; the rest are sent to the HF model with bounded concurrency, and
+    any left without a model verdict are scored together by the local
+    forensic detector. Images Pillow cannot decode are still sent to the
+    model as uploaded. Results come back in upload order; an image that
+    cannot be read gets an ``error`` entry instead of failing the batch.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No images uploaded.")
+    if len(files) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Too many images. Upload at most {MAX_BATCH_IMAGES} per batch.")
+
+    results: list[dict] = [{"index": i, "filename": f.filename or ""} for i, f in enumerate(files)]
+    contents: list[Upload | None] = [None] * len(files)
+    try:
+        for i, file in enumerate(files):
+            try:
+                upload = await _validate_image(file)
+            except HTTPException as exc:
+                results[i]["error"] = exc.detail
+                continue
+            finding = scan_provenance(upload.head)
+            if finding is not None:
+                results[i].update(_provenance_verdict(finding))
+                upload.close()
+            else:
+                contents[i] = upload
+        await _check_uploads(contents, results)
+    finally:
+        for upload in contents:
+            if upload is not None:
+                upload.close()
 
-    # Use HF inference API when available
-    if HF_API_KEY:
-        headers = {"Authorization": f"Bearer {HF_API_KEY}"}
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(HF_ENDPOINT, headers=headers, content=image_bytes)
-            if response.status_code < 400:
-                payload = response.json()
-                if isinstance(payload, list) and payload:
-                    top = max(payload, key=lambda item: item.get("score", 0))
-                    label = _map_hf_label(str(top.get("label", "Real")))
-                    confidence = int(round(float(top.get("score", 0.5)) * 100))
-                    explanation = (
-                        "Model detected visual cues consistent with synthetic generation."
-                        if label == "AI-generated"
-                        else "Model detected natural texture and lighting distributions typical of real images."
-                    )
-                    return {
-                        "classification": label,
-                        "confidence": confidence,
-                        "explanation": explanation,
-                    }
-        except Exception:
-            # Fall back to heuristic below
-            pass
-
-    # Fallback heuristic when no HF API key or inference fails
-    classification, confidence, explanation = _heuristic_detector(image_bytes)
     return {
-        "classification": classification,
-        "confidence": confidence,
-        "explanation": explanation,
+        "results": results,
+        "total": len(results),
+        "failed": sum(1 for r in results if "error" in r),
     }
+
+
+@router.get("/stats")
+async def image_stats():
+    """Counters of the perceptual-hash verdict cache and of image preprocessing."""
+    return {"verdict_cache": _verdict_cache.stats(), "preprocess": preprocess_stats()}
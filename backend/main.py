@@ -13,7 +13,8 @@ from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
-from services.ocr import extract_text_from_image
+from services.image_preprocess import preprocess_stats
+from services.ocr import extract_text_from_image, ocr_cache_stats, ocr_engine_stats
 from services.classifier import classify_news
 from services.rag import build_index, retrieve_similar
 from services.explanation import generate_explanation
@@ -21,7 +22,8 @@ from student_routes import router as student_router
 from image_detector_routes import router as image_detector_router
 from image_generator_routes import router as image_generator_router
 from auth_routes import router as auth_router
-from utils.config import MAX_INPUT_CHARS
+from services.context_packer import pack_text
+from utils.config import MAX_INPUT_TOKENS
 
 from database import init_db
 
@@ -90,9 +92,12 @@ async def health():
 async def debug_ocr():
     """Returns diagnostic info about OCR setup."""
     return {
-        "ocr_method": "OCR.space API (free, no auth required)",
+        "ocr_method": "Local Tesseract and OCR.space API, fastest healthy engine first",
         "status": "Configured",
-        "note": "Free tier API - ensure image is small (<1MB) and clear text",
+        "note": "Images are converted to grayscale and shrunk below 1MB (OCR.space free tier limit) before OCR",
+        "engines": ocr_engine_stats(),
+        "cache": ocr_cache_stats(),
+        "preprocess": preprocess_stats(),
     }
 
 
@@ -133,9 +138,8 @@ async def analyze(
             detail="Provide either 'text' or an image 'file'.",
         )
 
-    # Limit input size
-    if len(news_text) > MAX_INPUT_CHARS:
-        news_text = news_text[:MAX_INPUT_CHARS]
+    # Limit input size (token budget, cut at a sentence boundary)
+    news_text, _ = pack_text(news_text, MAX_INPUT_TOKENS, task="analyze_input")
 
     # 2. Classify
     classification = await classify_news(news_text)
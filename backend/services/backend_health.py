@@ -0,0 +1,108 @@
+"""
+RealityCheck AI — Backend Health Tracking
+Per-backend latency and error EWMAs used to order interchangeable backends
+(LLM models, OCR engines) and to derive hedging delays from observed p95
+latency.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+
+
+class BackendHealth:
+    """Rolling latency / error statistics for a single backend."""
+
+    def __init__(self, name: str, alpha: float, window: int):
+        self.name = name
+        self.alpha = alpha
+        self.latency_ewma: float | None = None
+        self.error_ewma = 0.0
+        self.successes = 0
+        self.failures = 0
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def record_success(self, latency: float) -> None:
+        self.successes += 1
+        self._latencies.append(latency)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.alpha * (latency - self.latency_ewma)
+        self.error_ewma *= 1.0 - self.alpha
+
+    def record_failure(self, latency: float | None = None) -> None:
+        self.failures += 1
+        self.error_ewma += self.alpha * (1.0 - self.error_ewma)
+        if latency is not None and self.latency_ewma is not None:
+            # Slow failures (timeouts, cold starts) also make the backend look slower.
+            self.latency_ewma += self.alpha * (max(latency, self.latency_ewma) - self.latency_ewma)
+
+    def record_censored(self, elapsed: float) -> None:
+        """The backend was abandoned after ``elapsed`` seconds: its latency is at least that."""
+        if self.latency_ewma is None:
+            self.latency_ewma = elapsed
+        elif elapsed > self.latency_ewma:
+            self.latency_ewma += self.alpha * (elapsed - self.latency_ewma)
+
+    def p95(self) -> float | None:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        return {
+            "latency_ewma_s": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "latency_p95_s": round(p95, 3) if p95 is not None else None,
+            "error_rate_ewma": round(self.error_ewma, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+class HealthTracker:
+    """
+    Orders backends by expected cost: latency EWMA inflated by error EWMA.
+
+    Backends without samples are scored with ``default_latency`` so they
+    still get explored; ties keep the caller's configured order.
+    """
+
+    def __init__(
+        self,
+        default_latency: float,
+        error_penalty: float = 4.0,
+        alpha: float = 0.3,
+        window: int = 50,
+    ):
+        self.default_latency = default_latency
+        self.error_penalty = error_penalty
+        self.alpha = alpha
+        self.window = window
+        self._backends: dict[str, BackendHealth] = {}
+
+    def get(self, name: str) -> BackendHealth:
+        health = self._backends.get(name)
+        if health is None:
+            health = BackendHealth(name, self.alpha, self.window)
+            self._backends[name] = health
+        return health
+
+    def score(self, name: str) -> float:
+        health = self.get(name)
+        latency = health.latency_ewma if health.latency_ewma is not None else self.default_latency
+        return latency * (1.0 + self.error_penalty * health.error_ewma)
+
+    def rank(self, names: list[str]) -> list[str]:
+        return sorted(names, key=self.score)
+
+    def hedge_delay(self, name: str, minimum: float, maximum: float) -> float:
+        """How long to wait on ``name`` before firing a hedged request elsewhere."""
+        p95 = self.get(name).p95()
+        delay = p95 if p95 is not None else self.default_latency
+        return max(minimum, min(maximum, delay))
+
+    def snapshot(self) -> dict:
+        return {name: health.snapshot() for name, health in self._backends.items()}
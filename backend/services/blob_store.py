@@ -0,0 +1,146 @@
+"""
+RealityCheck AI — Blob Storage
+Minimal key/bytes storage used to persist state across restarts and
+serverless instances.
+
+The default backend is a local directory (STUDENT_BLOB_DIR, falling back to
+the system temp dir). When STUDENT_BLOB_BUCKET is set together with the
+Supabase service credentials, blobs are stored in Supabase Storage instead,
+which every Vercel instance can reach.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+import httpx
+
+
+class BlobStore:
+    """Interface: keys are '/'-separated relative paths, values are bytes."""
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def create(self, key: str, data: bytes) -> bool:
+        """
+        Write ``key`` only if it does not exist yet; False if it does.
+        Backends override this with an atomic create; this fallback is not.
+        """
+        if self.get(key) is not None:
+            return False
+        self.put(key, data)
+        return True
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            with open(self._path(key), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    def create(self, key: str, data: bytes) -> bool:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        return True
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class SupabaseBlobStore(BlobStore):
+    def __init__(self, supabase_url: str, service_role_key: str, bucket: str):
+        self.base_url = f"{supabase_url.rstrip('/')}/storage/v1/object/{bucket}"
+        self.headers = {
+            "Authorization": f"Bearer {service_role_key}",
+            "apikey": service_role_key,
+        }
+
+    def get(self, key: str) -> bytes | None:
+        with httpx.Client(timeout=20) as client:
+            resp = client.get(f"{self.base_url}/{key}", headers=self.headers)
+        if resp.status_code in (400, 404):
+            return None
+        resp.raise_for_status()
+        return resp.content
+
+    def put(self, key: str, data: bytes) -> None:
+        headers = {**self.headers, "Content-Type": "application/octet-stream", "x-upsert": "true"}
+        with httpx.Client(timeout=30) as client:
+            resp = client.post(f"{self.base_url}/{key}", headers=headers, content=data)
+        resp.raise_for_status()
+
+    def create(self, key: str, data: bytes) -> bool:
+        # Without x-upsert, Storage refuses to overwrite an existing object.
+        headers = {**self.headers, "Content-Type": "application/octet-stream"}
+        with httpx.Client(timeout=30) as client:
+            resp = client.post(f"{self.base_url}/{key}", headers=headers, content=data)
+        if resp.status_code in (400, 409) and ("Duplicate" in resp.text or "already exists" in resp.text):
+            return False
+        resp.raise_for_status()
+        return True
+
+    def delete(self, key: str) -> None:
+        with httpx.Client(timeout=20) as client:
+            client.delete(f"{self.base_url}/{key}", headers=self.headers)
+
+
+_blob_store: BlobStore | None = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store, creating it from env on first use."""
+    global _blob_store
+    if _blob_store is None:
+        bucket = os.getenv("STUDENT_BLOB_BUCKET", "").strip()
+        supabase_url = os.getenv("SUPABASE_URL", "").strip()
+        service_role = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "").strip()
+        if bucket and supabase_url and service_role:
+            _blob_store = SupabaseBlobStore(supabase_url, service_role, bucket)
+        else:
+            root = os.getenv("STUDENT_BLOB_DIR", "").strip() or os.path.join(
+                tempfile.gettempdir(), "realitycheck_blobs"
+            )
+            _blob_store = LocalBlobStore(root)
+    return _blob_store
+
+
+def set_blob_store(store: BlobStore) -> None:
+    """Plug in a custom blob backend (e.g. S3, GCS) at startup."""
+    global _blob_store
+    _blob_store = store
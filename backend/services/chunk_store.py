@@ -0,0 +1,174 @@
+"""
+RealityCheck AI — Chunk Store
+Columnar storage for the chunk records of a student workspace.
+
+All chunk texts live in one contiguous UTF-8 buffer addressed by an offset
+array, and the per-chunk fields (ids, character spans, pages, document,
+content hash) are NumPy columns. A 10k-chunk workspace is then a dozen
+objects instead of ~100k small dicts, ints and strings, and texts and
+previews are decoded only for the rows a request actually touches.
+"""
+
+from __future__ import annotations
+
+import io
+from typing import Iterable, Iterator
+
+import numpy as np
+
+PREVIEW_CHARS = 220
+_UNKNOWN = -1  # stands in for a missing offset or page
+
+
+def _column(values: list, dtype) -> np.ndarray:
+    return np.asarray([_UNKNOWN if v is None else v for v in values], dtype=dtype)
+
+
+class ChunkStore:
+    """
+    Append-only table of chunks, addressed by row (the FAISS row order).
+
+    Rows are added in batches with ``extend``; ``text``, ``preview`` and
+    ``record`` materialize a single row on demand.
+    """
+
+    def __init__(self, namespace: str = ""):
+        self.namespace = namespace
+        self._text = b""
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self.chunk_ids = np.zeros(0, dtype=np.int32)
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.ends = np.zeros(0, dtype=np.int64)
+        self.pages = np.zeros(0, dtype=np.int32)
+        self.page_ends = np.zeros(0, dtype=np.int32)
+        self.doc_codes = np.zeros(0, dtype=np.int32)  # index into ``doc_ids``
+        self.doc_ids: list[str] = []
+        self._hashes = np.zeros((0, 32), dtype=np.uint8)  # raw SHA-256 digests, zeros if unknown
+
+    def __len__(self) -> int:
+        return int(self.chunk_ids.shape[0])
+
+    # ── Building ─────────────────────────────────────────────────────────────
+    def extend(self, records: list[dict]) -> None:
+        """Append chunk records (``text``, ``chunk_id``, ``doc_id`` and optional spans/pages/hash)."""
+        if not records:
+            return
+        encoded = [r["text"].encode("utf-8") for r in records]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(lengths)])
+        self._text = b"".join([self._text, *encoded])
+
+        codes = {doc_id: code for code, doc_id in enumerate(self.doc_ids)}
+        doc_codes = []
+        for record in records:
+            doc_id = str(record.get("doc_id", ""))
+            if doc_id not in codes:
+                codes[doc_id] = len(self.doc_ids)
+                self.doc_ids.append(doc_id)
+            doc_codes.append(codes[doc_id])
+        if not self.namespace:
+            self.namespace = str(records[0].get("namespace", ""))
+
+        self.chunk_ids = np.concatenate([self.chunk_ids, _column([r["chunk_id"] for r in records], np.int32)])
+        self.starts = np.concatenate([self.starts, _column([r.get("start") for r in records], np.int64)])
+        self.ends = np.concatenate([self.ends, _column([r.get("end") for r in records], np.int64)])
+        self.pages = np.concatenate([self.pages, _column([r.get("page") for r in records], np.int32)])
+        self.page_ends = np.concatenate([self.page_ends, _column([r.get("page_end") for r in records], np.int32)])
+        self.doc_codes = np.concatenate([self.doc_codes, np.asarray(doc_codes, dtype=np.int32)])
+        digests = b"".join(bytes.fromhex(r["content_hash"]) if r.get("content_hash") else bytes(32) for r in records)
+        self._hashes = np.concatenate([self._hashes, np.frombuffer(digests, dtype=np.uint8).reshape(-1, 32)])
+
+    # ── Row access ───────────────────────────────────────────────────────────
+    def text(self, row: int) -> str:
+        return self._text[self._offsets[row] : self._offsets[row + 1]].decode("utf-8")
+
+    def preview(self, row: int, limit: int = PREVIEW_CHARS) -> str:
+        """First ``limit`` characters of a chunk, decoding no more bytes than they can occupy."""
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return self._text[start : min(end, start + 4 * limit)].decode("utf-8", errors="ignore")[:limit]
+
+    def doc_id(self, row: int) -> str:
+        return self.doc_ids[self.doc_codes[row]]
+
+    def content_hash(self, row: int) -> str:
+        digest = self._hashes[row]
+        return digest.tobytes().hex() if digest.any() else ""
+
+    def record(self, row: int) -> dict:
+        """The chunk as the dict shape used before the columnar store."""
+
+        def optional(value) -> int | None:
+            return None if value == _UNKNOWN else int(value)
+
+        return {
+            "namespace": self.namespace,
+            "text": self.text(row),
+            "content_hash": self.content_hash(row),
+            "start": optional(self.starts[row]),
+            "end": optional(self.ends[row]),
+            "page": optional(self.pages[row]),
+            "page_end": optional(self.page_ends[row]),
+            "chunk_id": int(self.chunk_ids[row]),
+            "doc_id": self.doc_id(row),
+        }
+
+    def texts(self, start: int = 0) -> Iterator[tuple[int, str]]:
+        """``(chunk_id, text)`` for every row from ``start`` on."""
+        for row in range(start, len(self)):
+            yield int(self.chunk_ids[row]), self.text(row)
+
+    def hash_index(self) -> dict[str, int]:
+        """Content hash -> chunk id, for de-duplicating a new batch."""
+        known = np.flatnonzero(self._hashes.any(axis=1))
+        return {self._hashes[row].tobytes().hex(): int(self.chunk_ids[row]) for row in known}
+
+    @property
+    def nbytes(self) -> int:
+        columns = (
+            self._offsets, self.chunk_ids, self.starts, self.ends,
+            self.pages, self.page_ends, self.doc_codes, self._hashes,
+        )
+        return len(self._text) + sum(c.nbytes for c in columns) + sum(len(d) for d in self.doc_ids)
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "ChunkStore":
+        store = cls()
+        store.extend(list(records))
+        return store
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            text=np.frombuffer(self._text, dtype=np.uint8),
+            offsets=self._offsets,
+            chunk_ids=self.chunk_ids,
+            starts=self.starts,
+            ends=self.ends,
+            pages=self.pages,
+            page_ends=self.page_ends,
+            doc_codes=self.doc_codes,
+            doc_ids=np.asarray(self.doc_ids, dtype=str),
+            hashes=self._hashes,
+            namespace=np.asarray(self.namespace),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "ChunkStore":
+        with np.load(io.BytesIO(raw), allow_pickle=False) as data:
+            store = cls(str(data["namespace"]))
+            store._text = data["text"].tobytes()
+            store._offsets = data["offsets"].astype(np.int64)
+            store.chunk_ids = data["chunk_ids"].astype(np.int32)
+            store.starts = data["starts"].astype(np.int64)
+            store.ends = data["ends"].astype(np.int64)
+            store.pages = data["pages"].astype(np.int32)
+            store.page_ends = data["page_ends"].astype(np.int32)
+            store.doc_codes = data["doc_codes"].astype(np.int32)
+            store.doc_ids = [str(d) for d in data["doc_ids"]]
+            store._hashes = data["hashes"].astype(np.uint8).reshape(-1, 32)
+        if store._offsets.shape[0] != len(store) + 1 or int(store._offsets[-1]) != len(store._text):
+            raise ValueError("chunk store columns do not match")
+        return store
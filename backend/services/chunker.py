@@ -0,0 +1,156 @@
+"""
+RealityCheck AI — Chunking Service
+Token-aware document chunking with character offsets and page numbers.
+
+Token counts approximate the WordPiece tokenizer used by all-MiniLM-L6-v2:
+punctuation marks are separate tokens and long words are split into
+sub-word pieces, so chunk sizes track the embedding model's real limit
+far better than whitespace word counts.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+_SUBWORD_CHARS = 6  # average characters per WordPiece continuation piece
+
+# Character classes for the BMP: 0 = punctuation, 1 = word, 2 = whitespace.
+# Characters outside the BMP (emoji, rare scripts) are treated as word chars.
+_CHAR_CLASS = np.array(
+    [2 if c.isspace() else 1 if (c.isalnum() or c == "_") else 0 for c in map(chr, range(0x10000))],
+    dtype=np.uint8,
+)
+_CHAR_CLASS[0xFFFF] = 1
+_TERMINALS = np.array([ord("."), ord("!"), ord("?")], dtype=np.uint32)
+
+
+def _codes(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32)
+
+
+def _token_spans(codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return start/end character offsets of every token, fully vectorized."""
+    if codes.shape[0] == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    classes = _CHAR_CLASS[np.minimum(codes, 0xFFFF)]
+    is_word = classes == 1
+    is_punct = classes == 0
+
+    prev_word = np.concatenate(([False], is_word[:-1]))
+    next_word = np.concatenate((is_word[1:], [False]))
+    starts = np.flatnonzero((is_word & ~prev_word) | is_punct)
+    ends = np.flatnonzero((is_word & ~next_word) | is_punct) + 1
+
+    # Long words become several sub-word pieces, like WordPiece does.
+    lengths = ends - starts
+    pieces = 1 + np.maximum(0, (lengths - 3) // _SUBWORD_CHARS)
+    if starts.shape[0] == 0 or int(pieces.max()) == 1:
+        return starts, ends
+
+    total = int(pieces.sum())
+    group_offsets = np.repeat(np.cumsum(pieces) - pieces, pieces)
+    piece_index = np.arange(total, dtype=np.int64) - group_offsets
+    piece_starts = np.repeat(starts, pieces) + piece_index * _SUBWORD_CHARS
+    word_ends = np.repeat(ends, pieces)
+    is_last = piece_index == np.repeat(pieces - 1, pieces)
+    piece_ends = np.where(is_last, word_ends, piece_starts + _SUBWORD_CHARS)
+    return piece_starts, piece_ends
+
+
+def count_tokens(text: str) -> int:
+    """Approximate the number of model tokens in ``text``."""
+    return int(_token_spans(_codes(text))[0].shape[0])
+
+
+def _sentence_boundaries(codes: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Token indices at which a new sentence begins (sorted, without 0).
+
+    A sentence starts after whitespace that follows ``.``, ``!`` or ``?``,
+    or after any line break.
+    """
+    if starts.shape[0] < 2:
+        return np.zeros(0, dtype=np.int64)
+    prev_end = ends[:-1]
+    has_gap = starts[1:] > prev_end
+    after_terminal = np.isin(codes[prev_end - 1], _TERMINALS)
+    newlines = np.concatenate(([0], np.cumsum(codes == 10)))
+    has_newline = newlines[starts[1:]] > newlines[prev_end]
+    return np.flatnonzero(has_gap & (after_terminal | has_newline)) + 1
+
+
+def chunk_document(
+    text: str,
+    target_tokens: int,
+    overlap_tokens: int,
+    page_starts: list[int] | None = None,
+) -> list[dict]:
+    """
+    Split ``text`` into chunks of at most ``target_tokens`` tokens.
+
+    Chunks end on sentence boundaries whenever a sentence fits, consecutive
+    chunks share ``overlap_tokens`` tokens, and each chunk carries its
+    ``start``/``end`` character offsets plus the 1-based ``page`` and
+    ``page_end`` it spans (``page_starts`` are the offsets where each page
+    begins; a single page is assumed when omitted).
+    """
+    codes = _codes(text)
+    token_starts, token_ends = _token_spans(codes)
+    n_tokens = token_starts.shape[0]
+    if n_tokens == 0:
+        return []
+
+    target_tokens = max(1, target_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, target_tokens - 1))
+    boundaries = _sentence_boundaries(codes, token_starts, token_ends)
+    pages = np.asarray(page_starts or [0], dtype=np.int64)
+
+    chunks: list[dict] = []
+    begin = 0
+    while begin < n_tokens:
+        limit = min(begin + target_tokens, n_tokens)
+        end = limit
+        if limit < n_tokens:
+            # Prefer the last sentence boundary that still fits in the budget.
+            pos = int(np.searchsorted(boundaries, limit, side="right")) - 1
+            if pos >= 0 and boundaries[pos] > begin + overlap_tokens:
+                end = int(boundaries[pos])
+
+        start_char = int(token_starts[begin])
+        end_char = int(token_ends[end - 1])
+        chunks.append(
+            {
+                "text": text[start_char:end_char],
+                "start": start_char,
+                "end": end_char,
+                "page": int(np.searchsorted(pages, start_char, side="right")),
+                "page_end": int(np.searchsorted(pages, end_char - 1, side="right")),
+                "tokens": end - begin,
+            }
+        )
+        if end >= n_tokens:
+            break
+        begin = max(begin + 1, end - overlap_tokens)
+
+    return chunks
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Longest prefix of ``text`` that fits in ``max_tokens`` tokens.
+
+    The cut falls on a sentence boundary when at least one whole sentence
+    fits, otherwise on a token boundary (never inside a word piece).
+    """
+    codes = _codes(text)
+    token_starts, token_ends = _token_spans(codes)
+    if token_starts.shape[0] <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    boundaries = _sentence_boundaries(codes, token_starts, token_ends)
+    pos = int(np.searchsorted(boundaries, max_tokens, side="right")) - 1
+    end = int(boundaries[pos]) if pos >= 0 else max_tokens
+    return text[: int(token_ends[end - 1])]
@@ -3,16 +3,17 @@ RealityCheck AI — Classifier Service
 Calls Cloudflare Workers AI (Mistral-7B-Instruct-v0.2) to classify news.
 """
 
-import json
 import httpx
 from fastapi import HTTPException
 
+from services.llm_stream import cloudflare_pieces, collect_generation
 from utils.config import (
+    CLASSIFICATION_PROFILE,
     CLOUDFLARE_LLM_URL,
     CLOUDFLARE_API_TOKEN,
-    LLM_MAX_TOKENS,
     LLM_TEMPERATURE,
 )
+from utils.json_extract import extract_json_object
 from utils.prompts import CLASSIFICATION_PROMPT
 import re
 
@@ -21,43 +22,12 @@ def _extract_json(raw: str) -> dict:
     """Try multiple strategies to extract a JSON object from LLM output."""
     text = raw.strip()
 
-    # Strategy 1: strip markdown fencing
-    if "```" in text:
-        parts = text.split("```")
-        for part in parts:
-            part = part.strip()
-            if part.startswith("json"):
-                part = part[4:].strip()
-            if part.startswith("{"):
-                try:
-                    return json.loads(part)
-                except json.JSONDecodeError:
-                    pass
-
-    # Strategy 2: direct parse
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    # Strategy 3: find JSON objects with regex
-    matches = re.findall(r'\{[^{}]*\}', text)
-    for m in matches:
-        try:
-            return json.loads(m)
-        except json.JSONDecodeError:
-            pass
-
-    # Strategy 4: find outermost braces
-    start = text.find("{")
-    end = text.rfind("}") + 1
-    if start != -1 and end > start:
-        try:
-            return json.loads(text[start:end])
-        except json.JSONDecodeError:
-            pass
+    # Strategy 1: first balanced JSON object (fenced or not), single pass
+    result = extract_json_object(text)
+    if result is not None:
+        return result
 
-    # Strategy 5: manually extract fields with regex
+    # Strategy 2: manually extract fields with regex
     label_match = re.search(
         r'["\']?label["\']?\s*[:=]\s*["\']?(Real|Fake|Misleading)',
         text, re.IGNORECASE,
@@ -94,8 +64,9 @@ async def classify_news(news_text: str) -> dict:
         "messages": [
             {"role": "user", "content": prompt}
         ],
-        "max_tokens": LLM_MAX_TOKENS,
+        "max_tokens": CLASSIFICATION_PROFILE["max_tokens"],
         "temperature": LLM_TEMPERATURE,
+        "stream": True,
     }
 
     headers = {
@@ -103,37 +74,40 @@ async def classify_news(news_text: str) -> dict:
         "Content-Type": "application/json",
     }
 
+    # Stream the response and stop reading once the JSON verdict is complete
     async with httpx.AsyncClient(timeout=60) as client:
         try:
-            resp = await client.post(CLOUDFLARE_LLM_URL, json=payload, headers=headers)
+            async with client.stream("POST", CLOUDFLARE_LLM_URL, json=payload, headers=headers) as resp:
+                if resp.status_code == 429:
+                    raise HTTPException(
+                        status_code=429,
+                        detail="Cloudflare AI daily quota exceeded. Please try again tomorrow.",
+                    )
+                if resp.status_code != 200:
+                    await resp.aread()
+                    raise HTTPException(
+                        status_code=502,
+                        detail=f"Cloudflare API returned status {resp.status_code}: {resp.text[:300]}",
+                    )
+                try:
+                    llm_text, result = await collect_generation(
+                        cloudflare_pieces(resp),
+                        stop=CLASSIFICATION_PROFILE["stop"],
+                        json_keys=CLASSIFICATION_PROFILE["json_keys"],
+                    )
+                except (KeyError, TypeError, ValueError):
+                    raise HTTPException(
+                        status_code=502,
+                        detail="Unexpected response structure from Cloudflare API.",
+                    )
         except httpx.TimeoutException:
             raise HTTPException(status_code=504, detail="LLM API request timed out.")
         except httpx.HTTPError as exc:
             raise HTTPException(status_code=502, detail=f"LLM API error: {exc}")
 
-    if resp.status_code == 429:
-        raise HTTPException(
-            status_code=429,
-            detail="Cloudflare AI daily quota exceeded. Please try again tomorrow.",
-        )
-    if resp.status_code != 200:
-        raise HTTPException(
-            status_code=502,
-            detail=f"Cloudflare API returned status {resp.status_code}: {resp.text[:300]}",
-        )
-
-    # Parse Cloudflare response → extract LLM text
-    try:
-        body = resp.json()
-        llm_text: str = body["result"]["response"]
-    except (KeyError, TypeError):
-        raise HTTPException(
-            status_code=502,
-            detail="Unexpected response structure from Cloudflare API.",
-        )
-
-    # Extract JSON from LLM text — robust multi-strategy parser
-    result = _extract_json(llm_text)
+    # Fall back to the robust multi-strategy parser on non-JSON output
+    if result is None:
+        result = _extract_json(llm_text)
 
     # Validate & normalise
     label = result.get("label", "Misleading")
@@ -0,0 +1,88 @@
+"""
+RealityCheck AI — Context Packer
+Fits prompt material into a per-task token budget instead of slicing by
+characters: segments are admitted greedily by relevance score, the last one
+that does not fit whole is trimmed at a sentence boundary, and the tokens
+saved versus the unpacked material are recorded per task.
+"""
+
+from __future__ import annotations
+
+from services.chunker import count_tokens, truncate_to_tokens
+
+MIN_TRIMMED_TOKENS = 24  # a trimmed segment shorter than this is dropped instead
+
+_totals: dict[str, dict] = {}
+
+
+def _record(report: dict) -> None:
+    totals = _totals.setdefault(
+        report["task"], {"calls": 0, "input_tokens": 0, "packed_tokens": 0, "tokens_saved": 0}
+    )
+    totals["calls"] += 1
+    totals["input_tokens"] += report["input_tokens"]
+    totals["packed_tokens"] += report["packed_tokens"]
+    totals["tokens_saved"] += report["tokens_saved"]
+
+
+def pack_segments(
+    segments: list[dict],
+    budget_tokens: int,
+    task: str,
+    separator: str = "\n\n",
+) -> tuple[str, dict]:
+    """
+    Join ``segments`` into at most ``budget_tokens`` tokens.
+
+    Each segment has ``text`` and optionally ``prefix`` (a label kept verbatim,
+    e.g. a citation tag) and ``score`` (higher is packed first). The packed
+    segments keep their input order. Returns the context and a report with
+    ``input_tokens``, ``packed_tokens`` and ``tokens_saved``.
+    """
+    separator_tokens = count_tokens(separator)
+    costs = [(count_tokens(s.get("prefix", "")), count_tokens(s["text"])) for s in segments]
+    input_tokens = sum(p + t for p, t in costs) + separator_tokens * max(0, len(segments) - 1)
+
+    order = sorted(range(len(segments)), key=lambda i: -float(segments[i].get("score", 0.0)))
+    packed: dict[int, str] = {}
+    remaining = budget_tokens
+    trimmed = 0
+    for i in order:
+        prefix_tokens, text_tokens = costs[i]
+        overhead = prefix_tokens + (separator_tokens if packed else 0)
+        room = remaining - overhead
+        if room <= 0:
+            continue
+        if text_tokens <= room:
+            packed[i] = segments[i]["text"]
+            remaining -= overhead + text_tokens
+        elif room >= MIN_TRIMMED_TOKENS:
+            text = truncate_to_tokens(segments[i]["text"], room)
+            packed[i] = text
+            remaining -= overhead + count_tokens(text)
+            trimmed += 1
+
+    context = separator.join(segments[i].get("prefix", "") + packed[i] for i in sorted(packed))
+    packed_tokens = budget_tokens - remaining
+    report = {
+        "task": task,
+        "budget_tokens": budget_tokens,
+        "input_tokens": input_tokens,
+        "packed_tokens": packed_tokens,
+        "tokens_saved": max(0, input_tokens - packed_tokens),
+        "segments": len(segments),
+        "segments_used": len(packed),
+        "segments_trimmed": trimmed,
+    }
+    _record(report)
+    return context, report
+
+
+def pack_text(text: str, budget_tokens: int, task: str) -> tuple[str, dict]:
+    """Trim a single text to ``budget_tokens`` at a sentence boundary."""
+    return pack_segments([{"text": text}], budget_tokens, task)
+
+
+def packing_stats() -> dict:
+    """Cumulative token accounting per task since process start."""
+    return {task: dict(totals) for task, totals in _totals.items()}
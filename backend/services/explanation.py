@@ -4,49 +4,28 @@ Calls Cloudflare Workers AI to generate a structured explanation
 using classification results + retrieved evidence.
 """
 
-import json
 import re
 import httpx
 from fastapi import HTTPException
 
+from services.context_packer import pack_segments
+from services.llm_stream import cloudflare_pieces, collect_generation
 from utils.config import (
     CLOUDFLARE_LLM_URL,
     CLOUDFLARE_API_TOKEN,
-    LLM_MAX_TOKENS,
+    EVIDENCE_MAX_TOKENS,
+    EXPLANATION_PROFILE,
     LLM_TEMPERATURE,
 )
+from utils.json_extract import extract_json_object
 from utils.prompts import EXPLANATION_PROMPT
 
 
 def _extract_explanation_json(text: str) -> dict:
     """Robustly extract JSON from LLM explanation output."""
-    # Strip markdown fencing
-    if "```" in text:
-        parts = text.split("```")
-        for part in parts:
-            part = part.strip()
-            if part.startswith("json"):
-                part = part[4:].strip()
-            if part.startswith("{"):
-                try:
-                    return json.loads(part)
-                except json.JSONDecodeError:
-                    pass
-
-    # Direct parse
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    # Find outermost braces
-    start = text.find("{")
-    end = text.rfind("}") + 1
-    if start != -1 and end > start:
-        try:
-            return json.loads(text[start:end])
-        except json.JSONDecodeError:
-            pass
+    result = extract_json_object(text)
+    if result is not None:
+        return result
 
     # Regex extraction fallback
     expl_match = re.search(r'detailed_explanation["\']?\s*[:=]\s*["\'](.+?)["\']', text, re.DOTALL)
@@ -67,14 +46,18 @@ async def generate_explanation(
     Build a detailed explanation using the LLM with retrieved evidence.
     Returns dict with: detailed_explanation, key_inconsistencies, evidence_alignment.
     """
-    # Build evidence block
-    evidence_parts: list[str] = []
+    # Build evidence block, most similar articles first within the token budget
+    evidence_parts: list[dict] = []
     for i, art in enumerate(retrieved_articles, 1):
         evidence_parts.append(
-            f"[{i}] {art['title']} (Source: {art['source']})\n"
-            f"    {art['text']}"
+            {
+                "prefix": f"[{i}] {art['title']} (Source: {art['source']})\n    ",
+                "text": art["text"],
+                "score": art.get("similarity_score", 0),
+            }
         )
-    evidence_block = "\n\n".join(evidence_parts) if evidence_parts else "No evidence retrieved."
+    evidence_block, _ = pack_segments(evidence_parts, EVIDENCE_MAX_TOKENS, task="explanation_evidence")
+    evidence_block = evidence_block or "No evidence retrieved."
 
     prompt = EXPLANATION_PROMPT.format(
         news_text=news_text,
@@ -86,8 +69,9 @@ async def generate_explanation(
 
     payload = {
         "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": LLM_MAX_TOKENS,
+        "max_tokens": EXPLANATION_PROFILE["max_tokens"],
         "temperature": LLM_TEMPERATURE,
+        "stream": True,
     }
 
     headers = {
@@ -95,37 +79,39 @@ async def generate_explanation(
         "Content-Type": "application/json",
     }
 
+    # Stream the response and stop reading once the JSON explanation is complete
     async with httpx.AsyncClient(timeout=60) as client:
         try:
-            resp = await client.post(CLOUDFLARE_LLM_URL, json=payload, headers=headers)
+            async with client.stream("POST", CLOUDFLARE_LLM_URL, json=payload, headers=headers) as resp:
+                if resp.status_code == 429:
+                    raise HTTPException(
+                        status_code=429,
+                        detail="Cloudflare AI daily quota exceeded. Try again tomorrow.",
+                    )
+                if resp.status_code != 200:
+                    raise HTTPException(
+                        status_code=502,
+                        detail=f"Cloudflare API returned status {resp.status_code}.",
+                    )
+                try:
+                    llm_text, result = await collect_generation(
+                        cloudflare_pieces(resp),
+                        stop=EXPLANATION_PROFILE["stop"],
+                        json_keys=EXPLANATION_PROFILE["json_keys"],
+                    )
+                except (KeyError, TypeError, ValueError):
+                    raise HTTPException(
+                        status_code=502,
+                        detail="Unexpected response from Cloudflare API.",
+                    )
         except httpx.TimeoutException:
             raise HTTPException(status_code=504, detail="Explanation API timed out.")
         except httpx.HTTPError as exc:
             raise HTTPException(status_code=502, detail=f"Explanation API error: {exc}")
 
-    if resp.status_code == 429:
-        raise HTTPException(
-            status_code=429,
-            detail="Cloudflare AI daily quota exceeded. Try again tomorrow.",
-        )
-    if resp.status_code != 200:
-        raise HTTPException(
-            status_code=502,
-            detail=f"Cloudflare API returned status {resp.status_code}.",
-        )
-
-    try:
-        body = resp.json()
-        llm_text: str = body["result"]["response"]
-    except (KeyError, TypeError):
-        raise HTTPException(
-            status_code=502,
-            detail="Unexpected response from Cloudflare API.",
-        )
-
     # Parse JSON from response — robust multi-strategy parser
-    llm_text = llm_text.strip()
-    result = _extract_explanation_json(llm_text)
+    if result is None:
+        result = _extract_explanation_json(llm_text.strip())
 
     return {
         "detailed_explanation": result.get(
@@ -0,0 +1,284 @@
+"""
+RealityCheck AI — Local Image Forensics
+Offline AI-image detector used when the Hugging Face model is unavailable.
+
+Features are computed with vectorized NumPy on a 256x256 grayscale crop taken
+at native resolution (downscaling would erase the noise and spectral cues)
+and the 128x128 thumbnail:
+  * spectrum: high-frequency energy share, radial power-law slope and
+    periodic peaks (upsampling layers leave grid-like spectral spikes);
+  * noise residual: level, spread across 32x32 tiles and kurtosis of the
+    image minus its 3x3 local mean (camera sensors leave broadband noise,
+    generators produce smoother residuals);
+  * JPEG: estimated quality and whether the quantization tables are the
+    standard IJG ones (camera firmware ships its own);
+  * the edge density and colour spread of the original heuristic.
+
+A logistic model over standardized features combines them; each
+standardized feature is clipped to +/-CLIP_Z so no single outlier (e.g. the
+zero noise of a flat screenshot) decides the verdict. The built-in weights
+are hand-set priors that have not been fitted or measured on labelled
+data, so their verdicts are reported as heuristic and their confidence is
+capped at PRIOR_MAX_CONFIDENCE; ``bench_image_detector.py --train`` fits
+weights on a labeled folder and writes a JSON file that is loaded from
+IMAGE_DETECTOR_WEIGHTS, whose confidence may reach MAX_CONFIDENCE.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+ANALYSIS_SIZE = 256
+TILE = 32
+CLIP_Z = 2.0
+MAX_CONFIDENCE = 0.9  # a local guess is never reported as certain
+PRIOR_MAX_CONFIDENCE = 0.65  # the uncalibrated priors only ever lean one way
+
+FEATURE_NAMES = (
+    "edge_density",
+    "color_std",
+    "hf_energy",
+    "spectral_slope",
+    "spectral_peaks",
+    "noise_level",
+    "noise_spread",
+    "residual_kurtosis",
+    "jpeg_quality",
+    "jpeg_standard_tables",
+    "is_jpeg",
+)
+
+# Hand-set priors: (mean, scale, weight) per feature; positive weight -> AI-generated.
+# No weight exceeds 0.3, so one clipped feature moves the logit by at most 0.6.
+# The JPEG means are the values of a lossless image, so PNG screenshots and
+# exports are not scored on how they were saved.
+_DEFAULT_MODEL = {
+    "edge_density": (12.0, 6.0, 0.15),
+    "color_std": (50.0, 20.0, -0.15),
+    "hf_energy": (-1.5, 0.5, -0.3),
+    "spectral_slope": (-2.5, 0.5, -0.2),
+    "spectral_peaks": (2.5, 1.0, 0.25),
+    "noise_level": (1.2, 0.6, -0.3),
+    "noise_spread": (0.5, 0.2, -0.15),
+    "residual_kurtosis": (1.5, 0.8, 0.15),
+    "jpeg_quality": (1.0, 0.1, 0.05),
+    "jpeg_standard_tables": (0.0, 0.5, 0.1),
+    "is_jpeg": (0.0, 0.5, 0.0),
+}
+
+# Human-readable reading of each feature when it pushes towards AI / towards real.
+_READINGS = {
+    "edge_density": ("unusually dense, crisp edges", "moderate edge density"),
+    "color_std": ("compressed colour variation", "wide natural colour dispersion"),
+    "hf_energy": ("weak high-frequency detail", "rich fine-grained detail"),
+    "spectral_slope": ("an overly smooth frequency falloff", "a natural frequency falloff"),
+    "spectral_peaks": ("periodic spectral peaks typical of upsampling layers", "no periodic spectral artifacts"),
+    "noise_level": ("very little sensor noise", "camera-like sensor noise"),
+    "noise_spread": ("uniformly clean noise across the frame", "noise that varies naturally across the frame"),
+    "residual_kurtosis": ("spiky, non-Gaussian noise residuals", "Gaussian-like noise residuals"),
+    "jpeg_quality": ("high-quality re-encoding", "camera-grade JPEG compression"),
+    "jpeg_standard_tables": ("standard library JPEG tables", "camera-specific JPEG tables"),
+    "is_jpeg": ("a lossless export format", "camera JPEG encoding"),
+}
+
+# JPEG Annex K luminance table, natural order (as Pillow reports it).
+_IJG_LUMA = np.array(
+    [
+        16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+        14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+        18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+        49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+    ],
+    dtype=np.float32,
+)
+_QUALITIES = np.arange(1, 101, dtype=np.float32)
+_IJG_SCALES = np.where(_QUALITIES < 50, 5000.0 / _QUALITIES, 200.0 - 2.0 * _QUALITIES)
+_IJG_TABLES = np.clip(np.floor((_IJG_LUMA[None, :] * _IJG_SCALES[:, None] + 50.0) / 100.0), 1, 255)
+
+
+def _radial_grid(size: int) -> np.ndarray:
+    fy = np.fft.fftfreq(size)[:, None]
+    fx = np.fft.rfftfreq(size)[None, :]
+    return np.sqrt(fx * fx + fy * fy)
+
+
+_RADIUS = _radial_grid(ANALYSIS_SIZE)
+_RADIAL_BINS = np.minimum((_RADIUS * 2 * 64).astype(np.int64), 64)  # 64 rings up to Nyquist
+_WINDOW = np.outer(np.hanning(ANALYSIS_SIZE), np.hanning(ANALYSIS_SIZE)).astype(np.float32)
+
+
+def analysis_crop(img: Image.Image) -> np.ndarray:
+    """Centre ANALYSIS_SIZE crop in grayscale, without resampling when the image is large enough."""
+    width, height = img.size
+    if width >= ANALYSIS_SIZE and height >= ANALYSIS_SIZE:
+        left, top = (width - ANALYSIS_SIZE) // 2, (height - ANALYSIS_SIZE) // 2
+        img = img.crop((left, top, left + ANALYSIS_SIZE, top + ANALYSIS_SIZE))
+    else:
+        img = img.resize((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+def _spectral_features(gray: np.ndarray) -> tuple[float, float, float]:
+    power = np.abs(np.fft.rfft2((gray - gray.mean()) * _WINDOW)) ** 2 + 1e-6
+    ring_power = np.bincount(_RADIAL_BINS.ravel(), weights=power.ravel(), minlength=65)
+    ring_count = np.maximum(np.bincount(_RADIAL_BINS.ravel(), minlength=65), 1)
+    ring_mean = ring_power / ring_count
+
+    total = ring_power[2:64].sum()
+    hf_energy = float(np.log10(ring_power[32:64].sum() / total + 1e-12))
+
+    rings = np.arange(2, 58)
+    slope = float(np.polyfit(np.log(rings), np.log(ring_mean[rings]), 1)[0])
+
+    # Peaks: power far above its ring's mean, in the outer half of the spectrum.
+    outer = _RADIAL_BINS >= 16
+    excess = np.log(power[outer]) - np.log(ring_mean[_RADIAL_BINS[outer]])
+    peaks = float(np.percentile(excess, 99.9))
+    return hf_energy, slope, peaks
+
+
+def _noise_features(gray: np.ndarray) -> tuple[float, float, float]:
+    padded = np.pad(gray, 1, mode="edge")
+    local_mean = sum(
+        padded[dy : dy + ANALYSIS_SIZE, dx : dx + ANALYSIS_SIZE] for dy in range(3) for dx in range(3)
+    ) / 9.0
+    residual = gray - local_mean
+    tiles = residual.reshape(ANALYSIS_SIZE // TILE, TILE, ANALYSIS_SIZE // TILE, TILE).std(axis=(1, 3))
+    log_tiles = np.log(tiles + 1e-3)
+    level = float(np.median(log_tiles))
+    spread = float(log_tiles.std())
+    squared = np.square(residual - residual.mean())
+    variance = float(squared.mean()) + 1e-6
+    kurtosis = float(np.square(squared).mean() / variance**2)
+    return level, spread, float(np.log1p(kurtosis))
+
+
+def _jpeg_features(quantization: dict | None) -> tuple[float, float, float]:
+    if not quantization or 0 not in quantization:
+        return 1.0, 0.0, 0.0
+    luma = np.asarray(list(quantization[0])[:64], dtype=np.float32)
+    if luma.shape[0] != 64:
+        return 1.0, 0.0, 0.0
+    distance = np.abs(_IJG_TABLES - luma[None, :]).max(axis=1)
+    best = int(np.argmin(distance))
+    quality = float(_QUALITIES[best]) / 100.0
+    return quality, float(distance[best] <= 1.0), 1.0
+
+
+def image_features(gray: np.ndarray, thumbnail: np.ndarray, quantization: dict | None = None) -> np.ndarray:
+    """Feature vector (FEATURE_NAMES order) from an ``analysis_crop`` and the RGB thumbnail."""
+    thumb = thumbnail.astype(np.float32)
+    luma = thumb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    edge = float((np.abs(np.diff(luma, axis=1)).mean() + np.abs(np.diff(luma, axis=0)).mean()) / 2.0)
+    color_std = float(thumb.std())
+
+    hf_energy, slope, peaks = _spectral_features(gray)
+    noise_level, noise_spread, kurtosis = _noise_features(gray)
+    jpeg_quality, standard_tables, is_jpeg = _jpeg_features(quantization)
+    values = (
+        edge, color_std, hf_energy, slope, peaks,
+        noise_level, noise_spread, kurtosis,
+        jpeg_quality, standard_tables, is_jpeg,
+    )
+    return np.array(values, dtype=np.float32)
+
+
+class LinearDetector:
+    """Logistic model over standardized, clipped features."""
+
+    def __init__(
+        self,
+        mean,
+        scale,
+        weights,
+        bias: float = 0.0,
+        clip: float = CLIP_Z,
+        max_confidence: float = MAX_CONFIDENCE,
+        trained: bool = True,
+    ):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.maximum(np.asarray(scale, dtype=np.float32), 1e-6)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.clip = float(clip)
+        self.max_confidence = float(max_confidence)
+        self.trained = trained  # False for the hand-set priors
+
+    @classmethod
+    def default(cls) -> "LinearDetector":
+        mean, scale, weights = zip(*(_DEFAULT_MODEL[name] for name in FEATURE_NAMES))
+        return cls(mean, scale, weights, max_confidence=PRIOR_MAX_CONFIDENCE, trained=False)
+
+    @classmethod
+    def from_file(cls, path: str) -> "LinearDetector":
+        with open(path, encoding="utf-8") as handle:
+            spec = json.load(handle)
+        if list(spec.get("features", [])) != list(FEATURE_NAMES):
+            raise ValueError("feature list does not match this detector")
+        return cls(spec["mean"], spec["scale"], spec["weights"], spec.get("bias", 0.0), spec.get("clip", CLIP_Z))
+
+    def to_dict(self) -> dict:
+        return {
+            "features": list(FEATURE_NAMES),
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "weights": self.weights.tolist(),
+            "bias": self.bias,
+            "clip": self.clip,
+        }
+
+    def standardize(self, features: np.ndarray) -> np.ndarray:
+        return np.clip((np.atleast_2d(features) - self.mean) / self.scale, -self.clip, self.clip)
+
+    def contributions(self, features: np.ndarray) -> np.ndarray:
+        return self.standardize(features) * self.weights
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """AI probability for each row of an (N, F) feature matrix."""
+        logits = self.contributions(features).sum(axis=1) + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def explain(self, features: np.ndarray, towards_ai: bool, limit: int = 2) -> list[str]:
+        """Readings of the features that pushed the verdict the most."""
+        contributions = self.contributions(features)[0]
+        order = np.argsort(-contributions if towards_ai else contributions)
+        picked = [i for i in order[:limit] if (contributions[i] > 0) == towards_ai and contributions[i] != 0]
+        return [_READINGS[FEATURE_NAMES[i]][0 if towards_ai else 1] for i in picked]
+
+
+def load_detector() -> LinearDetector:
+    path = os.getenv("IMAGE_DETECTOR_WEIGHTS", "").strip()
+    if path:
+        try:
+            return LinearDetector.from_file(path)
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"⚠️  Could not load detector weights '{path}': {exc}; using built-in priors")
+    return LinearDetector.default()
+
+
+def verdict(detector: LinearDetector, features: np.ndarray, probability: float) -> tuple[str, int, str]:
+    """Label, confidence and explanation for one image's AI probability."""
+    cap = detector.max_confidence
+    probability = min(cap, max(1.0 - cap, probability))
+    towards_ai = probability >= 0.5
+    cues = " and ".join(detector.explain(features, towards_ai)) or "several weak cues"
+    scan = (
+        "Local forensic scan (no model available)"
+        if detector.trained
+        else "Heuristic forensic scan (no model available; untrained rules, accuracy not measured)"
+    )
+    if towards_ai:
+        return (
+            "AI-generated",
+            int(round(probability * 100)),
+            f"{scan} found {cues}, which can align with synthetic generation.",
+        )
+    return (
+        "Real",
+        int(round((1.0 - probability) * 100)),
+        f"{scan} found {cues}, which often aligns with real-world imagery.",
+    )
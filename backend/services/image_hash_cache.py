@@ -0,0 +1,160 @@
+"""
+RealityCheck AI — Perceptual Image Hash Cache
+Verdict cache for the image authenticity checks keyed by a 64-bit difference
+hash (dHash), so recompressed, resized or lightly edited copies of an image
+that was already checked reuse its verdict.
+
+Near-duplicate lookup uses a multi-index hash table: the hash is split into
+8 bands of 8 bits and every entry is filed under each band value. Two hashes
+within Hamming distance 7 agree exactly on at least one band (pigeonhole),
+so probing the 8 buckets of a query finds every match up to that distance
+without scanning the whole cache. Entries are evicted LRU-first, and may be
+persisted to an append-only JSON-lines file (IMAGE_HASH_CACHE_PATH).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+from PIL import Image
+
+BANDS = 8
+BAND_BITS = 64 // BANDS
+_BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def dhash(thumbnail: np.ndarray) -> int:
+    """64-bit difference hash of an RGB thumbnail: brightness gradients of a 9x8 grayscale copy."""
+    gray = Image.fromarray(thumbnail).convert("L").resize((9, 8), Image.Resampling.BOX)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).reshape(-1)
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(value: int) -> list[int]:
+    return [(value >> (band * BAND_BITS)) & _BAND_MASK for band in range(BANDS)]
+
+
+class PerceptualHashCache:
+    """Bounded map from perceptual hash to verdict with Hamming-distance lookup."""
+
+    def __init__(self, capacity: int, threshold: int, path: str | None = None):
+        self.capacity = max(1, int(capacity))
+        self.threshold = max(0, int(threshold))
+        self.path = path or None
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._buckets: list[dict[int, set[int]]] = [{} for _ in range(BANDS)]
+        self._logged = 0
+        if self.path:
+            self._load()
+
+    def _candidates(self, value: int):
+        if self.threshold >= BANDS:
+            # Beyond the pigeonhole guarantee; fall back to a full scan.
+            return list(self._entries)
+        found: set[int] = set()
+        for band, key in enumerate(_bands(value)):
+            found |= self._buckets[band].get(key, set())
+        return found
+
+    def get(self, value: int, accept: Callable[[dict], bool] | None = None) -> tuple[dict, int] | None:
+        """
+        The verdict of the nearest cached hash within the threshold, with its
+        distance. With ``accept``, verdicts it rejects are passed over.
+        """
+        best, best_distance = None, self.threshold + 1
+        for candidate in self._candidates(value):
+            if accept is not None and not accept(self._entries[candidate]):
+                continue
+            distance = hamming(value, candidate)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best)
+        return self._entries[best], best_distance
+
+    def put(self, value: int, verdict: dict, persist: bool = True) -> None:
+        if value not in self._entries:
+            for band, key in enumerate(_bands(value)):
+                self._buckets[band].setdefault(key, set()).add(value)
+        self._entries[value] = verdict
+        self._entries.move_to_end(value)
+        while len(self._entries) > self.capacity:
+            self._evict()
+        if persist and self.path:
+            self._append(value, verdict)
+
+    def _evict(self) -> None:
+        value, _ = self._entries.popitem(last=False)
+        for band, key in enumerate(_bands(value)):
+            bucket = self._buckets[band][key]
+            bucket.discard(value)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                        self.put(int(record["hash"], 16), record["verdict"], persist=False)
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn last line from an interrupted write
+                    self._logged += 1
+        except FileNotFoundError:
+            return
+        except OSError as exc:
+            print(f"⚠️  Could not read image hash cache '{self.path}': {exc}")
+
+    def _append(self, value: int, verdict: dict) -> None:
+        try:
+            if self._logged >= 2 * self.capacity:
+                self._compact()
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps({"hash": f"{value:016x}", "verdict": verdict}) + "\n")
+            self._logged += 1
+        except OSError as exc:
+            print(f"⚠️  Could not write image hash cache '{self.path}': {exc}")
+
+    def _compact(self) -> None:
+        """Rewrite the log with only the live entries, oldest first."""
+        temp = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as handle:
+            for value, verdict in self._entries.items():
+                handle.write(json.dumps({"hash": f"{value:016x}", "verdict": verdict}) + "\n")
+        os.replace(temp, self.path)
+        self._logged = len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "persistent": bool(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
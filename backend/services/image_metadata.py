@@ -0,0 +1,231 @@
+"""
+RealityCheck AI — Image Provenance Metadata
+Header-only scan for metadata that declares an image as AI-generated: IPTC
+digital-source-type values in XMP or C2PA content credentials, generation
+parameters written into PNG text chunks by Stable Diffusion front ends, and
+generator names in the fields that name the producing tool: PNG
+``parameters`` / ``Software`` text, EXIF Software / Make and XMP
+CreatorTool. A generator name anywhere else (a caption, a filename, pixel
+data) is not a declaration and is ignored.
+
+Only the container structure before the pixel data is walked (PNG chunks up
+to IDAT, JPEG segments up to SOS, WebP RIFF chunks, the first TIFF IFD),
+within the first METADATA_SCAN_BYTES of the file, so nothing is decoded.
+Other formats have no metadata read. Metadata is easily stripped, so a
+missing marker says nothing; only positive findings are used.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import struct
+import zlib
+from dataclasses import dataclass, field
+
+METADATA_SCAN_BYTES = int(os.getenv("IMAGE_METADATA_SCAN_BYTES", "65536"))
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_TEXT_CHUNKS = {b"tEXt", b"zTXt", b"iTXt"}
+_PNG_METADATA_CHUNKS = _PNG_TEXT_CHUNKS | {b"eXIf", b"caBX"}
+# PNG text keywords written by generation tools.
+_GENERATION_KEYWORDS = {
+    "parameters": "Stable Diffusion WebUI generation parameters",
+    "prompt": "ComfyUI prompt graph",
+    "workflow": "ComfyUI workflow",
+    "sd-metadata": "InvokeAI generation metadata",
+    "invokeai_metadata": "InvokeAI generation metadata",
+    "dream": "InvokeAI generation metadata",
+}
+
+# IPTC digital source types (also used by C2PA) for generated media.
+_SOURCE_TYPES = re.compile(rb"(compositeWithTrainedAlgorithmicMedia|trainedAlgorithmicMedia)")
+_C2PA = re.compile(rb"c2pa|jumb", re.IGNORECASE)
+_GENERATORS = re.compile(
+    rb"\b(midjourney|dall(?:-|\xc2\xb7| )e|stable[ _-]?diffusion|comfyui|automatic1111|invokeai|novelai|"
+    rb"adobe firefly|google imagen|bing image creator|leonardo\.ai|ideogram|flux\.1|dreamstudio|nightcafe)\b",
+    re.IGNORECASE,
+)
+_XMP_FIELDS = {
+    name: re.compile(
+        rb"(?:\w+:)?" + name + rb"\s*=\s*[\"']([^\"']*)[\"']|<(?:\w+:)?" + name + rb">\s*(?:<rdf:\w+>\s*)?([^<]*)<",
+    )
+    for name in (b"CreatorTool", b"DigitalSourceType")
+}
+_EXIF_TAGS = {0x010F: "Make", 0x0131: "Software"}
+_XMP_PREFIX = b"http://ns.adobe.com/xap/1.0/\x00"
+_SAMPLER_PARAMS = re.compile(rb"\b(steps|sampler|cfg[ _]scale|seed)\b\s*[:=\"]", re.IGNORECASE)
+
+
+@dataclass
+class ProvenanceFinding:
+    """Why an image's own metadata says it is AI-generated."""
+
+    confidence: int
+    markers: list[str] = field(default_factory=list)
+
+    @property
+    def explanation(self) -> str:
+        return "Image metadata declares AI generation: " + "; ".join(self.markers) + "."
+
+
+def _png_segments(head: bytes) -> list[tuple[str, bytes]]:
+    segments = []
+    pos = len(_PNG_SIGNATURE)
+    while pos + 8 <= len(head):
+        length, kind = struct.unpack(">I4s", head[pos : pos + 8])
+        if kind == b"IDAT" or kind == b"IEND":
+            break
+        data = head[pos + 8 : pos + 8 + length]  # may be cut at the scan limit
+        if kind in _PNG_TEXT_CHUNKS:
+            keyword, _, value = data.partition(b"\x00")
+            if kind == b"zTXt" and value:
+                try:
+                    value = zlib.decompressobj().decompress(value[1:], METADATA_SCAN_BYTES)
+                except zlib.error:
+                    value = b""
+            elif kind == b"iTXt" and len(value) >= 2 and value[0] == 1:
+                try:
+                    text = value[2:].split(b"\x00", 2)[-1]
+                    value = zlib.decompressobj().decompress(text, METADATA_SCAN_BYTES)
+                except zlib.error:
+                    value = b""
+            segments.append((keyword.decode("latin-1").strip().lower(), value))
+        elif kind in _PNG_METADATA_CHUNKS:
+            segments.append((kind.decode("latin-1"), data))
+        pos += 12 + length
+    return segments
+
+
+def _jpeg_segments(head: bytes) -> list[tuple[str, bytes]]:
+    segments = []
+    pos = 2
+    while pos + 4 <= len(head) and head[pos] == 0xFF:
+        marker = head[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # fill byte
+            continue
+        if marker == 0xDA or marker == 0xD9:  # start of scan / end of image
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 2
+            continue
+        length = struct.unpack(">H", head[pos + 2 : pos + 4])[0]
+        if 0xE0 <= marker <= 0xEF or marker == 0xFE:  # APPn and COM
+            name = "COM" if marker == 0xFE else f"APP{marker - 0xE0}"
+            segments.append((name, head[pos + 4 : pos + 2 + length]))
+        pos += 2 + length
+    return segments
+
+
+def _webp_segments(head: bytes) -> list[tuple[str, bytes]]:
+    segments = []
+    pos = 12
+    while pos + 8 <= len(head):
+        kind, length = struct.unpack("<4sI", head[pos : pos + 8])
+        if kind in (b"EXIF", b"XMP ", b"C2PA"):
+            segments.append((kind.decode("latin-1").strip(), head[pos + 8 : pos + 8 + length]))
+        pos += 8 + length + (length & 1)
+    return segments
+
+
+def metadata_segments(head: bytes) -> list[tuple[str, bytes]]:
+    """(name, payload) of the metadata blocks in the file header; PNG text chunks are named by keyword."""
+    if head.startswith(_PNG_SIGNATURE):
+        return _png_segments(head)
+    if head.startswith(b"\xff\xd8"):
+        return _jpeg_segments(head)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _webp_segments(head)
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return [("eXIf", head)]  # a TIFF file is itself an EXIF structure
+    return []
+
+
+def exif_fields(payload: bytes) -> dict[str, bytes]:
+    """Make and Software from the first IFD of an EXIF payload (TIFF data, optionally after ``Exif\\0\\0``)."""
+    tiff = payload[6:] if payload.startswith(b"Exif\x00\x00") else payload
+    if tiff[:4] not in (b"II*\x00", b"MM\x00*"):
+        return {}
+    order = "<" if tiff[:2] == b"II" else ">"
+    fields: dict[str, bytes] = {}
+    try:
+        (offset,) = struct.unpack(order + "I", tiff[4:8])
+        (count,) = struct.unpack(order + "H", tiff[offset : offset + 2])
+        for i in range(count):
+            entry = tiff[offset + 2 + 12 * i : offset + 14 + 12 * i]
+            tag, kind, length = struct.unpack(order + "HHI", entry[:8])
+            if tag not in _EXIF_TAGS or kind != 2:  # ASCII
+                continue
+            if length <= 4:
+                value = entry[8 : 8 + length]
+            else:
+                (start,) = struct.unpack(order + "I", entry[8:12])
+                value = tiff[start : start + length]
+            fields[_EXIF_TAGS[tag]] = value.split(b"\x00", 1)[0]
+    except struct.error:
+        pass  # cut at the scan limit
+    return fields
+
+
+def xmp_fields(payload: bytes) -> dict[str, bytes]:
+    """CreatorTool and DigitalSourceType values of an XMP packet."""
+    fields = {}
+    for name, pattern in _XMP_FIELDS.items():
+        match = pattern.search(payload)
+        if match:
+            fields[name.decode("ascii")] = (match.group(1) or match.group(2) or b"").strip()
+    return fields
+
+
+def _generator_fields(name: str, payload: bytes) -> list[tuple[str, bytes]]:
+    """(label, value) of the fields in one metadata block that name the tool which produced the image."""
+    if name in ("parameters", "software"):
+        return [(f"PNG '{name}' text", payload)]
+    if name in ("eXIf", "EXIF") or (name == "APP1" and payload.startswith(b"Exif\x00\x00")):
+        return [(f"EXIF {tag}", value) for tag, value in exif_fields(payload).items()]
+    if name in ("XMP", "xml:com.adobe.xmp") or (name == "APP1" and payload.startswith(_XMP_PREFIX)):
+        return [(f"XMP {tag}", value) for tag, value in xmp_fields(payload).items()]
+    return []
+
+
+def scan_provenance(data: bytes) -> ProvenanceFinding | None:
+    """Look for AI-generation markers in the first METADATA_SCAN_BYTES of an image file."""
+    head = bytes(data[:METADATA_SCAN_BYTES])
+    markers: list[str] = []
+    confidence = 0
+
+    def found(marker: str, score: int) -> None:
+        nonlocal confidence
+        if marker not in markers:
+            markers.append(marker)
+        confidence = max(confidence, score)
+
+    def source_type(value: bytes, origin: str) -> None:
+        match = _SOURCE_TYPES.search(value)
+        if match:
+            kind = match.group(1).decode("ascii")
+            # A composite only contains generated elements.
+            found(f"{origin} digital source type '{kind}'", 90 if kind.startswith("composite") else 97)
+
+    for name, payload in metadata_segments(head):
+        if name in ("APP11", "caBX", "C2PA") and _C2PA.search(payload):
+            # JUMBF manifest: the source type sits in its c2pa.actions assertion.
+            source_type(payload, "C2PA content credentials")
+
+        if name in _GENERATION_KEYWORDS and (name != "prompt" or payload.lstrip().startswith(b"{")):
+            found(f"PNG '{name}' chunk ({_GENERATION_KEYWORDS[name]})", 95)
+        elif name in ("comment", "description", "COM") and len(_SAMPLER_PARAMS.findall(payload)) >= 2:
+            found("sampler settings embedded in image comments", 90)
+
+        for label, value in _generator_fields(name, payload):
+            if label == "XMP DigitalSourceType":
+                source_type(value, "XMP")
+                continue
+            generator = _GENERATORS.search(value)
+            if generator:
+                found(f"generator '{generator.group(1).decode('latin-1')}' named in {label}", 93)
+
+    if not markers:
+        return None
+    return ProvenanceFinding(confidence=confidence, markers=markers)
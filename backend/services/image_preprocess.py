@@ -0,0 +1,257 @@
+"""
+RealityCheck AI — Image Preprocessing
+Shrinks images before they are posted to upstream services, prepared for
+each consumer:
+
+  * OCR (OCR.space): transparent images flattened onto white, grayscale,
+    long side capped at OCR_MAX_SIDE with a Lanczos downscale (keeps glyph
+    edges sharp), then re-encoded as PNG for screenshots or with a falling
+    JPEG quality until the file fits in OCR_TARGET_BYTES (the free tier
+    rejects files over 1 MB). To reach the target the image is shrunk
+    further, but never below OCR_MIN_SIDE so text stays legible. Opaque
+    files that already fit are passed through untouched. A hash of the
+    decoded grayscale pixels and a coarse fingerprint (source size plus a
+    quantized 64x64 downscale, for lossy re-encodes) are recorded as cache
+    keys.
+  * Detector (HF model): RGB resized to the model's square input size
+    (IMAGE_MODEL_INPUT_SIZE), losslessly encoded, since the model's own
+    processor resizes to that size anyway.
+
+OCR preparation runs in a thread pool (Pillow releases the GIL while
+decoding, resampling and encoding); the detector's is done in the image
+decode pool from the frame that is already decoded. Every result records
+its bytes saved and per-stage latency, aggregated in ``preprocess_stats``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+from PIL import Image
+
+OCR_TARGET_BYTES = int(os.getenv("OCR_TARGET_BYTES", str(1000 * 1024)))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2400"))
+OCR_MIN_SIDE = int(os.getenv("OCR_MIN_SIDE", "1200"))
+MODEL_INPUT_SIZE = int(os.getenv("IMAGE_MODEL_INPUT_SIZE", "224"))
+PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_JPEG_QUALITIES = (85, 75, 60, 45)
+_SHRINK_STEP = 0.75
+_FLAT_FRACTION_PNG = 0.5  # images with at least this share of flat neighbours are treated as screenshots
+_FORMATS = {"PNG": "image/png", "JPEG": "image/jpeg"}
+FINGERPRINT_SIDE = 64
+FINGERPRINT_SHIFT = 4  # 16 gray levels
+
+_pool = ThreadPoolExecutor(max_workers=max(1, PREPROCESS_WORKERS), thread_name_prefix="image-preprocess")
+_totals: dict[str, dict] = {}
+_totals_lock = threading.Lock()
+
+
+@dataclass
+class PreparedImage:
+    """Re-encoded image bytes for one consumer, with what the preparation cost and saved."""
+
+    data: bytes
+    content_type: str
+    size: tuple[int, int]
+    original_bytes: int
+    timings_ms: dict[str, float] = field(default_factory=dict)
+    pixel_hash: str = ""  # SHA-256 of the decoded grayscale pixels (OCR only)
+    fingerprint: str = ""  # "<w>x<h>:<hex>" from ``fingerprint`` (OCR only)
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in self.timings_ms.items())
+        return (
+            f"{self.original_bytes} -> {len(self.data)} bytes ({self.saved_bytes} saved), "
+            f"{self.size[0]}x{self.size[1]} {self.content_type}; {stages}"
+        )
+
+
+def _record(consumer: str, prepared: PreparedImage) -> None:
+    with _totals_lock:
+        totals = _totals.setdefault(
+            consumer, {"images": 0, "original_bytes": 0, "prepared_bytes": 0, "bytes_saved": 0, "stage_ms": {}}
+        )
+        totals["images"] += 1
+        totals["original_bytes"] += prepared.original_bytes
+        totals["prepared_bytes"] += len(prepared.data)
+        totals["bytes_saved"] += prepared.saved_bytes
+        for stage, ms in prepared.timings_ms.items():
+            totals["stage_ms"][stage] = round(totals["stage_ms"].get(stage, 0.0) + ms, 3)
+
+
+def preprocess_stats() -> dict:
+    """Cumulative bytes and per-stage latency (total and mean ms) per consumer since process start."""
+    with _totals_lock:
+        stats = {}
+        for consumer, totals in _totals.items():
+            images = max(1, totals["images"])
+            stats[consumer] = {
+                **{key: value for key, value in totals.items() if key != "stage_ms"},
+                "stage_ms": dict(totals["stage_ms"]),
+                "mean_stage_ms": {stage: round(ms / images, 3) for stage, ms in totals["stage_ms"].items()},
+            }
+        return stats
+
+
+def _encode(img: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def _flat_fraction(img: Image.Image) -> float:
+    """Share of horizontally adjacent pixels that are identical, on every 4th row."""
+    rows = np.asarray(img)[::4]
+    return float((rows[:, 1:] == rows[:, :-1]).mean())
+
+
+def _pixel_hash(img: Image.Image) -> str:
+    """Hash of decoded pixels: equal for copies that differ only in container, metadata or lossless encoding."""
+    digest = hashlib.sha256(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode("ascii"))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def fingerprint(img: Image.Image, source_size: tuple[int, int]) -> str:
+    """
+    Coarse copy of a grayscale image that survives lossy re-encoding: the
+    source size, then a FINGERPRINT_SIDE x FINGERPRINT_SIDE box downscale at
+    16 gray levels, two cells per byte.
+    """
+    small = img.resize((FINGERPRINT_SIDE, FINGERPRINT_SIDE), Image.Resampling.BOX)
+    cells = np.asarray(small, dtype=np.uint8) >> FINGERPRINT_SHIFT
+    packed = (cells[:, 0::2] << 4) | cells[:, 1::2]
+    return f"{source_size[0]}x{source_size[1]}:{packed.tobytes().hex()}"
+
+
+def fingerprint_cells(value: str) -> tuple[str, np.ndarray]:
+    """Source size key and the (FINGERPRINT_SIDE, FINGERPRINT_SIDE) gray levels of a ``fingerprint``."""
+    shape, _, data = value.partition(":")
+    packed = np.frombuffer(bytes.fromhex(data), dtype=np.uint8).reshape(FINGERPRINT_SIDE, FINGERPRINT_SIDE // 2)
+    cells = np.empty((FINGERPRINT_SIDE, FINGERPRINT_SIDE), dtype=np.int8)
+    cells[:, 0::2] = packed >> 4
+    cells[:, 1::2] = packed & 0x0F
+    return shape, cells
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in img.info
+
+
+def _on_white(img: Image.Image) -> Image.Image:
+    """Composite a transparent image onto white, as it is displayed (dropping alpha would turn it black)."""
+    rgba = img.convert("RGBA")
+    return Image.alpha_composite(Image.new("RGBA", rgba.size, (255, 255, 255, 255)), rgba)
+
+
+def _scaled(size: tuple[int, int], scale: float) -> tuple[int, int]:
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def prepare_for_ocr(source: bytes | io.IOBase, original_bytes: int | None = None) -> PreparedImage:
+    """
+    Grayscale, downscaled and recompressed copy of an image for OCR, under
+    OCR_TARGET_BYTES when possible. ``source`` is the file's bytes or a
+    binary stream positioned at its start. Raises on unreadable images.
+    """
+    timings: dict[str, float] = {}
+    if isinstance(source, bytes):
+        original_bytes = len(source)
+        source = io.BytesIO(source)
+
+    t0 = time.perf_counter()
+    img = Image.open(source)
+    fmt = img.format
+    width, height = img.size
+    transparent = _has_alpha(img)
+    # Transparent images are always re-encoded: OCR engines flatten alpha onto black.
+    passthrough = (
+        not transparent
+        and original_bytes is not None
+        and original_bytes <= OCR_TARGET_BYTES
+        and max(width, height) <= OCR_MAX_SIDE
+    )
+    # JPEGs decode straight to grayscale at a reduced DCT scale, as long as
+    # that keeps at least OCR_MIN_SIDE.
+    img.draft("L", _scaled((width, height), min(1.0, OCR_MIN_SIDE / max(width, height))))
+    img = (_on_white(img) if transparent else img).convert("L")
+    timings["decode"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    pixel_hash = _pixel_hash(img)
+    prints = fingerprint(img, (width, height))
+    timings["hash"] = (time.perf_counter() - t0) * 1000
+
+    if passthrough:
+        source.seek(0)
+        content_type = _FORMATS.get(fmt) or Image.MIME.get(fmt, "image/png")
+        prepared = PreparedImage(
+            source.read(), content_type, (width, height), original_bytes, timings, pixel_hash, prints
+        )
+        _record("ocr", prepared)
+        return prepared
+
+    t0 = time.perf_counter()
+    if max(img.size) > OCR_MAX_SIDE:
+        target = _scaled(img.size, OCR_MAX_SIDE / max(img.size))
+        img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    timings["resize"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    # Screenshots (flat text on plain backgrounds) compress best losslessly; photos as JPEG.
+    data, content_type = b"", "image/png"
+    if fmt != "JPEG" and _flat_fraction(img) >= _FLAT_FRACTION_PNG:
+        data = _encode(img, "PNG", compress_level=6)
+    if not data or len(data) > OCR_TARGET_BYTES:
+        content_type = "image/jpeg"
+        while True:
+            for quality in _JPEG_QUALITIES:
+                data = _encode(img, "JPEG", quality=quality, optimize=True)
+                if len(data) <= OCR_TARGET_BYTES:
+                    break
+            smaller = _scaled(img.size, _SHRINK_STEP)
+            if len(data) <= OCR_TARGET_BYTES or max(smaller) < OCR_MIN_SIDE:
+                break
+            img = img.resize(smaller, Image.Resampling.LANCZOS)
+    timings["encode"] = (time.perf_counter() - t0) * 1000
+
+    if original_bytes is None:
+        original_bytes = len(data)
+    prepared = PreparedImage(data, content_type, img.size, original_bytes, timings, pixel_hash, prints)
+    _record("ocr", prepared)
+    return prepared
+
+
+async def prepare_for_ocr_off_loop(source: bytes | io.IOBase, original_bytes: int | None = None) -> PreparedImage:
+    """Run ``prepare_for_ocr`` in the preprocessing pool."""
+    return await asyncio.get_running_loop().run_in_executor(_pool, prepare_for_ocr, source, original_bytes)
+
+
+def prepare_for_detector(img: Image.Image, original_bytes: int) -> PreparedImage:
+    """Model-input-sized PNG of an already decoded RGB image."""
+    timings: dict[str, float] = {}
+    t0 = time.perf_counter()
+    size = (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE)
+    resized = img.resize(size, Image.Resampling.BICUBIC, reducing_gap=2.0)
+    timings["resize"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    data = _encode(resized, "PNG", compress_level=1)
+    timings["encode"] = (time.perf_counter() - t0) * 1000
+
+    prepared = PreparedImage(data, "image/png", size, original_bytes, timings)
+    _record("detector", prepared)
+    return prepared
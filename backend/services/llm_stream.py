@@ -0,0 +1,124 @@
+"""
+RealityCheck AI — Streaming LLM Helpers
+Consumes streamed generations and stops reading as soon as the answer is
+complete: at a stop sequence, or, for prompts that ask for JSON, at the
+first complete object carrying the required keys. Returning early leaves
+the caller's ``stream()`` block, which closes the upstream connection and
+ends generation instead of waiting for trailing chatter.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import AsyncIterator
+
+import httpx
+
+from utils.json_extract import JSONObjectScanner, extract_json_objects
+
+
+def _accepted(objects: list[dict], json_keys: tuple[str, ...]) -> dict | None:
+    return next((obj for obj in objects if all(key in obj for key in json_keys)), None)
+
+
+async def collect_generation(
+    pieces: AsyncIterator[str],
+    stop: tuple[str, ...] | list[str] = (),
+    json_keys: tuple[str, ...] | None = None,
+) -> tuple[str, dict | None]:
+    """
+    Read text pieces until a stop sequence, a complete JSON answer or the end.
+
+    With ``json_keys`` set, the first JSON object containing all of them ends
+    the read and is returned alongside the text received so far; otherwise
+    the object is None.
+    """
+    scanner = JSONObjectScanner() if json_keys is not None else None
+    window = max((len(s) for s in stop), default=0)
+    parts: list[str] = []
+    size = 0
+    tail = ""
+
+    async for piece in pieces:
+        if window:
+            probe = tail + piece
+            if any(s in probe for s in stop):
+                text = "".join(parts) + piece
+                begin = size - len(tail)
+                cut = min(i for i in (text.find(s, begin) for s in stop) if i >= 0)
+                text = text[:cut]
+                found = _accepted(extract_json_objects(text), json_keys) if json_keys is not None else None
+                return text, found
+            tail = probe[-(window - 1) :] if window > 1 else ""
+
+        parts.append(piece)
+        size += len(piece)
+        if scanner is not None:
+            found = _accepted(scanner.feed(piece), json_keys)
+            if found is not None:
+                return "".join(parts), found
+
+    found = _accepted(scanner.close(), json_keys) if scanner is not None else None
+    return "".join(parts), found
+
+
+async def stop_pieces(pieces: AsyncIterator[str], stop: tuple[str, ...] | list[str] = ()) -> AsyncIterator[str]:
+    """
+    Re-yield text pieces up to (not including) the first stop sequence, for
+    backends that ignore ``stop``. Text that could still be the start of a
+    stop sequence is held back until the next piece decides it.
+    """
+    if not stop:
+        async for piece in pieces:
+            yield piece
+        return
+
+    hold = max(len(s) for s in stop) - 1
+    buffer = ""
+    async for piece in pieces:
+        buffer += piece
+        cuts = [i for i in (buffer.find(s) for s in stop) if i >= 0]
+        if cuts:
+            if min(cuts):
+                yield buffer[: min(cuts)]
+            return
+        if len(buffer) > hold:
+            ready = len(buffer) - hold
+            yield buffer[:ready]
+            buffer = buffer[ready:]
+    if buffer:
+        yield buffer
+
+
+def cut_at_stop(text: str, stop: tuple[str, ...] | list[str] = ()) -> str:
+    """``text`` up to the first stop sequence."""
+    cuts = [i for i in (text.find(s) for s in stop) if i >= 0]
+    return text[: min(cuts)] if cuts else text
+
+
+async def cloudflare_pieces(response: httpx.Response) -> AsyncIterator[str]:
+    """
+    Text pieces of a Workers AI response.
+
+    Streams (``"stream": true``) arrive as ``data: {"response": ...}`` events;
+    a plain JSON body is yielded as a single piece. An unexpected body raises
+    KeyError/TypeError/ValueError.
+    """
+    if "text/event-stream" not in response.headers.get("content-type", ""):
+        body = json.loads(await response.aread())
+        yield body["result"]["response"]
+        return
+
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            continue
+        piece = event.get("response") if isinstance(event, dict) else None
+        if piece:
+            yield str(piece)
@@ -1,111 +1,118 @@
 """
 RealityCheck AI — OCR Service
-Extracts text from uploaded images using OCR.space API (free, no auth required).
+Extracts text from uploaded images with the fastest healthy OCR engine:
+local Tesseract when installed, OCR.space API (free, no auth required)
+otherwise or as a fallback.
 """
 
+import asyncio
 import os
-import httpx
-from PIL import Image
-from io import BytesIO
-from fastapi import UploadFile, HTTPException
+from fastapi import UploadFile
 
+from services.backend_health import HealthTracker
+from services.image_preprocess import PreparedImage, prepare_for_ocr_off_loop
+from services.ocr_cache import DEFAULT_TOLERANCE, OCRResultCache
+from services.ocr_engines import OCRSelector, build_engines
+from utils.uploads import MAX_IMAGE_UPLOAD_BYTES, OCR_IMAGE_TYPES, Upload, read_upload
 
-async def extract_text_from_image(file: UploadFile) -> str | None:
+# Engines in preference order; the health tracker reorders them by observed latency and errors.
+OCR_ENGINES = os.getenv("OCR_ENGINES", "tesseract,ocr.space")
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "2000"))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "").strip()
+OCR_CACHE_MATCH_REENCODES = os.getenv("OCR_CACHE_MATCH_REENCODES", "true").lower() != "false"
+
+_engines = OCRSelector(build_engines(OCR_ENGINES), HealthTracker(default_latency=5.0))
+# Extracted text by upload bytes, decoded pixels and fingerprint, so repeat uploads skip OCR.
+_cache = OCRResultCache(
+    OCR_CACHE_SIZE, OCR_CACHE_PATH or None, DEFAULT_TOLERANCE if OCR_CACHE_MATCH_REENCODES else None
+)
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def ocr_engine_stats() -> dict:
+    """Availability, ranking and latency / error statistics of the OCR engines."""
+    return _engines.snapshot()
+
+
+def ocr_cache_stats() -> dict:
+    """Size and hit counters of the OCR result cache."""
+    return _cache.stats()
+
+
+async def _flush_cache() -> None:
+    """Write queued cache log lines in a worker thread, keeping file I/O off the event loop."""
+    if _cache.path:
+        await asyncio.to_thread(_cache.flush)
+
+
+async def _extract_shared(prepared: PreparedImage) -> tuple[str, str] | None:
+    """Run OCR once per pixel hash; concurrent uploads of the same image await the same task."""
+    key = prepared.pixel_hash
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_engines.extract(prepared))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield so a disconnecting client does not cancel OCR other uploads await.
+    return await asyncio.shield(task)
+
+
+async def extract_text_from_image(file: UploadFile | Upload) -> str | None:
     """
-    Extract text from image using OCR.space API.
-    Uses OCR_SPACE_API_KEY env var if set, otherwise uses free tier key.
+    Extract text from an image with the best available OCR engine.
+    OCR.space uses OCR_SPACE_API_KEY env var if set, otherwise the free tier key.
+    Accepts a raw upload (read here, bounded by UPLOAD_MAX_IMAGE_BYTES) or an
+    Upload the caller has already read. Results are cached by file hash,
+    pixel hash and fingerprint; images without text are not cached.
     """
-    allowed_types = {"image/png", "image/jpeg", "image/jpg", "image/webp", "image/bmp"}
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported image type '{file.content_type}'. "
-                   f"Allowed: {', '.join(allowed_types)}",
+    if isinstance(file, Upload):
+        upload, owned = file, False
+    else:
+        upload = await read_upload(
+            file,
+            MAX_IMAGE_UPLOAD_BYTES,
+            OCR_IMAGE_TYPES,
+            unsupported_detail="Unsupported image type. Allowed: PNG, JPEG, WebP, BMP.",
         )
+        owned = True
 
     try:
-        contents = await file.read()
-        
-        # Validate image
+        cached = _cache.get_by_bytes(upload.sha256)
+        if cached is not None:
+            print(f"✅ OCR cache hit (same file, read by {cached['engine']})")
+            return cached["text"]
+
+        # Validate and shrink the image (grayscale, text-preserving downscale, <1MB)
         try:
-            image = Image.open(BytesIO(contents))
-            image.verify()
-            print(f"✅ Image validated: {image.format} {image.size}")
+            with upload.open() as stream:
+                prepared = await prepare_for_ocr_off_loop(stream, upload.size)
+            print(f"✅ Image prepared for OCR: {prepared.summary()}")
         except Exception as e:
             print(f"⚠️  Invalid image file: {e}")
             return None
 
-        # Get API key from environment or use default
-        api_key = os.getenv("OCR_SPACE_API_KEY", "K87899142C87")
-        print(f"ℹ️  Using API key: {api_key[:10]}...")
-
-        # Map content type to file extension
-        ext_map = {
-            "image/png": "png",
-            "image/jpeg": "jpg",
-            "image/jpg": "jpg",
-            "image/webp": "webp",
-            "image/bmp": "bmp",
-        }
-        ext = ext_map.get(file.content_type, "png")
-        filename = f"image.{ext}"
-
-        # Call OCR.space API
-        print("ℹ️  Sending image to OCR.space API...")
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            files = {"filename": (filename, contents, file.content_type)}
-            data = {
-                "apikey": api_key,
-                "isOverlayRequired": "false",
-                "language": "eng",
-            }
-            
-            response = await client.post(
-                "https://api.ocr.space/parse/image",
-                files=files,
-                data=data,
-            )
-        
-        print(f"ℹ️  OCR.space response status: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"⚠️  OCR.space API error: {response.status_code}")
-            print(f"Response: {response.text[:200]}")
-            return None
-        
-        result = response.json()
-        print(f"ℹ️  Full response: {result}")
-        
-        if result.get("IsErroredOnProcessing"):
-            error_msg = result.get("ErrorMessage", "Unknown error")
-            print(f"⚠️  OCR error: {error_msg}")
-            return None
-        
-        # Handle nested ParsedResults structure
-        parsed_text = ""
-        if "ParsedResults" in result and isinstance(result["ParsedResults"], list):
-            for item in result["ParsedResults"]:
-                if "ParsedText" in item:
-                    parsed_text += item["ParsedText"]
-        else:
-            # Fallback to top-level ParsedText
-            parsed_text = result.get("ParsedText", "")
-        
-        parsed_text = parsed_text.strip()
-        
-        if parsed_text:
-            print(f"✅ OCR successful! Extracted {len(parsed_text)} characters")
-            return parsed_text
-        else:
+        cached = _cache.get_by_pixels(prepared.pixel_hash, upload.sha256, prepared.fingerprint)
+        if cached is not None:
+            await _flush_cache()
+            print(f"✅ OCR cache hit (same image, read by {cached['engine']})")
+            return cached["text"]
+
+        result = await _extract_shared(prepared)
+        if result is None:
             print("⚠️  No text detected in image")
             return None
 
-    except httpx.TimeoutException:
-        print("⚠️  OCR.space API timeout")
-        return None
+        parsed_text, engine = result
+        _cache.put(prepared.pixel_hash, upload.sha256, parsed_text, engine, prepared.fingerprint)
+        await _flush_cache()
+        print(f"✅ OCR successful with {engine}! Extracted {len(parsed_text)} characters")
+        return parsed_text
+
     except Exception as exc:
         print(f"❌ Error in OCR: {type(exc).__name__}: {str(exc)}")
         import traceback
         traceback.print_exc()
         return None
+    finally:
+        if owned:
+            upload.close()
@@ -0,0 +1,244 @@
+"""
+RealityCheck AI — OCR Result Cache
+Text extracted from images, keyed three ways so repeat uploads skip OCR:
+
+  * the SHA-256 of the uploaded bytes (computed while streaming the upload),
+    checked before the image is even decoded;
+  * the SHA-256 of the decoded grayscale pixels, so copies that differ only
+    in container, metadata or lossless re-encoding also hit;
+  * a coarse fingerprint (source size plus a 64x64 downscale at 16 gray
+    levels), so lossy re-encodes of the same image hit too. Entries are
+    bucketed by source size, and a candidate matches when no cell differs
+    by more than ``tolerance`` levels.
+
+JPEG recompression moves a fingerprint cell by a fraction of a level, while
+an edit that changes whole glyphs moves the cells it covers by several. A
+one-character edit in a large screenshot can still stay within tolerance and
+return the old text. OCR_CACHE_MATCH_REENCODES=false turns the fingerprint
+lookup off where that matters more than the saved OCR calls.
+
+Entries are evicted LRU-first and may be persisted to an append-only
+JSON-lines file (OCR_CACHE_PATH). Lookups only queue log lines; ``flush``
+writes them and is meant to run off the event loop (``asyncio.to_thread``).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from services.image_preprocess import fingerprint_cells
+
+MAX_BYTE_ALIASES = 8  # byte hashes remembered per pixel hash
+DEFAULT_TOLERANCE = 1  # fingerprint gray levels a matching cell may differ by
+
+
+class OCRResultCache:
+    """Bounded LRU map from pixel hash to OCR text, also reachable by byte hash and fingerprint."""
+
+    def __init__(self, capacity: int, path: str | None = None, tolerance: int | None = DEFAULT_TOLERANCE):
+        self.capacity = max(1, int(capacity))
+        self.path = path or None
+        self.tolerance = tolerance  # None disables fingerprint matching
+        self.byte_hits = 0
+        self.pixel_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._by_bytes: dict[str, str] = {}
+        self._by_shape: dict[str, dict[str, np.ndarray]] = {}
+        self._logged = 0
+        self._pending: list[str] = []
+        self._rewrite = False
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if self.path:
+            self._load()
+
+    def get_by_bytes(self, byte_hash: str) -> dict | None:
+        """Entry (``text``, ``engine``) for an exact byte match; a miss is not counted (the pixel lookup follows)."""
+        key = self._by_bytes.get(byte_hash)
+        if key is None:
+            return None
+        self.byte_hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def get_by_pixels(self, pixel_hash: str, byte_hash: str | None = None, fingerprint: str = "") -> dict | None:
+        """
+        Entry for a pixel match or, failing that, a fingerprint match,
+        remembering ``byte_hash`` as another route to it.
+        """
+        key = pixel_hash if pixel_hash in self._entries else None
+        if key is not None:
+            self.pixel_hits += 1
+        else:
+            key = self._similar(fingerprint)
+            if key is None:
+                self.misses += 1
+                return None
+            self.similar_hits += 1
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        if byte_hash and byte_hash not in self._by_bytes:
+            self._alias(key, byte_hash)
+            self._append(key, byte_hash, entry)
+        return entry
+
+    def _similar(self, fingerprint: str) -> str | None:
+        if self.tolerance is None or not fingerprint:
+            return None
+        shape, cells = fingerprint_cells(fingerprint)
+        best, best_distance = None, self.tolerance + 1
+        for key, candidate in self._by_shape.get(shape, {}).items():
+            distance = int(np.abs(candidate - cells).max())
+            if distance < best_distance:
+                best, best_distance = key, distance
+        return best
+
+    def put(
+        self,
+        pixel_hash: str,
+        byte_hash: str | None,
+        text: str,
+        engine: str,
+        fingerprint: str = "",
+        persist: bool = True,
+    ) -> None:
+        entry = self._entries.get(pixel_hash)
+        if entry is None:
+            entry = {"text": text, "engine": engine, "bytes": [], "fingerprint": fingerprint}
+            self._entries[pixel_hash] = entry
+            if fingerprint:
+                shape, cells = fingerprint_cells(fingerprint)
+                self._by_shape.setdefault(shape, {})[pixel_hash] = cells
+        else:
+            entry.update(text=text, engine=engine)
+        self._entries.move_to_end(pixel_hash)
+        if byte_hash:
+            self._alias(pixel_hash, byte_hash)
+        while len(self._entries) > self.capacity:
+            self._evict()
+        if persist:
+            self._append(pixel_hash, byte_hash, entry)
+
+    def _alias(self, pixel_hash: str, byte_hash: str) -> None:
+        aliases = self._entries[pixel_hash]["bytes"]
+        if byte_hash in aliases:
+            return
+        aliases.append(byte_hash)
+        self._by_bytes[byte_hash] = pixel_hash
+        if len(aliases) > MAX_BYTE_ALIASES:
+            self._by_bytes.pop(aliases.pop(0), None)
+
+    def _evict(self) -> None:
+        pixel_hash, entry = self._entries.popitem(last=False)
+        for byte_hash in entry["bytes"]:
+            self._by_bytes.pop(byte_hash, None)
+        if entry["fingerprint"]:
+            shape = entry["fingerprint"].partition(":")[0]
+            bucket = self._by_shape.get(shape, {})
+            bucket.pop(pixel_hash, None)
+            if not bucket:
+                self._by_shape.pop(shape, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_bytes.clear()
+        self._by_shape.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                        self.put(
+                            record["pixels"],
+                            record.get("bytes"),
+                            record["text"],
+                            record["engine"],
+                            record.get("fingerprint") or "",
+                            persist=False,
+                        )
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn last line from an interrupted write
+                    self._logged += 1
+        except FileNotFoundError:
+            return
+        except OSError as exc:
+            print(f"⚠️  Could not read OCR cache '{self.path}': {exc}")
+
+    def _append(self, pixel_hash: str, byte_hash: str | None, entry: dict) -> None:
+        """Queue a log line for ``flush``; past 2x capacity, queue a rewrite of the live entries instead."""
+        if not self.path:
+            return
+        with self._pending_lock:
+            if self._logged >= 2 * self.capacity:
+                self._pending = self._snapshot()
+                self._rewrite = True
+                self._logged = len(self._pending)
+            else:
+                self._pending.append(self._line(pixel_hash, byte_hash, entry))
+                self._logged += 1
+
+    @staticmethod
+    def _line(pixel_hash: str, byte_hash: str | None, entry: dict) -> str:
+        record = {
+            "pixels": pixel_hash,
+            "bytes": byte_hash,
+            "text": entry["text"],
+            "engine": entry["engine"],
+            "fingerprint": entry["fingerprint"],
+        }
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def _snapshot(self) -> list[str]:
+        """Log lines of the live entries and their byte aliases, oldest first."""
+        return [
+            self._line(pixel_hash, byte_hash, entry)
+            for pixel_hash, entry in self._entries.items()
+            for byte_hash in entry["bytes"] or [None]
+        ]
+
+    def flush(self) -> None:
+        """Write the queued log lines (or the queued rewrite). Blocking; safe to call from any thread."""
+        with self._write_lock:
+            with self._pending_lock:
+                lines, rewrite = self._pending, self._rewrite
+                self._pending, self._rewrite = [], False
+            if not lines:
+                return
+            try:
+                if rewrite:
+                    temp = f"{self.path}.tmp"
+                    with open(temp, "w", encoding="utf-8") as handle:
+                        handle.writelines(lines)
+                    os.replace(temp, self.path)
+                else:
+                    with open(self.path, "a", encoding="utf-8") as handle:
+                        handle.writelines(lines)
+            except OSError as exc:
+                print(f"⚠️  Could not write OCR cache '{self.path}': {exc}")
+
+    def stats(self) -> dict:
+        hits = self.byte_hits + self.pixel_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "persistent": bool(self.path),
+            "byte_hits": self.byte_hits,
+            "pixel_hits": self.pixel_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
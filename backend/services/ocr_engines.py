@@ -0,0 +1,260 @@
+"""
+RealityCheck AI — OCR Engines
+Interchangeable OCR backends behind one interface, and a selector that
+routes each image to the engine expected to answer fastest.
+
+  * OCR.space: the hosted API (shared free-tier key unless
+    OCR_SPACE_API_KEY is set); rate limited and slow under load.
+  * Tesseract: the local ``tesseract`` binary through pytesseract, run in a
+    process pool of TESSERACT_WORKERS with at most TESSERACT_QUEUE images
+    in flight; beyond that the engine reports itself busy instead of
+    queueing without bound. Disabled when pytesseract or the binary is
+    missing (e.g. on serverless deployments).
+
+The selector ranks the available engines with a HealthTracker (latency EWMA
+inflated by error rate), tries them in that order and falls back to the
+next one when an engine fails, times out or finds no text. A small share of
+images goes to the lowest-ranked engine first so it can recover.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import httpx
+
+from services.backend_health import HealthTracker
+from services.image_preprocess import PreparedImage
+
+try:
+    import pytesseract
+except ImportError:  # optional: local OCR is skipped without it
+    pytesseract = None
+
+OCR_SPACE_URL = "https://api.ocr.space/parse/image"
+OCR_SPACE_TIMEOUT = 30.0
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", "").strip()
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+TESSERACT_WORKERS = int(os.getenv("TESSERACT_WORKERS", str(min(2, os.cpu_count() or 1))))
+TESSERACT_QUEUE = int(os.getenv("TESSERACT_QUEUE", "8"))
+TESSERACT_TIMEOUT = float(os.getenv("TESSERACT_TIMEOUT", "20"))
+OCR_EXPLORE_EVERY = int(os.getenv("OCR_EXPLORE_EVERY", "20"))
+
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/bmp": "bmp"}
+
+
+class OCREngineError(RuntimeError):
+    """An engine could not produce a result for this image."""
+
+
+class OCREngineBusy(OCREngineError):
+    """An engine is at capacity; says nothing about its health."""
+
+
+class OCREngine:
+    """Interface of an OCR backend."""
+
+    name = "engine"
+
+    def available(self) -> bool:
+        return True
+
+    async def extract(self, image: PreparedImage) -> str:
+        """Text found in ``image`` ("" for none); raises OCREngineError on failure."""
+        raise NotImplementedError
+
+
+class OCRSpaceEngine(OCREngine):
+    name = "ocr.space"
+
+    async def extract(self, image: PreparedImage) -> str:
+        api_key = os.getenv("OCR_SPACE_API_KEY", "K87899142C87")
+        filename = f"image.{_EXTENSIONS.get(image.content_type, 'png')}"
+        try:
+            async with httpx.AsyncClient(timeout=OCR_SPACE_TIMEOUT) as client:
+                response = await client.post(
+                    OCR_SPACE_URL,
+                    files={"filename": (filename, image.data, image.content_type)},
+                    data={"apikey": api_key, "isOverlayRequired": "false", "language": "eng"},
+                )
+        except httpx.TimeoutException:
+            raise OCREngineError("OCR.space API timeout")
+        except httpx.HTTPError as exc:
+            raise OCREngineError(f"OCR.space request failed: {exc}")
+
+        if response.status_code != 200:
+            raise OCREngineError(f"OCR.space API error {response.status_code}: {response.text[:200]}")
+        try:
+            result = response.json()
+        except ValueError:
+            raise OCREngineError("OCR.space returned invalid JSON")
+        if result.get("IsErroredOnProcessing"):
+            raise OCREngineError(f"OCR.space error: {result.get('ErrorMessage', 'Unknown error')}")
+
+        # Handle nested ParsedResults structure
+        if isinstance(result.get("ParsedResults"), list):
+            return "".join(item.get("ParsedText", "") for item in result["ParsedResults"]).strip()
+        return str(result.get("ParsedText", "")).strip()
+
+
+def _tesseract_worker_init() -> None:
+    # One thread per tesseract process: the pool provides the parallelism.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _run_tesseract(path: str, lang: str, timeout: float, cmd: str) -> str:
+    if cmd:
+        pytesseract.pytesseract.tesseract_cmd = cmd
+    # A path skips pytesseract's decode and PNG re-encode of a PIL image.
+    return pytesseract.image_to_string(path, lang=lang, timeout=timeout)
+
+
+class TesseractEngine(OCREngine):
+    name = "tesseract"
+
+    def __init__(self, workers: int = TESSERACT_WORKERS, queue_size: int = TESSERACT_QUEUE):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._available: bool | None = None
+
+    def available(self) -> bool:
+        if self._available is None:
+            self._available = pytesseract is not None and shutil.which(TESSERACT_CMD or "tesseract") is not None
+        return self._available
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned, not forked: the server process runs threads and an event loop.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=get_context("spawn"), initializer=_tesseract_worker_init
+            )
+        return self._pool
+
+    def _release(self, path: str) -> None:
+        # Runs when the pool job itself ends, not when its caller gives up
+        # waiting, so a job still queued or running keeps its slot and file.
+        self._pending -= 1
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    async def extract(self, image: PreparedImage) -> str:
+        if self._pending >= self.queue_size:
+            raise OCREngineBusy(f"tesseract queue full ({self.queue_size} images in flight)")
+        suffix = "." + _EXTENSIONS.get(image.content_type, "png")
+        handle = tempfile.NamedTemporaryFile(prefix="ocr-", suffix=suffix, delete=False)
+        path = handle.name
+        self._pending += 1
+        try:
+            with handle:
+                handle.write(image.data)
+            future = self._executor().submit(_run_tesseract, path, TESSERACT_LANG, TESSERACT_TIMEOUT, TESSERACT_CMD)
+        except BaseException as exc:
+            self._release(path)
+            if isinstance(exc, BrokenProcessPool):
+                self._pool = None  # a worker died; start a fresh pool next time
+                raise OCREngineError("tesseract worker crashed")
+            if isinstance(exc, OSError):
+                raise OCREngineError(f"tesseract failed: {exc}")
+            raise
+        loop = asyncio.get_running_loop()
+
+        def done(_) -> None:
+            try:
+                loop.call_soon_threadsafe(self._release, path)
+            except RuntimeError:  # loop already closed (shutdown)
+                self._release(path)
+
+        future.add_done_callback(done)
+        try:
+            # Tesseract kills itself at TESSERACT_TIMEOUT; the margin covers queueing behind other images.
+            # Giving up cancels the job if it is still queued; a running one finishes and then releases.
+            text = await asyncio.wait_for(asyncio.wrap_future(future), timeout=2 * TESSERACT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise OCREngineError("tesseract timeout")
+        except BrokenProcessPool:
+            self._pool = None  # a worker died; start a fresh pool next time
+            raise OCREngineError("tesseract worker crashed")
+        except (RuntimeError, OSError) as exc:
+            # pytesseract raises RuntimeError (its timeout, TesseractError) or OSError (binary not found).
+            raise OCREngineError(f"tesseract failed: {exc}")
+        return text.strip()
+
+    def snapshot(self) -> dict:
+        return {"workers": self.workers, "queue_size": self.queue_size, "in_flight": self._pending}
+
+
+class OCRSelector:
+    """
+    Tries the available engines fastest-healthy-first, falling back on
+    failure or empty results. Every ``explore_every``-th image tries the
+    lowest-ranked engine first, so an engine demoted after a transient
+    failure gets the samples it needs to recover.
+    """
+
+    def __init__(self, engines: list[OCREngine], health: HealthTracker, explore_every: int = OCR_EXPLORE_EVERY):
+        self.engines = engines
+        self.health = health
+        self.explore_every = explore_every
+        self._requests = 0
+
+    def ranked(self) -> list[OCREngine]:
+        by_name = {engine.name: engine for engine in self.engines if engine.available()}
+        return [by_name[name] for name in self.health.rank(list(by_name))]
+
+    async def extract(self, image: PreparedImage) -> tuple[str, str] | None:
+        """(text, engine name) from the first engine that reads any text, or None."""
+        order = self.ranked()
+        self._requests += 1
+        if self.explore_every > 0 and self._requests % self.explore_every == 0 and len(order) > 1:
+            order.insert(0, order.pop())
+        for engine in order:
+            health = self.health.get(engine.name)
+            started = time.monotonic()
+            try:
+                text = await engine.extract(image)
+            except OCREngineBusy as exc:
+                print(f"ℹ️  OCR engine {engine.name} skipped: {exc}")
+                continue
+            except OCREngineError as exc:
+                health.record_failure(time.monotonic() - started)
+                print(f"⚠️  OCR engine {engine.name} failed: {exc}")
+                continue
+            health.record_success(time.monotonic() - started)
+            if text:
+                return text, engine.name
+            # No text is a valid answer, but another engine may still read it.
+            print(f"⚠️  OCR engine {engine.name} found no text")
+        return None
+
+    def snapshot(self) -> dict:
+        health = self.health.snapshot()
+        engines = {}
+        for engine in self.engines:
+            engines[engine.name] = {"available": engine.available(), **health.get(engine.name, {})}
+            if isinstance(engine, TesseractEngine):
+                engines[engine.name].update(engine.snapshot())
+        return {"order": [engine.name for engine in self.ranked()], "engines": engines}
+
+
+def build_engines(names: str) -> list[OCREngine]:
+    """Engines in the configured preference order (comma-separated names), unknown names ignored."""
+    factories = {"tesseract": TesseractEngine, "ocr.space": OCRSpaceEngine, "ocrspace": OCRSpaceEngine}
+    engines: list[OCREngine] = []
+    for name in (part.strip().lower() for part in names.split(",") if part.strip()):
+        factory = factories.get(name)
+        if factory is None:
+            print(f"⚠️  Unknown OCR engine '{name}' in OCR_ENGINES; ignoring")
+        elif not any(isinstance(engine, factory) for engine in engines):
+            engines.append(factory())
+    return engines or [OCRSpaceEngine()]
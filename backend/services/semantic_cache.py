@@ -0,0 +1,89 @@
+"""
+RealityCheck AI — Semantic Cache
+Bounded cache keyed by normalized embedding vectors: a lookup hits when the
+cosine similarity to a stored key reaches the threshold, so paraphrased
+questions reuse an earlier answer.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over unit vectors with LRU eviction.
+
+    Keys live in one preallocated matrix so a lookup is a single
+    matrix-vector product; eviction replaces the least recently used row.
+    """
+
+    def __init__(self, capacity: int, threshold: float, dim: int):
+        self.capacity = max(1, int(capacity))
+        self.threshold = float(threshold)
+        self.hits = 0
+        self.misses = 0
+        self._keys = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._values: list[Any] = [None] * self.capacity
+        self._last_used = np.zeros(self.capacity, dtype=np.int64)
+        self._size = 0
+        self._tick = 0
+
+    def _normalize(self, vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def get(self, vector: np.ndarray) -> Any:
+        if self._size:
+            sims = self._keys[: self._size] @ self._normalize(vector)
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                self._tick += 1
+                self._last_used[best] = self._tick
+                self.hits += 1
+                return self._values[best]
+        self.misses += 1
+        return None
+
+    def put(self, vector: np.ndarray, value: Any) -> None:
+        key = self._normalize(vector)
+        if self._size:
+            sims = self._keys[: self._size] @ key
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                # Same question again: refresh the entry instead of storing a near-duplicate.
+                slot = best
+            elif self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+        else:
+            slot = 0
+            self._size = 1
+        self._tick += 1
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._last_used[slot] = self._tick
+
+    def clear(self) -> None:
+        self._values = [None] * self.capacity
+        self._last_used[:] = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,260 @@
+"""
+RealityCheck AI — Sentence Index
+Sentence table, TF-IDF keyphrases and hashed TF-IDF sentence vectors for a
+student workspace. It is built once when documents are added and lets the
+offline (no-LLM) fallbacks pick salient, non-redundant sentences and real
+key concepts with a few matrix operations instead of re-splitting the whole
+library on every request.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Iterable
+
+import numpy as np
+
+HASH_DIM = 256  # hashed vocabulary size for sentence vectors
+MAX_SENTENCES = 5000  # per workspace; later sentences are ignored
+MIN_SENTENCE_CHARS = 25
+OVERLAP_PROBE_CHARS = 40  # leading characters of a cut sentence looked up in the neighbouring chunk
+CANDIDATE_POOL = 200  # best-scoring sentences considered by the diversity step
+
+# Sentences end at closing punctuation and at blank lines. A single line break
+# ends one too when its line has no closing punctuation and the next line
+# starts like a new item (capital, digit, bullet): headings, bullet lists and
+# OCR lines. A line continuing in lower case is PDF line wrapping.
+_SENTENCE_SPLIT = re.compile(
+    r"(?<=[.!?])\s+|\n\s*\n|(?<=[^.!?\s])[ \t]*\n\s*(?=[-\u2022*\u2013\u25aa>\d(\[\"'A-Z])"
+)
+_BULLET = re.compile(r"^(?:[-\u2022*\u2013\u25aa>]|\(?\d{1,2}[.)])\s+")
+_SENTENCE_START = re.compile(r"^[\"'(\[]?[A-Z0-9]")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]?$")
+_WORD = re.compile(r"[a-z][a-z0-9'-]*")
+_STOPWORDS = frozenset(
+    """
+    a about above after again against all also am an and any are as at be because been before being
+    below between both but by can could did do does doing down during each few for from further had
+    has have having he her here hers him his how i if in into is it its itself just may me might more
+    most must my no nor not now of off on once only or other our ours out over own same she should so
+    some such than that the their theirs them then there these they this those through to too under
+    until up upon use used using very via was we were what when where which while who whom why will
+    with within without would you your yours one two three many much often usually thus therefore
+    however called known example e g i e etc
+    """.split()
+)
+
+
+def _term_slot(term: str) -> int:
+    # crc32 is stable across processes, unlike hash().
+    return zlib.crc32(term.encode("utf-8")) % HASH_DIM
+
+
+class SentenceIndex:
+    """
+    Deduplicated sentences with their chunk ids, keyphrase statistics and
+    hashed term counts.
+
+    Term and phrase document frequencies are kept as counts, so new chunks
+    can be appended without rebuilding; IDF weights and the normalized
+    sentence vectors are derived lazily when next needed.
+    """
+
+    def __init__(self):
+        self.sentences: list[str] = []
+        self.chunk_ids: list[int] = []
+        self._seen: set[str] = set()
+        self._rows: list[np.ndarray] = []
+        self._phrases: list[list[str]] = []
+        self._phrase_tf: Counter = Counter()
+        self._phrase_df: Counter = Counter()
+        self._term_df = np.zeros(HASH_DIM, dtype=np.float32)
+        self._vectors: np.ndarray | None = None
+        self._salience: np.ndarray | None = None
+        self._phrase_scores: dict[str, float] | None = None
+        self._top_phrases: list[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self.sentences)
+
+    def copy(self) -> "SentenceIndex":
+        """An independent copy that can be extended while this one keeps serving readers."""
+        clone = SentenceIndex()
+        clone.sentences = list(self.sentences)
+        clone.chunk_ids = list(self.chunk_ids)
+        clone._seen = set(self._seen)
+        clone._rows = list(self._rows)
+        clone._phrases = list(self._phrases)
+        clone._phrase_tf = Counter(self._phrase_tf)
+        clone._phrase_df = Counter(self._phrase_df)
+        clone._term_df = self._term_df.copy()
+        return clone
+
+    # ── Building ─────────────────────────────────────────────────────────────
+    def add_chunks(self, chunks: Iterable[tuple[int, str]]) -> None:
+        """
+        Index ``(chunk_id, text)`` pairs, given in document order so that
+        sentences cut by a chunk boundary can be checked against the
+        neighbouring chunk.
+        """
+        chunks = list(chunks)
+        flat = [" ".join(text.split()) for _, text in chunks]
+        for position, (chunk_id, text) in enumerate(chunks):
+            previous = flat[position - 1] if position > 0 else ""
+            following = flat[position + 1] if position + 1 < len(chunks) else ""
+            parts = _SENTENCE_SPLIT.split(text)
+            for i, raw in enumerate(parts):
+                if len(self.sentences) >= MAX_SENTENCES:
+                    break
+                sentence = _BULLET.sub("", " ".join(raw.split()))
+                key = sentence.lower()
+                if len(sentence) < MIN_SENTENCE_CHARS or key in self._seen:
+                    continue  # fragments, and sentences repeated by chunk overlap
+                probe = " ".join(raw.split())[:OVERLAP_PROBE_CHARS]
+                if (i == 0 and not _SENTENCE_START.match(sentence) and probe in previous) or (
+                    i == len(parts) - 1 and not _SENTENCE_END.search(sentence) and probe in following
+                ):
+                    continue  # cut by a chunk boundary; the overlapping neighbour holds more of it
+                words = _WORD.findall(key)
+                terms = [w for w in words if w not in _STOPWORDS and len(w) > 2]
+                if len(terms) < 2:
+                    continue
+                self._seen.add(key)
+                self.sentences.append(sentence)
+                self.chunk_ids.append(int(chunk_id))
+
+                row = np.bincount([_term_slot(t) for t in terms], minlength=HASH_DIM).astype(np.float32)
+                self._rows.append(row)
+                self._term_df += row > 0
+
+                phrases = terms + [
+                    f"{a} {b}"
+                    for a, b in zip(words, words[1:])
+                    if a not in _STOPWORDS and b not in _STOPWORDS and len(a) > 2 and len(b) > 2
+                ]
+                self._phrases.append(phrases)
+                self._phrase_tf.update(phrases)
+                self._phrase_df.update(set(phrases))
+
+        self._vectors = None
+        self._salience = None
+        self._phrase_scores = None
+        self._top_phrases = None
+
+    # ── Vectors and scores ───────────────────────────────────────────────────
+    def _idf(self) -> np.ndarray:
+        count = max(1, len(self.sentences))
+        return np.log((1.0 + count) / (1.0 + self._term_df)) + 1.0
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """L2-normalized hashed TF-IDF vectors, one row per sentence."""
+        if self._vectors is None:
+            if not self._rows:
+                self._vectors = np.zeros((0, HASH_DIM), dtype=np.float32)
+            else:
+                matrix = np.vstack(self._rows) * self._idf()
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                self._vectors = (matrix / np.maximum(norms, 1e-9)).astype(np.float32)
+        return self._vectors
+
+    @property
+    def salience(self) -> np.ndarray:
+        """Centrality of each sentence: cosine similarity to the library centroid."""
+        if self._salience is None:
+            vectors = self.vectors
+            if vectors.shape[0] == 0:
+                self._salience = np.zeros(0, dtype=np.float32)
+            else:
+                centroid = vectors.mean(axis=0)
+                centroid /= max(float(np.linalg.norm(centroid)), 1e-9)
+                self._salience = vectors @ centroid
+        return self._salience
+
+    def query_vector(self, text: str) -> np.ndarray:
+        terms = [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS and len(w) > 2]
+        vector = np.bincount([_term_slot(t) for t in terms], minlength=HASH_DIM).astype(np.float32)
+        vector *= self._idf()
+        return vector / max(float(np.linalg.norm(vector)), 1e-9)
+
+    def _scores(self) -> dict[str, float]:
+        if self._phrase_scores is None:
+            count = max(1, len(self.sentences))
+            self._phrase_scores = {
+                # Phrases found in nearly every sentence score ~0, like stopwords.
+                phrase: tf * math.log((count + 1) / self._phrase_df[phrase]) * (1.5 if " " in phrase else 1.0)
+                for phrase, tf in self._phrase_tf.items()
+            }
+        return self._phrase_scores
+
+    def keyphrases(self, limit: int = 30) -> list[str]:
+        """Top TF-IDF keyphrases of the library (uni- and bigrams)."""
+        if self._top_phrases is None or len(self._top_phrases) < limit:
+            scores = self._scores()
+            self._top_phrases = sorted(scores, key=scores.get, reverse=True)[: max(limit, 30)]
+        return self._top_phrases[:limit]
+
+    def concept(self, position: int, exclude: set[str] | None = None) -> str:
+        """The highest-scoring keyphrase of a sentence, preferring ones not in ``exclude``."""
+        phrases = self._phrases[position]
+        if not phrases:
+            return "Key concept"
+        scores = self._scores()
+        fresh = [p for p in phrases if not exclude or p not in exclude]
+        return max(fresh or phrases, key=lambda p: scores.get(p, 0.0))
+
+    def concepts(self, position: int, limit: int = 2) -> list[str]:
+        """Distinct top keyphrases of a sentence, best first, without word overlap."""
+        scores = self._scores()
+        picked: list[str] = []
+        for phrase in sorted(set(self._phrases[position]), key=lambda p: scores.get(p, 0.0), reverse=True):
+            if all(not set(phrase.split()) & set(other.split()) for other in picked):
+                picked.append(phrase)
+            if len(picked) >= limit:
+                break
+        return picked
+
+    # ── Selection ────────────────────────────────────────────────────────────
+    def select(
+        self,
+        count: int,
+        chunk_ids: list[int] | None = None,
+        query: str | None = None,
+        lambda_: float = 0.7,
+    ) -> list[int]:
+        """
+        Positions of up to ``count`` salient, mutually diverse sentences in
+        document order, optionally restricted to ``chunk_ids`` and biased
+        towards ``query``.
+        """
+        if not self.sentences or count <= 0:
+            return []
+        scores = self.salience.copy()
+        if query:
+            scores = 0.7 * (self.vectors @ self.query_vector(query)) + 0.3 * scores
+
+        candidates = np.arange(len(self.sentences))
+        if chunk_ids is not None:
+            candidates = candidates[np.isin(np.asarray(self.chunk_ids), list(chunk_ids))]
+        if candidates.shape[0] == 0:
+            return []
+        if candidates.shape[0] > CANDIDATE_POOL:
+            best = np.argpartition(-scores[candidates], CANDIDATE_POOL - 1)[:CANDIDATE_POOL]
+            candidates = candidates[best]
+
+        relevance = scores[candidates]
+        pairwise = self.vectors[candidates] @ self.vectors[candidates].T
+        redundancy = np.zeros(candidates.shape[0], dtype=np.float32)
+        available = np.ones(candidates.shape[0], dtype=bool)
+        picked: list[int] = []
+        for _ in range(min(count, candidates.shape[0])):
+            mmr = lambda_ * relevance - (1.0 - lambda_) * redundancy
+            mmr[~available] = -np.inf
+            pick = int(np.argmax(mmr))
+            picked.append(int(candidates[pick]))
+            available[pick] = False
+            redundancy = np.maximum(redundancy, pairwise[pick])
+        return sorted(picked)
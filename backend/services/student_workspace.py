@@ -0,0 +1,510 @@
+"""
+RealityCheck AI — Student Workspaces
+Per-student FAISS index + chunk store, persisted to the blob store so that
+uploads survive restarts and requests landing on other serverless instances.
+
+Workspaces are loaded lazily on first access and kept in memory under an
+LRU policy (STUDENT_WORKSPACE_CACHE_SIZE, default 32).
+
+Several instances may serve the same workspace, so every save publishes a
+new revision number. A cached copy is compared with the stored revision
+before it is served (at most every STUDENT_WORKSPACE_REVALIDATE_SECONDS)
+and always before it is changed, and is reloaded when another instance
+saved since. Saves are compare-and-swap: the next revision is claimed with
+a create-only blob before anything is written, so a save based on an old
+revision fails with WorkspaceConflict instead of overwriting newer
+documents.
+
+Each workspace is a library of documents. Chunk records are kept in a
+columnar ChunkStore (one text buffer plus NumPy columns) and persisted as a
+single .npz blob next to the index. Chunks are content-addressed:
+identical chunk text is stored once per workspace and embedded once per
+process, and a byte-identical file reuses its cached chunks and vectors
+without extraction or embedding.
+
+Derived artifacts (generated study tools, intermediate summaries) are cached
+per workspace version and dropped automatically whenever the library changes.
+Answers to questions are cached in memory by question embedding, so
+paraphrases of an earlier question skip retrieval and generation; this cache
+is also reset on every library change.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import uuid
+import weakref
+
+import faiss
+import numpy as np
+
+from services.blob_store import get_blob_store
+from services.chunk_store import ChunkStore
+from services.semantic_cache import SemanticCache
+from services.sentence_index import SentenceIndex
+from utils.config import EMBEDDING_DIM
+from utils.lru import LRUCache
+
+DEFAULT_WORKSPACE_ID = "default"
+WORKSPACE_CACHE_SIZE = int(os.getenv("STUDENT_WORKSPACE_CACHE_SIZE", "32"))
+CHUNK_VECTOR_CACHE_SIZE = int(os.getenv("STUDENT_CHUNK_VECTOR_CACHE_SIZE", "4096"))
+ANSWER_CACHE_SIZE = int(os.getenv("STUDENT_ANSWER_CACHE_SIZE", "128"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("STUDENT_ANSWER_CACHE_THRESHOLD", "0.92"))
+WORKSPACE_REVALIDATE_SECONDS = float(os.getenv("STUDENT_WORKSPACE_REVALIDATE_SECONDS", "0"))
+CLAIM_TIMEOUT_SECONDS = 300  # a claimed revision never published by then belongs to a save that died
+
+_INSTANCE_ID = uuid.uuid4().hex  # owner tag on revision claims made by this process
+
+_WORKSPACE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def normalize_workspace_id(raw: str | None) -> str | None:
+    """Return a safe workspace id, the default for empty input, or None if invalid."""
+    value = (raw or "").strip()
+    if not value:
+        return DEFAULT_WORKSPACE_ID
+    return value if _WORKSPACE_ID_RE.match(value) else None
+
+
+_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _workspace_lock(workspace_id: str) -> asyncio.Lock:
+    lock = _locks.get(workspace_id)
+    if lock is None:
+        lock = _locks[workspace_id] = asyncio.Lock()
+    return lock
+
+
+class WorkspaceConflict(RuntimeError):
+    """The workspace was saved by another instance since this copy was loaded."""
+
+
+def content_hash(data: bytes | str) -> str:
+    if isinstance(data, str):
+        data = data.strip().encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class StudentWorkspace:
+    """FAISS index, chunk vectors, chunk records and metadata for one student."""
+
+    def __init__(
+        self,
+        workspace_id: str,
+        index: faiss.IndexFlatIP | None = None,
+        chunks: ChunkStore | None = None,
+        metadata: dict | None = None,
+    ):
+        self.workspace_id = workspace_id
+        self.index = index if index is not None else faiss.IndexFlatIP(EMBEDDING_DIM)
+        self.chunks = chunks if chunks is not None else ChunkStore()
+        self.metadata: dict = metadata or {"version": 0, "created_at": time.time()}
+        self.metadata.setdefault("documents", [])
+        # Artifacts computed from the current version; reset on every change.
+        self.derived: dict = {}
+        # Answers keyed by question embedding; in memory only, reset on every change.
+        self.answers = SemanticCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, EMBEDDING_DIM)
+        # Sentence/keyphrase index for offline fallbacks and the chunk rows it covers.
+        # Rebuilt off the event loop and published with a single assignment, so
+        # readers never see a half-extended index.
+        self._sentences: tuple[SentenceIndex, int] = (SentenceIndex(), 0)
+        # Serializes library mutations with the persistence that follows them;
+        # shared by every in-memory copy of the same workspace (e.g. a reload).
+        self.lock = _workspace_lock(workspace_id)
+        # When the revision was last compared with the blob store.
+        self.checked_at = time.monotonic()
+        # Chunk vectors are recovered from the flat index, so they are never stored twice on disk.
+        if self.index.ntotal:
+            self.vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        else:
+            self.vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.index.ntotal == 0
+
+    @property
+    def version(self) -> int:
+        return int(self.metadata.get("version", 0))
+
+    @property
+    def revision(self) -> int:
+        """Revision of the persisted library this copy is based on (0: never saved)."""
+        return int(self.metadata.get("revision", 0))
+
+    @property
+    def documents(self) -> list[dict]:
+        return self.metadata["documents"]
+
+    def find_document(self, file_hash: str) -> dict | None:
+        return next((d for d in self.documents if d.get("sha256") == file_hash), None)
+
+    def add_document(self, document: dict, chunks: list[dict], matrix: np.ndarray) -> dict:
+        """
+        Append a document's chunks to the library and bump the version.
+
+        Chunks whose content hash is already present are not added again;
+        the document simply references the existing chunk ids.
+        """
+        known = self.chunks.hash_index()
+        new_records: list[dict] = []
+        new_rows: list[int] = []
+        chunk_ids: list[int] = []
+        for row, chunk in enumerate(chunks):
+            existing = known.get(chunk["content_hash"])
+            if existing is not None:
+                chunk_ids.append(existing)
+                continue
+            chunk_id = len(self.chunks) + len(new_records) + 1
+            known[chunk["content_hash"]] = chunk_id
+            chunk_ids.append(chunk_id)
+            new_records.append({**chunk, "chunk_id": chunk_id, "doc_id": document["doc_id"]})
+            new_rows.append(row)
+
+        if new_rows:
+            new_vectors = matrix[new_rows]
+            self.index.add(new_vectors)
+            self.vectors = np.vstack([self.vectors, new_vectors])
+            self.chunks.extend(new_records)
+
+        document = {**document, "chunk_ids": chunk_ids, "added_at": time.time()}
+        self.documents.append(document)
+        self._touch()
+        return document
+
+    def clear(self) -> None:
+        self.index = faiss.IndexFlatIP(EMBEDDING_DIM)
+        self.vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self.chunks = ChunkStore()
+        self.metadata["documents"] = []
+        self._sentences = (SentenceIndex(), 0)
+        self._touch()
+
+    def get_sentence_index(self) -> SentenceIndex:
+        """The last published sentence index (it may lag an upload that is still being indexed)."""
+        return self._sentences[0]
+
+    def refresh_sentence_index(self) -> SentenceIndex:
+        """
+        Index the chunks added since the last refresh into a copy of the
+        sentence index and publish it. Blocking; run it in a worker thread
+        while holding ``lock``.
+        """
+        current, rows = self._sentences
+        texts = list(self.chunks.texts(rows))
+        if not texts:
+            return current
+        index = current.copy()
+        index.add_chunks(texts)
+        self._sentences = (index, rows + len(texts))
+        return index
+
+    def get_derived(self, key: str):
+        return self.derived.get(key)
+
+    def put_derived(self, key: str, version: int, value) -> bool:
+        """Cache ``value`` if it was computed from the current version."""
+        if version != self.version:
+            return False
+        self.derived[key] = value
+        return True
+
+    def get_answer(self, question_vec: np.ndarray) -> dict | None:
+        return self.answers.get(question_vec)
+
+    def put_answer(self, version: int, question_vec: np.ndarray, response: dict) -> bool:
+        """Cache an answer if it was computed from the current version."""
+        if version != self.version:
+            return False
+        self.answers.put(question_vec, response)
+        return True
+
+    def _touch(self) -> None:
+        self.metadata["version"] = self.version + 1
+        self.metadata["updated_at"] = time.time()
+        self.derived = {}
+        self.answers.clear()
+
+
+def _index_key(workspace_id: str) -> str:
+    return f"workspaces/{workspace_id}/index.faiss"
+
+
+def _records_key(workspace_id: str) -> str:
+    return f"workspaces/{workspace_id}/workspace.json"
+
+
+def _chunks_key(workspace_id: str) -> str:
+    return f"workspaces/{workspace_id}/chunks.npz"
+
+
+def _derived_key(workspace_id: str) -> str:
+    return f"workspaces/{workspace_id}/derived.json"
+
+
+def _revision_key(workspace_id: str) -> str:
+    return f"workspaces/{workspace_id}/revision"
+
+
+def _claim_key(workspace_id: str, revision: int) -> str:
+    return f"workspaces/{workspace_id}/claims/{revision:012d}"
+
+
+def _stored_revision(workspace_id: str) -> int:
+    raw = get_blob_store().get(_revision_key(workspace_id))
+    try:
+        return int(raw) if raw else 0
+    except ValueError:
+        return 0
+
+
+def _claim_revision(workspace: StudentWorkspace) -> int:
+    """
+    Reserve the revision that follows the one ``workspace`` is based on.
+    Raises WorkspaceConflict if another instance saved or is saving.
+    """
+    store = get_blob_store()
+    workspace_id = workspace.workspace_id
+    if _stored_revision(workspace_id) != workspace.revision:
+        raise WorkspaceConflict(f"workspace '{workspace_id}' was saved elsewhere")
+    revision = workspace.revision + 1
+    while True:
+        claim = {"owner": _INSTANCE_ID, "at": time.time()}
+        if store.create(_claim_key(workspace_id, revision), json.dumps(claim).encode("utf-8")):
+            if _stored_revision(workspace_id) != workspace.revision:
+                # Old claims are pruned, so a slot behind a newer revision can be free again.
+                store.delete(_claim_key(workspace_id, revision))
+                raise WorkspaceConflict(f"workspace '{workspace_id}' was saved elsewhere")
+            return revision
+        try:
+            claim = json.loads((store.get(_claim_key(workspace_id, revision)) or b"{}").decode("utf-8"))
+        except ValueError:
+            claim = {}
+        if claim.get("owner") == _INSTANCE_ID:
+            return revision  # our own claim from a save that failed midway; the lock is still ours
+        abandoned = time.time() - float(claim.get("at", 0)) > CLAIM_TIMEOUT_SECONDS
+        if not abandoned or _stored_revision(workspace_id) != workspace.revision:
+            raise WorkspaceConflict(f"workspace '{workspace_id}' is being saved elsewhere")
+        revision += 1
+
+
+def _prune_claims(workspace_id: str, base: int, revision: int) -> None:
+    """
+    After publishing ``revision`` from ``base``, delete the claims older than
+    ``revision - 1``, so there are at most two per workspace. A stale save
+    never needs them: it fails the revision check first.
+    """
+    store = get_blob_store()
+    for old in range(max(1, base - 1), revision - 1):
+        try:
+            store.delete(_claim_key(workspace_id, old))
+        except Exception as exc:
+            print(f"⚠️  Could not delete claim {old} of workspace '{workspace_id}': {exc}")
+
+
+def _load_from_blobs(workspace_id: str) -> StudentWorkspace | None:
+    store = get_blob_store()
+    raw_records = store.get(_records_key(workspace_id))
+    raw_index = store.get(_index_key(workspace_id))
+    if raw_records is None or raw_index is None:
+        return None
+
+    records = json.loads(raw_records.decode("utf-8"))
+    index = faiss.deserialize_index(np.frombuffer(raw_index, dtype=np.uint8))
+    if "chunks" in records:
+        # Workspaces saved before the columnar store kept chunk dicts inline.
+        chunks = ChunkStore.from_records(records["chunks"])
+    else:
+        raw_chunks = store.get(_chunks_key(workspace_id))
+        if raw_chunks is None:
+            return None
+        chunks = ChunkStore.from_bytes(raw_chunks)
+    if index.ntotal != len(chunks):
+        # Partially written workspace; ignore rather than serve mismatched chunks.
+        return None
+    workspace = StudentWorkspace(workspace_id, index=index, chunks=chunks, metadata=records.get("metadata"))
+    workspace.refresh_sentence_index()  # still in the loader's worker thread
+
+    raw_derived = store.get(_derived_key(workspace_id))
+    if raw_derived is not None:
+        derived = json.loads(raw_derived.decode("utf-8"))
+        if derived.get("version") == workspace.version and derived.get("revision", 0) == workspace.revision:
+            workspace.derived = derived.get("items", {})
+    return workspace
+
+
+def _save_to_blobs(workspace: StudentWorkspace) -> None:
+    store = get_blob_store()
+    base = workspace.revision
+    revision = _claim_revision(workspace)
+    store.put(_index_key(workspace.workspace_id), faiss.serialize_index(workspace.index).tobytes())
+    store.put(_chunks_key(workspace.workspace_id), workspace.chunks.to_bytes())
+    records = {"metadata": {**workspace.metadata, "revision": revision}}
+    store.put(_records_key(workspace.workspace_id), json.dumps(records).encode("utf-8"))
+    # Publishing the revision last makes the save visible to other instances.
+    store.put(_revision_key(workspace.workspace_id), str(revision).encode("ascii"))
+    workspace.metadata["revision"] = revision
+    workspace.checked_at = time.monotonic()
+    _prune_claims(workspace.workspace_id, base, revision)
+    _save_derived_to_blobs(workspace)
+
+
+def _save_derived_to_blobs(workspace: StudentWorkspace) -> None:
+    derived = {"version": workspace.version, "revision": workspace.revision, "items": workspace.derived}
+    get_blob_store().put(_derived_key(workspace.workspace_id), json.dumps(derived).encode("utf-8"))
+
+
+_workspaces = LRUCache(WORKSPACE_CACHE_SIZE)
+
+
+async def get_workspace(workspace_id: str, fresh: bool = False) -> StudentWorkspace | None:
+    """
+    Return the workspace from memory, loading it from the blob store if needed
+    or if another instance saved a newer revision. ``fresh`` skips the
+    revalidation interval; use it before changing the workspace.
+    """
+    stale = _workspaces.get(workspace_id)
+    if stale is not None:
+        if not fresh and time.monotonic() - stale.checked_at < WORKSPACE_REVALIDATE_SECONDS:
+            return stale
+        try:
+            stored = await asyncio.to_thread(_stored_revision, workspace_id)
+        except Exception as exc:
+            print(f"⚠️  Could not check workspace '{workspace_id}' revision: {exc}")
+            return stale
+        if stored == stale.revision:
+            stale.checked_at = time.monotonic()
+            return stale
+        print(f"🔄 Workspace '{workspace_id}' changed elsewhere (revision {stale.revision} -> {stored}); reloading")
+
+    try:
+        workspace = await asyncio.to_thread(_load_from_blobs, workspace_id)
+    except Exception as exc:
+        print(f"⚠️  Could not load workspace '{workspace_id}': {exc}")
+        workspace = None
+
+    if workspace is None:
+        _workspaces.pop(workspace_id)
+        return None
+    _workspaces.put(workspace_id, workspace)
+    return workspace
+
+
+async def get_or_create_workspace(workspace_id: str, fresh: bool = False) -> StudentWorkspace:
+    workspace = await get_workspace(workspace_id, fresh=fresh)
+    if workspace is None:
+        workspace = StudentWorkspace(workspace_id)
+        _workspaces.put(workspace_id, workspace)
+    return workspace
+
+
+async def save_workspace(workspace: StudentWorkspace) -> None:
+    """
+    Persist the workspace. Raises WorkspaceConflict, without writing, if
+    another instance saved since this copy was loaded; the next
+    ``get_workspace(fresh=True)`` then reloads. Other failures are logged so
+    the in-memory copy keeps serving.
+    """
+    _workspaces.put(workspace.workspace_id, workspace)
+    try:
+        await asyncio.to_thread(_save_to_blobs, workspace)
+    except WorkspaceConflict:
+        workspace.checked_at = float("-inf")
+        raise
+    except Exception as exc:
+        print(f"⚠️  Could not persist workspace '{workspace.workspace_id}': {exc}")
+
+
+async def save_derived(workspace: StudentWorkspace) -> None:
+    """Persist only the derived-artifact cache (cheap compared to a full save)."""
+    try:
+        await asyncio.to_thread(_save_derived_to_blobs, workspace)
+    except Exception as exc:
+        print(f"⚠️  Could not persist derived cache for '{workspace.workspace_id}': {exc}")
+
+
+# ── Shared content-addressed caches ──────────────────────────────────────────
+_chunk_vectors = LRUCache(CHUNK_VECTOR_CACHE_SIZE)
+
+
+def cached_chunk_vector(chunk_hash: str) -> np.ndarray | None:
+    return _chunk_vectors.get(chunk_hash)
+
+
+def remember_chunk_vector(chunk_hash: str, vector: np.ndarray) -> None:
+    _chunk_vectors.put(chunk_hash, vector)
+
+
+def _document_keys(file_hash: str) -> tuple[str, str]:
+    return f"documents/{file_hash}.json", f"documents/{file_hash}.npy"
+
+
+def _load_document_cache(file_hash: str) -> tuple[list[dict], np.ndarray] | None:
+    store = get_blob_store()
+    records_key, vectors_key = _document_keys(file_hash)
+    raw_records = store.get(records_key)
+    raw_vectors = store.get(vectors_key)
+    if raw_records is None or raw_vectors is None:
+        return None
+    chunks = json.loads(raw_records.decode("utf-8"))
+    matrix = np.load(io.BytesIO(raw_vectors), allow_pickle=False).astype(np.float32)
+    if matrix.shape != (len(chunks), EMBEDDING_DIM):
+        return None
+    return chunks, matrix
+
+
+def _save_document_cache(file_hash: str, chunks: list[dict], matrix: np.ndarray) -> None:
+    store = get_blob_store()
+    records_key, vectors_key = _document_keys(file_hash)
+    buffer = io.BytesIO()
+    np.save(buffer, matrix, allow_pickle=False)
+    store.put(vectors_key, buffer.getvalue())
+    store.put(records_key, json.dumps(chunks).encode("utf-8"))
+
+
+async def load_document_cache(file_hash: str) -> tuple[list[dict], np.ndarray] | None:
+    """Chunks and vectors previously computed for a byte-identical file, if any."""
+    try:
+        return await asyncio.to_thread(_load_document_cache, file_hash)
+    except Exception as exc:
+        print(f"⚠️  Could not read document cache '{file_hash[:12]}': {exc}")
+        return None
+
+
+async def save_document_cache(file_hash: str, chunks: list[dict], matrix: np.ndarray) -> None:
+    try:
+        await asyncio.to_thread(_save_document_cache, file_hash, chunks, matrix)
+    except Exception as exc:
+        print(f"⚠️  Could not write document cache '{file_hash[:12]}': {exc}")
+
+
+def _answer_cache_stats() -> dict:
+    """Answer-cache counters summed over the workspaces currently in memory."""
+    caches = [workspace.answers for workspace in _workspaces.values()]
+    hits = sum(cache.hits for cache in caches)
+    misses = sum(cache.misses for cache in caches)
+    lookups = hits + misses
+    return {
+        "workspaces": len(caches),
+        "size": sum(len(cache) for cache in caches),
+        "capacity_per_workspace": ANSWER_CACHE_SIZE,
+        "threshold": ANSWER_CACHE_THRESHOLD,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def workspace_cache_stats() -> dict:
+    return {
+        "workspaces": _workspaces.stats(),
+        "chunk_vectors": _chunk_vectors.stats(),
+        "answers": _answer_cache_stats(),
+    }
@@ -5,20 +5,44 @@ Implements upload -> RAG retrieval -> grounded answer/generation.
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import re
-from io import BytesIO
-from typing import Literal
+import time
+from typing import Literal, get_args
 
-import faiss
 import httpx
 import numpy as np
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from pypdf import PdfReader
 
+from services.backend_health import HealthTracker
+from services.chunk_store import ChunkStore
+from services.chunker import chunk_document, count_tokens
+from services.context_packer import pack_segments, packing_stats
+from services.llm_stream import collect_generation, cut_at_stop, stop_pieces
 from services.ocr import extract_text_from_image
+from services.sentence_index import SentenceIndex
+from services.student_workspace import (
+    StudentWorkspace,
+    WorkspaceConflict,
+    cached_chunk_vector,
+    content_hash,
+    get_or_create_workspace,
+    get_workspace,
+    load_document_cache,
+    normalize_workspace_id,
+    remember_chunk_vector,
+    save_derived,
+    save_document_cache,
+    save_workspace,
+    workspace_cache_stats,
+)
+from utils.json_extract import extract_json_object
+from utils.uploads import DOCUMENT_TYPES, MAX_DOCUMENT_UPLOAD_BYTES, Upload, read_upload
 
 router = APIRouter(prefix="/student", tags=["student-assistant"])
 
@@ -34,23 +58,80 @@ FREE_MODELS = [
     "microsoft/phi-2",
 ]
 
-MAX_CONTEXT_CHARS = 7000
-MAX_OUTPUT_TOKENS_ASK = 280
-MAX_OUTPUT_TOKENS_GENERATE = 800
+MAX_CONTEXT_TOKENS = 1600
+MAP_REDUCE_CONCURRENCY = int(os.getenv("STUDENT_MAP_CONCURRENCY", "3"))
+MAP_REDUCE_MAX_LEVELS = 3
+PACK_CONCURRENCY = int(os.getenv("STUDENT_PACK_CONCURRENCY", "3"))
 MAX_FILE_CHARS = 70000
-CHUNK_TARGET_TOKENS = 500
-CHUNK_OVERLAP_TOKENS = 60
-
-_student_index: faiss.IndexFlatIP | None = None
-_student_chunks: list[dict] = []
-
+MAX_WORKSPACE_DOCUMENTS = 20
+CHUNK_TARGET_TOKENS = 256  # all-MiniLM-L6-v2 max sequence length
+CHUNK_OVERLAP_TOKENS = 48
+RETRIEVAL_OVERFETCH = 4  # candidates fetched per requested source before MMR
+MMR_LAMBDA = 0.7  # relevance vs. diversity trade-off
 
 class AskRequest(BaseModel):
     question: str
 
 
+GenerateMode = Literal["summary", "keypoints", "flashcards", "mcq", "viva", "concept_map"]
+
+# Generation profile per task: token ceiling, stop sequences, and the keys of
+# the JSON answer. Generation is cut off as soon as such an object is complete.
+GENERATION_PROFILES = {
+    "ask": {"max_new_tokens": 280, "stop": ("\nQuestion:",), "json_keys": ("answer",)},
+    "ask_stream": {"max_new_tokens": 280, "stop": ("\nQuestion:", "\nContext:")},
+    "map": {"max_new_tokens": 320, "stop": ("\nContext:",), "json_keys": ("summary",)},
+    "summary": {"max_new_tokens": 600, "stop": ("\nMode:",), "json_keys": ("summary",)},
+    "keypoints": {"max_new_tokens": 700, "stop": ("\nMode:",), "json_keys": ("key_concepts",)},
+    "flashcards": {"max_new_tokens": 800, "stop": ("\nMode:",), "json_keys": ("flashcards",)},
+    "mcq": {"max_new_tokens": 800, "stop": ("\nMode:",), "json_keys": ("mcqs",)},
+    "viva": {"max_new_tokens": 700, "stop": ("\nMode:",), "json_keys": ("viva_questions",)},
+    "concept_map": {"max_new_tokens": 800, "stop": ("\nMode:",), "json_keys": ("concept_relationships",)},
+}
+
+# Modes generated in the background right after an upload; off unless configured,
+# since each mode is an extra LLM call per upload (e.g. "summary,keypoints").
+PREGENERATE_MODES = [
+    mode.strip()
+    for mode in os.getenv("STUDENT_PREGENERATE_MODES", "").split(",")
+    if mode.strip() in get_args(GenerateMode)
+]
+
+_inflight_tasks: dict[tuple, asyncio.Future] = {}
+
+# Hedged requests fire the next model after the current one's p95 latency,
+# clamped to this window (seconds).
+HEDGE_MIN_DELAY = 2.0
+HEDGE_MAX_DELAY = 30.0
+_model_health = HealthTracker(default_latency=10.0)
+
+
 class GenerateRequest(BaseModel):
-    mode: Literal["summary", "keypoints", "flashcards", "mcq", "viva", "concept_map"]
+    mode: GenerateMode
+
+
+class PackRequest(BaseModel):
+    modes: list[GenerateMode] = ["summary", "keypoints", "flashcards", "mcq"]
+
+
+def _workspace_id(x_workspace_id: str | None = Header(default=None)) -> str:
+    workspace_id = normalize_workspace_id(x_workspace_id)
+    if workspace_id is None:
+        raise HTTPException(status_code=400, detail="Invalid X-Workspace-Id header.")
+    return workspace_id
+
+
+async def _require_workspace(workspace_id: str) -> StudentWorkspace:
+    workspace = await get_workspace(workspace_id)
+    if workspace is None or workspace.is_empty:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "error",
+                "message": "No uploaded notes found. Upload notes first.",
+            },
+        )
+    return workspace
 
 
 def _hf_headers() -> dict:
@@ -74,33 +155,45 @@ def _clean_text(text: str) -> str:
     return text.strip()
 
 
-def _split_sentences(text: str) -> list[str]:
-    parts = re.split(r"(?<=[.!?])\s+|\n+", text)
-    return [p.strip() for p in parts if p and p.strip()]
-
-
-def _first_sentences(text: str, limit: int) -> str:
-    sentences = _split_sentences(text)
-    return " ".join(sentences[:limit]).strip()
-
-
-def _concept_from_sentence(sentence: str) -> str:
-    words = [w for w in re.split(r"\W+", sentence) if w]
-    return " ".join(words[:5]).strip() or "Key concept"
-
-
-def _fallback_ask_response(sources: list[dict]) -> dict:
-    combined = " ".join([source["text"] for source in sources])
-    answer = _first_sentences(combined, 3) or "Insufficient information in uploaded material."
-    explanation = _first_sentences(combined, 2) or "The notes are too short to answer this question clearly."
-    filtered_sources = sources[:3]
+def _join_pages(pages: list[str]) -> tuple[str, list[int]]:
+    """Clean and join page texts, returning the document and each page's start offset."""
+    parts: list[str] = []
+    page_starts: list[int] = []
+    offset = 0
+    for page in pages:
+        page_starts.append(offset)
+        cleaned = _clean_text(page)
+        if cleaned:
+            parts.append(cleaned)
+            offset += len(cleaned) + 2
+    text = "\n\n".join(parts)[:MAX_FILE_CHARS]
+    return text, page_starts
+
+
+def _sentence_sources(index: SentenceIndex, positions: list[int], sources: list[dict]) -> list[dict]:
+    used = {index.chunk_ids[p] for p in positions}
+    cited = [s for s in sources if used & set(s.get("chunk_ids", [s["chunk_id"]]))]
+    return cited or sources[:3]
+
+
+def _fallback_ask_response(workspace: StudentWorkspace, question: str, sources: list[dict]) -> dict:
+    """Extractive answer: the retrieved sentences most relevant to the question."""
+    index = workspace.get_sentence_index()
+    pool = sorted({i for s in sources for i in s.get("chunk_ids", [s["chunk_id"]])})
+    picked = index.select(3, chunk_ids=pool, query=question)
+    answer = " ".join(index.sentences[p] for p in picked) or "Insufficient information in uploaded material."
+    explanation = (
+        " ".join(index.sentences[p] for p in index.select(2, chunk_ids=pool, query=question))
+        or "The notes are too short to answer this question clearly."
+    )
+    filtered_sources = _sentence_sources(index, picked, sources)
     return {
         "answer": answer[:2200],
         "explanation_simple": explanation[:1800],
         "sources": [
             {
                 "chunk_id": s["chunk_id"],
-                "preview": s["preview"],
+                "preview": _source_preview(workspace, s),
             }
             for s in filtered_sources
         ],
@@ -108,136 +201,115 @@ def _fallback_ask_response(sources: list[dict]) -> dict:
     }
 
 
-def _fallback_generate(mode: str, chunks: list[dict]) -> dict:
-    combined = " ".join([chunk["text"] for chunk in chunks])
-    base_summary = _first_sentences(combined, 5) or ""
-    chunk_ids = [chunk["chunk_id"] for chunk in chunks[:3]]
+def _fallback_generate(mode: str, workspace: StudentWorkspace) -> dict:
+    """
+    Offline study tools built from the workspace sentence index: salient,
+    non-redundant sentences, with TF-IDF keyphrases as the concepts.
+    """
+    index = workspace.get_sentence_index()
+
+    def concepts_for(positions: list[int]) -> list[str]:
+        used: set[str] = set()
+        concepts = []
+        for p in positions:
+            concept = index.concept(p, exclude=used)
+            used.add(concept)
+            concepts.append(concept)
+        return concepts
 
     if mode == "summary":
-        return {"summary": base_summary or "Summary not available.", "evidence_chunk_ids": chunk_ids}
+        picked = index.select(5)
+        return {
+            "summary": " ".join(index.sentences[p] for p in picked) or "Summary not available.",
+            "evidence_chunk_ids": sorted({index.chunk_ids[p] for p in picked}),
+        }
 
     if mode == "keypoints":
-        concepts = []
-        for sentence in _split_sentences(combined)[:6]:
-            concepts.append(
+        picked = index.select(6)
+        return {
+            "key_concepts": [
                 {
-                    "concept": _concept_from_sentence(sentence),
-                    "explanation": sentence,
-                    "evidence_chunk_ids": chunk_ids,
+                    "concept": concept.title(),
+                    "explanation": index.sentences[p],
+                    "evidence_chunk_ids": [index.chunk_ids[p]],
                 }
-            )
-        return {"key_concepts": concepts}
+                for p, concept in zip(picked, concepts_for(picked))
+            ]
+        }
 
     if mode == "flashcards":
-        cards = []
-        for sentence in _split_sentences(combined)[:6]:
-            concept = _concept_from_sentence(sentence)
-            cards.append(
+        picked = index.select(6)
+        return {
+            "flashcards": [
                 {
-                    "question": f"What is {concept}?",
-                    "answer": sentence,
-                    "evidence_chunk_ids": chunk_ids,
+                    "question": f"What do your notes say about {concept}?",
+                    "answer": index.sentences[p],
+                    "evidence_chunk_ids": [index.chunk_ids[p]],
                 }
-            )
-        return {"flashcards": cards}
+                for p, concept in zip(picked, concepts_for(picked))
+            ]
+        }
 
     if mode == "mcq":
-        sentences = _split_sentences(combined)[:10]
+        distractor_pool = index.keyphrases(30)
+        letters = ["A", "B", "C", "D"]
+        picked = index.select(7)
         mcqs = []
-        for i, sentence in enumerate(sentences[:7]):
-            concepts = [_concept_from_sentence(s) for s in sentences if s != sentence]
-            options = {
-                "A": _concept_from_sentence(sentence),
-                "B": concepts[0] if len(concepts) > 0 else "Unrelated topic",
-                "C": concepts[1] if len(concepts) > 1 else "Not mentioned",
-                "D": concepts[2] if len(concepts) > 2 else "Alternative concept",
-            }
+        for i, (p, concept) in enumerate(zip(picked, concepts_for(picked))):
+            sentence = index.sentences[p]
+            blanked = re.sub(re.escape(concept), "_____", sentence, count=1, flags=re.IGNORECASE)
+            concept_words = set(concept.split())
+            distractors = [
+                phrase
+                for phrase in distractor_pool
+                if not concept_words & set(phrase.split()) and phrase not in sentence.lower()
+            ][:3]
+            distractors += ["Not mentioned in the notes", "None of the above", "All of the above"][: 3 - len(distractors)]
+            answers = distractors[: i % 4] + [concept] + distractors[i % 4 :]
             mcqs.append(
                 {
-                    "question": f"What is the primary subject of: '{sentence[:80]}...'?",
-                    "options": options,
-                    "correct": "A",
+                    "question": f"Which term completes the statement: '{blanked[:160]}'?",
+                    "options": dict(zip(letters, answers)),
+                    "correct": letters[i % 4],
                     "explanation": sentence,
-                    "evidence_chunk_ids": chunk_ids,
+                    "evidence_chunk_ids": [index.chunk_ids[p]],
                 }
             )
-        return {"mcqs": mcqs if mcqs else [{"question": "Sample MCQ", "options": {"A": "A", "B": "B", "C": "C", "D": "D"}, "correct": "A", "explanation": "Refer to notes.", "evidence_chunk_ids": chunk_ids}]}
+        return {"mcqs": mcqs if mcqs else [{"question": "Sample MCQ", "options": {"A": "A", "B": "B", "C": "C", "D": "D"}, "correct": "A", "explanation": "Refer to notes.", "evidence_chunk_ids": []}]}
 
     if mode == "viva":
-        questions = []
-        for sentence in _split_sentences(combined)[:5]:
-            concept = _concept_from_sentence(sentence)
-            questions.append(
+        picked = index.select(5)
+        return {
+            "viva_questions": [
                 {
                     "question": f"Explain {concept}.",
-                    "model_answer": sentence,
+                    "model_answer": index.sentences[p],
                     "difficulty": "medium",
-                    "evidence_chunk_ids": chunk_ids,
+                    "evidence_chunk_ids": [index.chunk_ids[p]],
                 }
-            )
-        return {"viva_questions": questions}
+                for p, concept in zip(picked, concepts_for(picked))
+            ]
+        }
 
     if mode == "concept_map":
-        sentences = _split_sentences(combined)[:6]
         relationships = []
-        for idx in range(len(sentences) - 1):
-            concept_a = _concept_from_sentence(sentences[idx])
-            concept_b = _concept_from_sentence(sentences[idx + 1])
-            relationships.append(
-                {
-                    "concept_a": concept_a,
-                    "relation": "related to",
-                    "concept_b": concept_b,
-                    "explanation": sentences[idx],
-                    "evidence_chunk_ids": chunk_ids,
-                }
-            )
-        return {"concept_relationships": relationships}
+        for p in index.select(8):
+            concepts = index.concepts(p, limit=2)
+            if len(concepts) == 2:
+                relationships.append(
+                    {
+                        "concept_a": concepts[0],
+                        "relation": "related to",
+                        "concept_b": concepts[1],
+                        "explanation": index.sentences[p],
+                        "evidence_chunk_ids": [index.chunk_ids[p]],
+                    }
+                )
+        return {"concept_relationships": relationships[:6]}
 
     return {}
 
 
-def _chunk_text(text: str, target_tokens: int = CHUNK_TARGET_TOKENS) -> list[str]:
-    sentences = _split_sentences(text)
-    if not sentences:
-        return []
-
-    chunks: list[str] = []
-    current: list[str] = []
-    current_tokens = 0
-
-    for sentence in sentences:
-        sent_tokens = max(1, len(sentence.split()))
-        if current and current_tokens + sent_tokens > target_tokens:
-            chunks.append(" ".join(current).strip())
-            overlap_words = " ".join(current).split()[-CHUNK_OVERLAP_TOKENS:]
-            current = [" ".join(overlap_words)] if overlap_words else []
-            current_tokens = len(overlap_words)
-
-        current.append(sentence)
-        current_tokens += sent_tokens
-
-    if current:
-        chunks.append(" ".join(current).strip())
-
-    return [c for c in chunks if c]
-
-
-def _extract_json_blob(text: str) -> dict | None:
-    if not text:
-        return None
-
-    fenced = re.findall(r"```json\s*(\{.*?\})\s*```", text, flags=re.DOTALL | re.IGNORECASE)
-    candidates = fenced if fenced else re.findall(r"(\{.*\})", text, flags=re.DOTALL)
-
-    for candidate in candidates:
-        try:
-            return json.loads(candidate)
-        except json.JSONDecodeError:
-            continue
-    return None
-
-
 def _coerce_ids(ids: list, max_id: int) -> list[int]:
     normalized: list[int] = []
     for i in ids or []:
@@ -340,7 +412,81 @@ async def _embed_text(text: str) -> np.ndarray:
     return vector.astype(np.float32)
 
 
-async def _generate_text(prompt: str, max_new_tokens: int) -> str:
+class _ModelError(Exception):
+    pass
+
+
+async def _call_model(
+    client: httpx.AsyncClient,
+    model: str,
+    headers: dict,
+    payload: dict,
+    stop: tuple[str, ...] = (),
+    json_keys: tuple[str, ...] | None = None,
+) -> str:
+    """
+    Stream one HF text model, recording its latency / failure in the health tracker.
+
+    Reading stops (closing the connection) at a stop sequence or once a JSON
+    object with ``json_keys`` is complete.
+    """
+    health = _model_health.get(model)
+    url = f"https://router.huggingface.co/hf-inference/models/{model}"
+    started = time.monotonic()
+    try:
+        async with client.stream("POST", url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                health.record_failure(time.monotonic() - started)
+                detail = (await response.aread()).decode("utf-8", errors="replace").strip()
+                if len(detail) > 140:
+                    detail = detail[:140] + "..."
+                raise _ModelError(f"{model}: status {response.status_code} ({detail})")
+
+            if "text/event-stream" in response.headers.get("content-type", ""):
+                text, _ = await collect_generation(_stream_pieces(response), stop=stop, json_keys=json_keys)
+                text = text.strip()
+            else:
+                data = json.loads(await response.aread())
+                text = None
+                if isinstance(data, list) and data and isinstance(data[0], dict):
+                    if "generated_text" in data[0]:
+                        text = str(data[0]["generated_text"]).strip()
+                elif isinstance(data, dict) and "generated_text" in data:
+                    text = str(data["generated_text"]).strip()
+                elif isinstance(data, str):
+                    text = data.strip()
+    except (httpx.HTTPError, ValueError) as exc:
+        # ValueError covers JSONDecodeError and UnicodeDecodeError from a malformed body.
+        health.record_failure(time.monotonic() - started)
+        raise _ModelError(f"{model}: {exc}")
+    except asyncio.CancelledError:
+        # Lost a hedged race: it is at least this slow.
+        health.record_censored(time.monotonic() - started)
+        raise
+    elapsed = time.monotonic() - started
+
+    if text is None:
+        health.record_failure(elapsed)
+        raise _ModelError(f"{model}: unexpected response shape")
+
+    health.record_success(elapsed)
+    return text
+
+
+async def _generate_text(
+    prompt: str,
+    max_new_tokens: int,
+    stop: tuple[str, ...] = (),
+    json_keys: tuple[str, ...] | None = None,
+) -> str:
+    """
+    Generate text with the healthiest free model, hedging against slow ones.
+
+    Models are tried in order of observed latency/error EWMA. If the current
+    model has not answered within its p95 latency, the next model is fired
+    in parallel; the first successful response wins and the rest are
+    cancelled. A failure launches the next model immediately.
+    """
     headers = _hf_headers()
     payload = {
         "inputs": prompt,
@@ -348,79 +494,316 @@ async def _generate_text(prompt: str, max_new_tokens: int) -> str:
             "max_new_tokens": max_new_tokens,
             "temperature": 0.2,
             "return_full_text": False,
+            "stop": list(stop),
         },
         "options": {"wait_for_model": True},
+        "stream": True,
     }
 
+    models = _model_health.rank(_hf_text_models())
+    if not models:
+        raise HTTPException(status_code=502, detail="No LLM backends configured (HF_TEXT_MODELS is empty).")
     errors: list[str] = []
+    pending: set[asyncio.Task] = set()
+    next_model = 0
+
     async with httpx.AsyncClient(timeout=90) as client:
-        for model in _hf_text_models():
+
+        def launch() -> str:
+            nonlocal next_model
+            model = models[next_model]
+            next_model += 1
+            pending.add(asyncio.create_task(_call_model(client, model, headers, payload, stop, json_keys)))
+            return model
+
+        try:
+            latest = launch()
+            while pending:
+                hedge_after = None
+                if next_model < len(models):
+                    hedge_after = _model_health.hedge_delay(latest, HEDGE_MIN_DELAY, HEDGE_MAX_DELAY)
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    latest = launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        return task.result()
+                    except _ModelError as exc:
+                        errors.append(str(exc))
+                        if next_model < len(models):
+                            latest = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    raise HTTPException(
+        status_code=502,
+        detail=f"All free LLM backends failed. {', '.join(errors[:3])}",
+    )
+
+
+def _parse_stream_line(line: str) -> str | None:
+    """Token text from one TGI server-sent-event line, if any."""
+    if not line.startswith("data:"):
+        return None
+    body = line[5:].strip()
+    if not body or body == "[DONE]":
+        return None
+    try:
+        event = json.loads(body)
+    except json.JSONDecodeError:
+        return None
+    token = event.get("token") if isinstance(event, dict) else None
+    if isinstance(token, dict) and not token.get("special"):
+        return str(token.get("text", ""))
+    return None
+
+
+async def _stream_pieces(response: httpx.Response):
+    async for line in response.aiter_lines():
+        piece = _parse_stream_line(line)
+        if piece:
+            yield piece
+
+
+async def _stream_text(prompt: str, max_new_tokens: int, stop: tuple[str, ...] = ()):
+    """
+    Yield generated text pieces from the healthiest model that accepts the request.
+
+    Models are tried in health order until one starts streaming; backends
+    that answer with a plain JSON body are yielded as a single piece.
+    """
+    headers = _hf_headers()
+    payload = {
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": max_new_tokens,
+            "temperature": 0.2,
+            "return_full_text": False,
+            "stop": list(stop),
+        },
+        "options": {"wait_for_model": True},
+        "stream": True,
+    }
+
+    errors: list[str] = []
+    async with httpx.AsyncClient(timeout=90) as client:
+        for model in _model_health.rank(_hf_text_models()):
+            health = _model_health.get(model)
             url = f"https://router.huggingface.co/hf-inference/models/{model}"
+            started = time.monotonic()
+            streamed = False
             try:
-                response = await client.post(url, headers=headers, json=payload)
-            except httpx.HTTPError as exc:
+                async with client.stream("POST", url, headers=headers, json=payload) as response:
+                    if response.status_code != 200:
+                        health.record_failure(time.monotonic() - started)
+                        errors.append(f"{model}: status {response.status_code}")
+                        continue
+
+                    if "text/event-stream" not in response.headers.get("content-type", ""):
+                        data = json.loads(await response.aread())
+                        if isinstance(data, list) and data and isinstance(data[0], dict):
+                            data = data[0]
+                        text = data.get("generated_text") if isinstance(data, dict) else data
+                        if not isinstance(text, str):
+                            health.record_failure(time.monotonic() - started)
+                            errors.append(f"{model}: unexpected response shape")
+                            continue
+                        health.record_success(time.monotonic() - started)
+                        yield cut_at_stop(text, stop).strip()
+                        return
+
+                    # Stop sequences are applied here too: not every backend honours them.
+                    async for piece in stop_pieces(_stream_pieces(response), stop):
+                        streamed = True
+                        yield piece
+                    health.record_success(time.monotonic() - started)
+                    return
+            except (httpx.HTTPError, ValueError) as exc:
+                health.record_failure(time.monotonic() - started)
+                if streamed:
+                    # Tokens already reached the client; switching models would garble the answer.
+                    raise HTTPException(status_code=502, detail=f"{model} stream interrupted: {exc}")
                 errors.append(f"{model}: {exc}")
                 continue
 
-            if response.status_code != 200:
-                detail = response.text.strip()
-                if len(detail) > 140:
-                    detail = detail[:140] + "..."
-                errors.append(f"{model}: status {response.status_code} ({detail})")
-                continue
-
-            data = response.json()
-            if isinstance(data, list) and data and isinstance(data[0], dict):
-                if "generated_text" in data[0]:
-                    return str(data[0]["generated_text"]).strip()
-            if isinstance(data, dict) and "generated_text" in data:
-                return str(data["generated_text"]).strip()
-            if isinstance(data, str):
-                return data.strip()
-            errors.append(f"{model}: unexpected response shape")
-
     raise HTTPException(
         status_code=502,
         detail=f"All free LLM backends failed. {', '.join(errors[:3])}",
     )
 
 
-async def _retrieve_chunks(query: str, top_k: int = 5) -> list[dict]:
-    if _student_index is None or _student_index.ntotal == 0:
-        return []
+def _mmr_order(query_scores: np.ndarray, vectors: np.ndarray, lambda_: float = MMR_LAMBDA) -> list[int]:
+    """
+    Order candidates by maximal marginal relevance.
 
-    query_vec = await _embed_text(query)
-    scores, indices = _student_index.search(query_vec.reshape(1, -1), min(top_k, _student_index.ntotal))
-    results: list[dict] = []
-    for score, idx in zip(scores[0], indices[0]):
-        if idx < 0 or idx >= len(_student_chunks):
+    Pairwise similarities are computed with one matrix product; each greedy
+    step is a vectorized argmax over relevance minus redundancy.
+    """
+    count = query_scores.shape[0]
+    if count == 0:
+        return []
+    pairwise = vectors @ vectors.T
+    redundancy = np.zeros(count, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    order: list[int] = []
+    for _ in range(count):
+        mmr = lambda_ * query_scores - (1.0 - lambda_) * redundancy
+        mmr[~available] = -np.inf
+        pick = int(np.argmax(mmr))
+        order.append(pick)
+        available[pick] = False
+        redundancy = pairwise[pick] if len(order) == 1 else np.maximum(redundancy, pairwise[pick])
+    return order
+
+
+def _merge_spans(workspace: StudentWorkspace, rows: np.ndarray, scores: np.ndarray) -> list[dict]:
+    """
+    Turn retrieved chunk rows into sources, merging chunks of the same document
+    that overlap or touch into one contiguous span so shared text appears once.
+    """
+    store = workspace.chunks
+    order = np.lexsort((rows, store.starts[rows], store.doc_codes[rows]))
+    spans: list[dict] = []
+    for position in order:
+        row, score = int(rows[position]), float(scores[position])
+        doc, start, end = int(store.doc_codes[row]), int(store.starts[row]), int(store.ends[row])
+        last = spans[-1] if spans else None
+        if last is not None and start >= 0 and last["end"] >= 0 and last["doc"] == doc and start <= last["end"] + 1:
+            if end > last["end"]:
+                text = store.text(row)
+                if start < last["end"]:
+                    last["text"] += text[last["end"] - start:]
+                else:
+                    last["text"] += " " + text
+                last["end"] = end
+            last["chunk_ids"].append(int(store.chunk_ids[row]))
+            last["rows"].append(row)
+            last["score"] = max(last["score"], score)
             continue
-        chunk = _student_chunks[idx]
-        results.append(
+        spans.append(
             {
-                "chunk_id": chunk["chunk_id"],
-                "text": chunk["text"],
-                "preview": chunk["text"][:220],
-                "score": float(score),
+                "doc": doc,
+                "end": end,
+                "chunk_ids": [int(store.chunk_ids[row])],
+                "rows": [row],
+                "text": store.text(row),
+                "score": score,
             }
         )
+
+    results = [
+        {
+            "chunk_id": span["chunk_ids"][0],
+            "chunk_ids": span["chunk_ids"],
+            "text": span["text"],
+            "score": span["score"],
+            "row": span["rows"][0],
+            "rows": span["rows"],
+        }
+        for span in spans
+    ]
+    results.sort(key=lambda s: s["score"], reverse=True)
     return results
 
 
-async def _confidence_score(answer: str, sources: list[dict]) -> int:
+def _source_preview(workspace: StudentWorkspace, source: dict) -> str:
+    """Preview of a source, decoded from the chunk store only when a response needs it."""
+    return workspace.chunks.preview(source["row"])
+
+
+async def _retrieve_chunks(
+    workspace: StudentWorkspace,
+    query: str,
+    top_k: int = 5,
+    query_vec: np.ndarray | None = None,
+) -> list[dict]:
+    """
+    Over-fetch candidates, order them by MMR and merge overlapping neighbours.
+
+    Candidates are added in MMR order until ``top_k`` distinct spans are
+    selected or the context budget is full. Pass ``query_vec`` to reuse an
+    embedding the caller already computed.
+    """
+    if workspace.is_empty:
+        return []
+
+    if query_vec is None:
+        query_vec = await _embed_text(query)
+    fetch = min(top_k * RETRIEVAL_OVERFETCH, workspace.index.ntotal)
+    scores, indices = workspace.index.search(query_vec.reshape(1, -1), fetch)
+    valid = (indices[0] >= 0) & (indices[0] < len(workspace.chunks))
+    rows = indices[0][valid]
+    query_scores = scores[0][valid].astype(np.float32)
+    if rows.shape[0] == 0:
+        return []
+
+    picked: list[int] = []
+    results: list[dict] = []
+    for position in _mmr_order(query_scores, workspace.vectors[rows]):
+        trial_positions = picked + [position]
+        trial = _merge_spans(workspace, rows[trial_positions], query_scores[trial_positions])
+        if len(trial) > top_k or sum(count_tokens(s["text"]) for s in trial) > MAX_CONTEXT_TOKENS:
+            continue
+        picked.append(position)
+        results = trial
+        if len(picked) >= top_k and len(results) >= top_k:
+            break
+
+    if not results:
+        # A single oversized chunk still beats an empty context.
+        results = _merge_spans(workspace, rows[:1], query_scores[:1])
+    return results
+
+
+def _source_label(source: dict) -> str:
+    ids = source.get("chunk_ids") or [source["chunk_id"]]
+    if len(ids) == 1:
+        return f"[Chunk {ids[0]}]"
+    return f"[Chunks {', '.join(map(str, ids))}]"
+
+
+def _ask_context(sources: list[dict]) -> str:
+    context, _ = pack_segments(
+        [{"prefix": f"{_source_label(s)} ", "text": s["text"], "score": s["score"]} for s in sources],
+        MAX_CONTEXT_TOKENS,
+        task="student_ask",
+    )
+    return context
+
+
+def _cited_sources(sources: list[dict], used_ids: list[int]) -> list[dict]:
+    if not used_ids:
+        return sources[:3]
+    return [s for s in sources if any(i in used_ids for i in s.get("chunk_ids", [s["chunk_id"]]))]
+
+
+def _source_vectors(workspace: StudentWorkspace, sources: list[dict]) -> np.ndarray:
+    """Look up the stored embeddings for retrieved sources (no network calls)."""
+    rows = [
+        row
+        for s in sources
+        for row in s.get("rows", [s.get("row", -1)])
+        if 0 <= row < workspace.vectors.shape[0]
+    ]
+    return workspace.vectors[rows]
+
+
+async def _confidence_score(workspace: StudentWorkspace, answer: str, sources: list[dict]) -> int:
     if not answer.strip() or not sources:
         return 0
 
     answer_vec = await _embed_text(answer[:1800])
-    source_vecs = []
-    retrieval_scores = []
-    for source in sources:
-        source_vecs.append(await _embed_text(source["text"][:1800]))
-        retrieval_scores.append(max(0.0, min(1.0, source.get("score", 0.0))))
+    source_vecs = _source_vectors(workspace, sources)
+    retrieval_scores = [max(0.0, min(1.0, source.get("score", 0.0))) for source in sources]
 
     similarity = 0.0
-    if source_vecs:
-        similarity = max(float(np.dot(answer_vec, vec)) for vec in source_vecs)
+    if source_vecs.shape[0]:
+        similarity = float((source_vecs @ answer_vec).max())
         similarity = max(0.0, min(1.0, similarity))
 
     retrieval_component = int((sum(retrieval_scores) / max(1, len(retrieval_scores))) * 100)
@@ -435,79 +818,197 @@ async def _confidence_score(answer: str, sources: list[dict]) -> int:
     return max(0, min(100, confidence))
 
 
-@router.post("/upload")
-async def student_upload(file: UploadFile = File(...)):
-    if not file:
-        raise HTTPException(status_code=400, detail="File is required.")
-
-    content_type = file.content_type or ""
-    extracted_text = ""
-
-    filename = (file.filename or "").lower()
-    if content_type == "application/pdf" or filename.endswith(".pdf"):
+async def _embed_chunks(chunks: list[dict]) -> tuple[np.ndarray, int]:
+    """Embed chunk texts, reusing vectors for content already seen by this process."""
+    vectors: list[np.ndarray] = []
+    reused = 0
+    for chunk in chunks:
+        vector = cached_chunk_vector(chunk["content_hash"])
+        if vector is None:
+            vector = await _embed_text(chunk["text"])
+            remember_chunk_vector(chunk["content_hash"], vector)
+        else:
+            reused += 1
+        vectors.append(vector)
+    return np.stack(vectors).astype(np.float32), reused
+
+
+async def _extract_pages(upload: Upload) -> list[str]:
+    if upload.content_type == "application/pdf":
         try:
-            contents = await file.read()
-            reader = PdfReader(BytesIO(contents))
-            extracted_text = "\n".join([(page.extract_text() or "") for page in reader.pages])
+            with upload.open() as stream:
+                reader = PdfReader(stream)
+                return [(page.extract_text() or "") for page in reader.pages]
         except Exception:
             raise HTTPException(status_code=400, detail="Could not parse PDF.")
-    elif content_type.startswith("image/"):
-        extracted = await extract_text_from_image(file)
-        extracted_text = extracted or ""
-    else:
+    extracted = await extract_text_from_image(upload)
+    return [extracted or ""]
+
+
+def _duplicate_upload(workspace: StudentWorkspace, existing: dict) -> dict:
+    return {
+        "status": "success",
+        "chunks_created": 0,
+        "workspace_id": workspace.workspace_id,
+        "document_id": existing["doc_id"],
+        "duplicate": True,
+        "documents": len(workspace.documents),
+    }
+
+
+def _check_document_limit(workspace: StudentWorkspace) -> None:
+    if len(workspace.documents) >= MAX_WORKSPACE_DOCUMENTS:
         raise HTTPException(
             status_code=400,
-            detail="Unsupported file type. Upload PDF or image notes.",
+            detail=f"Workspace already holds {MAX_WORKSPACE_DOCUMENTS} documents. Clear it before uploading more.",
         )
 
-    extracted_text = _clean_text(extracted_text)[:MAX_FILE_CHARS]
-    if not extracted_text:
-        raise HTTPException(status_code=400, detail="No readable text found in uploaded file.")
-
-    chunks = _chunk_text(extracted_text)
-    if not chunks:
-        raise HTTPException(status_code=400, detail="Unable to create chunks from uploaded text.")
 
-    vectors: list[np.ndarray] = []
-    for chunk in chunks:
-        vectors.append(await _embed_text(chunk))
-
-    if not vectors:
-        raise HTTPException(status_code=500, detail="No embeddings could be generated.")
+@router.post("/upload")
+async def student_upload(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    workspace_id: str = Depends(_workspace_id),
+):
+    if not file:
+        raise HTTPException(status_code=400, detail="File is required.")
 
-    global _student_index, _student_chunks
-    _student_index = faiss.IndexFlatIP(EMBEDDING_DIM)
-    matrix = np.stack(vectors).astype(np.float32)
-    _student_index.add(matrix)
+    upload = await read_upload(
+        file,
+        MAX_DOCUMENT_UPLOAD_BYTES,
+        DOCUMENT_TYPES,
+        unsupported_detail="Unsupported file type. Upload PDF or image notes.",
+    )
+    with upload:
+        file_hash = upload.sha256
+        workspace = await get_or_create_workspace(workspace_id)
+
+        # Early exit before extraction; re-checked under the lock below.
+        existing = workspace.find_document(file_hash)
+        if existing is not None:
+            return _duplicate_upload(workspace, existing)
+        _check_document_limit(workspace)
+
+        cached = await load_document_cache(file_hash)
+        pages = await _extract_pages(upload) if cached is None else None
+
+    if cached is not None:
+        chunks, matrix = cached
+        reused = len(chunks)
+    else:
+        extracted_text, page_starts = _join_pages(pages)
+        if not extracted_text:
+            raise HTTPException(status_code=400, detail="No readable text found in uploaded file.")
+
+        chunks = chunk_document(
+            extracted_text,
+            target_tokens=CHUNK_TARGET_TOKENS,
+            overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            page_starts=page_starts,
+        )
+        if not chunks:
+            raise HTTPException(status_code=400, detail="Unable to create chunks from uploaded text.")
 
-    _student_chunks = []
-    for i, chunk in enumerate(chunks, start=1):
-        _student_chunks.append(
+        chunks = [
             {
-                "chunk_id": i,
                 "namespace": STUDENT_INDEX_NAME,
-                "text": chunk,
+                "text": chunk["text"],
+                "content_hash": content_hash(chunk["text"]),
+                "start": chunk["start"],
+                "end": chunk["end"],
+                "page": chunk["page"],
+                "page_end": chunk["page_end"],
             }
-        )
+            for chunk in chunks
+        ]
+        matrix, reused = await _embed_chunks(chunks)
+        await save_document_cache(file_hash, chunks, matrix)
+
+    document = {
+        "doc_id": file_hash[:16],
+        "sha256": file_hash,
+        "filename": file.filename or "upload",
+    }
+    for attempt in range(2):
+        async with workspace.lock:
+            # Revalidated under the lock: another instance or a concurrent
+            # upload of the same file may have changed the library meanwhile.
+            workspace = await get_or_create_workspace(workspace_id, fresh=True)
+            existing = workspace.find_document(file_hash)
+            if existing is not None:
+                return _duplicate_upload(workspace, existing)
+            _check_document_limit(workspace)
+            chunks_before = len(workspace.chunks)
+            document = workspace.add_document(document, chunks, matrix)
+            try:
+                await save_workspace(workspace)
+            except WorkspaceConflict:
+                if attempt:
+                    raise HTTPException(
+                        status_code=409, detail="Workspace was updated concurrently. Please retry the upload."
+                    )
+                continue  # saved elsewhere since loaded; reload and apply the upload again
+            # Index the new sentences now so offline fallbacks never pay for it on a request.
+            await asyncio.to_thread(workspace.refresh_sentence_index)
+            break
+    if PREGENERATE_MODES:
+        background_tasks.add_task(_pregenerate, workspace_id)
+
+    return {
+        "status": "success",
+        "chunks_created": len(workspace.chunks) - chunks_before,
+        "chunks_reused": reused,
+        "workspace_id": workspace_id,
+        "document_id": document["doc_id"],
+        "duplicate": False,
+        "documents": len(workspace.documents),
+    }
 
-    return {"status": "success", "chunks_created": len(_student_chunks)}
+
+@router.get("/documents")
+async def student_documents(workspace_id: str = Depends(_workspace_id)):
+    workspace = await get_workspace(workspace_id)
+    documents = workspace.documents if workspace is not None else []
+    return {
+        "workspace_id": workspace_id,
+        "documents": [
+            {"document_id": d["doc_id"], "filename": d.get("filename", ""), "chunks": len(d.get("chunk_ids", []))}
+            for d in documents
+        ],
+    }
+
+
+@router.delete("/documents")
+async def student_clear_documents(workspace_id: str = Depends(_workspace_id)):
+    workspace = await get_workspace(workspace_id)
+    if workspace is not None:
+        async with workspace.lock:
+            workspace = await get_workspace(workspace_id, fresh=True)
+            if workspace is not None:
+                workspace.clear()
+                try:
+                    await save_workspace(workspace)
+                except WorkspaceConflict:
+                    raise HTTPException(
+                        status_code=409, detail="Workspace was updated concurrently. Please retry."
+                    )
+    return {"status": "success", "workspace_id": workspace_id}
 
 
 @router.post("/ask")
-async def student_ask(payload: AskRequest):
+async def student_ask(payload: AskRequest, workspace_id: str = Depends(_workspace_id)):
     question = (payload.question or "").strip()
     if not question:
         raise HTTPException(status_code=400, detail="Question cannot be empty.")
-    if _student_index is None or _student_index.ntotal == 0:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "status": "error",
-                "message": "No uploaded notes found. Upload notes first.",
-            },
-        )
+    workspace = await _require_workspace(workspace_id)
 
-    sources = await _retrieve_chunks(question, top_k=5)
+    question_vec = await _embed_text(question)
+    cached = workspace.get_answer(question_vec)
+    if cached is not None:
+        return {key: value for key, value in cached.items() if key != "used_chunk_ids"}
+
+    version = workspace.version
+    sources = await _retrieve_chunks(workspace, question, top_k=5, query_vec=question_vec)
     if not sources:
         return {
             "answer": "Insufficient information in uploaded material.",
@@ -516,7 +1017,7 @@ async def student_ask(payload: AskRequest):
             "confidence": 0,
         }
 
-    context = "\n\n".join([f"[Chunk {s['chunk_id']}] {s['text']}" for s in sources])[:MAX_CONTEXT_CHARS]
+    context = _ask_context(sources)
     prompt = f"""
 You are an academic RAG assistant.
 Grounded Mode rules:
@@ -541,15 +1042,15 @@ Return JSON:
 """.strip()
 
     try:
-        raw = await _generate_text(prompt, max_new_tokens=MAX_OUTPUT_TOKENS_ASK)
-        parsed = _extract_json_blob(raw) or {}
+        raw = await _generate_text(prompt, **GENERATION_PROFILES["ask"])
+        parsed = extract_json_object(raw) or {}
     except HTTPException:
-        return _fallback_ask_response(sources)
+        return _fallback_ask_response(workspace, question, sources)
 
     answer = str(parsed.get("answer", "")).strip()
     simple = str(parsed.get("explanation_simple", "")).strip()
     insufficient = bool(parsed.get("insufficient", False))
-    used_ids = _coerce_ids(parsed.get("used_chunk_ids", []), max_id=len(_student_chunks))
+    used_ids = _coerce_ids(parsed.get("used_chunk_ids", []), max_id=len(workspace.chunks))
 
     if insufficient or not answer:
         return {
@@ -559,59 +1060,188 @@ Return JSON:
             "confidence": 0,
         }
 
-    filtered_sources = [s for s in sources if s["chunk_id"] in used_ids] if used_ids else sources[:3]
-    confidence = await _confidence_score(answer, filtered_sources)
+    filtered_sources = _cited_sources(sources, used_ids)
+    confidence = await _confidence_score(workspace, answer, filtered_sources)
 
-    return {
+    response = {
         "answer": answer[:2200],
         "explanation_simple": simple[:1800] or "This answer is based on the cited chunks.",
         "sources": [
             {
                 "chunk_id": s["chunk_id"],
-                "preview": s["preview"],
+                "preview": _source_preview(workspace, s),
             }
             for s in filtered_sources
         ],
         "confidence": confidence,
     }
+    workspace.put_answer(version, question_vec, {**response, "used_chunk_ids": used_ids})
+    return response
 
 
-@router.post("/generate")
-async def student_generate(payload: GenerateRequest):
-    if _student_index is None or _student_index.ntotal == 0:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "status": "error",
-                "message": "No uploaded notes found. Upload notes first.",
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _split_streamed_answer(text: str) -> tuple[str, str]:
+    """Separate the answer from the trailing 'Simple explanation:' section."""
+    parts = re.split(r"\n?\s*simple explanation\s*:\s*", text, maxsplit=1, flags=re.IGNORECASE)
+    answer = parts[0].strip()
+    simple = parts[1].strip() if len(parts) > 1 else ""
+    return answer, simple
+
+
+@router.post("/ask/stream")
+async def student_ask_stream(payload: AskRequest, workspace_id: str = Depends(_workspace_id)):
+    """
+    Server-sent-events variant of /ask.
+
+    Emits ``sources`` as soon as retrieval finishes, then ``token`` events
+    while the answer is generated, then ``done`` with the parsed chunk
+    citations and confidence score, or ``error`` (with ``truncated`` when the
+    stream broke after tokens were sent).
+    """
+    question = (payload.question or "").strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty.")
+    workspace = await _require_workspace(workspace_id)
+    question_vec = await _embed_text(question)
+    cached = workspace.get_answer(question_vec)
+    version = workspace.version
+    sources = [] if cached is not None else await _retrieve_chunks(workspace, question, top_k=5, query_vec=question_vec)
+
+    async def events():
+        if cached is not None:
+            # Same payload shape as a live answer, delivered in one token.
+            yield _sse("sources", {"sources": cached["sources"]})
+            yield _sse("token", {"text": cached["answer"]})
+            yield _sse("done", {**cached, "used_chunk_ids": cached.get("used_chunk_ids", [])})
+            return
+
+        yield _sse(
+            "sources",
+            {
+                "sources": [
+                    {"chunk_id": s["chunk_id"], "preview": _source_preview(workspace, s), "score": s["score"]}
+                    for s in sources
+                ]
             },
         )
+        if not sources:
+            yield _sse(
+                "done",
+                {
+                    "answer": "Insufficient information in uploaded material.",
+                    "explanation_simple": "The notes do not contain enough information to answer this question.",
+                    "sources": [],
+                    "confidence": 0,
+                },
+            )
+            return
+
+        context = _ask_context(sources)
+        prompt = f"""
+You are an academic RAG assistant.
+Grounded Mode rules:
+1) Answer ONLY using the provided context.
+2) If context is insufficient, respond exactly: "Insufficient information in uploaded material."
+3) Cite the chunks you use inline, like [Chunk 2].
+4) After the answer, add a line starting with "Simple explanation:" that restates it in easy English.
+
+Context:
+{context}
+
+Question:
+{question}
+
+Answer:
+""".strip()
+
+        pieces: list[str] = []
+        completed = False  # the model stream ran to its end (or a stop sequence)
+        try:
+            async for piece in _stream_text(prompt, **GENERATION_PROFILES["ask_stream"]):
+                pieces.append(piece)
+                yield _sse("token", {"text": piece})
+            completed = True
+        except HTTPException as exc:
+            if not pieces:
+                fallback = _fallback_ask_response(workspace, question, sources)
+                yield _sse("token", {"text": fallback["answer"]})
+                yield _sse("done", fallback)
+                return
+            # Tokens already reached the client: report the cut instead of passing it off as an answer.
+            print(f"⚠️  Answer stream interrupted after {len(pieces)} pieces: {exc.detail}")
+            yield _sse("error", {"message": "The answer was interrupted. Please ask again.", "truncated": True})
+            return
+        except Exception as exc:
+            print(f"❌ Answer stream failed: {type(exc).__name__}: {exc}")
+            yield _sse("error", {"message": "Generation failed. Please try again."})
+            return
+
+        answer, simple = _split_streamed_answer("".join(pieces))
+        if not answer or answer.lower().startswith("insufficient information"):
+            yield _sse(
+                "done",
+                {
+                    "answer": "Insufficient information in uploaded material.",
+                    "explanation_simple": "The uploaded notes do not provide enough detail to answer this question safely.",
+                    "sources": [],
+                    "confidence": 0,
+                },
+            )
+            return
+
+        cited_refs = re.findall(r"\[Chunks?\s+([\d,\s]+)\]", answer, flags=re.IGNORECASE)
+        cited = _coerce_ids(re.findall(r"\d+", " ".join(cited_refs)), max_id=len(workspace.chunks))
+        filtered_sources = _cited_sources(sources, cited)
+        try:
+            confidence = await _confidence_score(workspace, answer, filtered_sources)
+        except HTTPException:
+            confidence = 0
+
+        response = {
+            "answer": answer[:2200],
+            "explanation_simple": simple[:1800] or "This answer is based on the cited chunks.",
+            "sources": [{"chunk_id": s["chunk_id"], "preview": _source_preview(workspace, s)} for s in filtered_sources],
+            "used_chunk_ids": cited,
+            "confidence": confidence,
+        }
+        # Only complete model answers are replayed: never a cut-off stream, a
+        # fallback, or one whose confidence embedding failed.
+        if completed and confidence:
+            workspace.put_answer(version, question_vec, response)
+        yield _sse("done", response)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    mode = payload.mode
-    full_context = "\n\n".join([f"[Chunk {c['chunk_id']}] {c['text']}" for c in _student_chunks])[:MAX_CONTEXT_CHARS]
 
-    schema_map = {
-        "summary": """
+_MODE_SCHEMAS = {
+    "summary": """
 {
   "summary": "executive summary",
   "evidence_chunk_ids": [1,2,3]
 }
 """.strip(),
-        "keypoints": """
+    "keypoints": """
 {
   "key_concepts": [
     {"concept":"...", "explanation":"...", "evidence_chunk_ids":[1]}
   ]
 }
 """.strip(),
-        "flashcards": """
+    "flashcards": """
 {
   "flashcards": [
     {"question":"...", "answer":"...", "evidence_chunk_ids":[1]}
   ]
 }
 """.strip(),
-        "mcq": """
+    "mcq": """
 {
   "mcqs": [
     {
@@ -652,14 +1282,14 @@ async def student_generate(payload: GenerateRequest):
   ]
 }
 """.strip(),
-        "viva": """
+    "viva": """
 {
   "viva_questions": [
     {"question":"...", "model_answer":"...", "difficulty":"medium", "evidence_chunk_ids":[1]}
   ]
 }
 """.strip(),
-        "concept_map": """
+    "concept_map": """
 {
   "concept_relationships": [
     {
@@ -672,29 +1302,282 @@ async def student_generate(payload: GenerateRequest):
   ]
 }
 """.strip(),
-    }
+}
+
+
+def _generation_items(chunks: ChunkStore) -> list[dict]:
+    return [
+        {"label": f"[Chunk {chunk_id}]", "text": text, "evidence": [chunk_id]}
+        for chunk_id, text in chunks.texts()
+    ]
+
+
+def _render_items(items: list[dict]) -> str:
+    return "\n\n".join([f"{item['label']} {item['text']}" for item in items])
+
+
+def _pack_items(items: list[dict], task: str) -> str:
+    """Render items within MAX_CONTEXT_TOKENS, keeping their order."""
+    context, _ = pack_segments(
+        [{"prefix": f"{item['label']} ", "text": item["text"]} for item in items],
+        MAX_CONTEXT_TOKENS,
+        task=task,
+    )
+    return context
+
+
+def _pack_groups(items: list[dict], max_tokens: int) -> list[list[dict]]:
+    """Pack consecutive items into groups whose rendered context fits ``max_tokens``."""
+    groups: list[list[dict]] = []
+    current: list[dict] = []
+    size = 0
+    for item in items:
+        length = count_tokens(item["label"]) + count_tokens(item["text"])
+        if current and size + length > max_tokens:
+            groups.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += length
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _summarize_group(
+    workspace: StudentWorkspace,
+    group: list[dict],
+    version: int,
+    semaphore: asyncio.Semaphore,
+) -> tuple[dict, bool]:
+    """Map step: condense one group into a partial summary that keeps its evidence ids."""
+    context = _pack_items(group, task="student_map")
+    pool = sorted({i for item in group for i in item["evidence"]})
+    label = f"[Part covering chunks {pool[0]}-{pool[-1]} | evidence chunk IDs: {', '.join(map(str, pool))}]"
+    cache_key = f"map:{content_hash(context)[:24]}"
+
+    cached = workspace.get_derived(cache_key)
+    if cached is not None:
+        return {"label": label, "text": cached["summary"], "evidence": cached["evidence_chunk_ids"]}, False
+
+    prompt = f"""
+You are condensing one part of a student's study notes.
+Use ONLY the context below. Keep every definition, fact, formula and example a student would need.
+Cite the chunk IDs that support the summary, using only IDs that appear in the context.
+Return strict JSON only. No markdown.
+
+Context:
+{context}
+
+Output schema:
+{{
+  "summary": "dense summary of this part",
+  "evidence_chunk_ids": [1,2]
+}}
+""".strip()
+
+    async with semaphore:
+        try:
+            raw = await _generate_text(prompt, **GENERATION_PROFILES["map"])
+            parsed = extract_json_object(raw) or {}
+        except HTTPException:
+            parsed = {}
+
+    summary = str(parsed.get("summary", "")).strip()
+    if not summary:
+        # Extractive stand-in keeps the reduce step going; not cached.
+        index = workspace.get_sentence_index()
+        text = " ".join(index.sentences[p] for p in index.select(4, chunk_ids=pool))
+        return {"label": label, "text": text, "evidence": pool}, False
+
+    evidence = [i for i in _coerce_ids(parsed.get("evidence_chunk_ids", []), pool[-1]) if i in pool] or pool
+    workspace.put_derived(cache_key, version, {"summary": summary[:2500], "evidence_chunk_ids": evidence})
+    return {"label": label, "text": summary[:2500], "evidence": evidence}, True
+
+
+async def _generation_context(workspace: StudentWorkspace, version: int) -> tuple[str, bool]:
+    """
+    Build the context for study-tool generation.
+
+    Small libraries are used verbatim. Larger ones go through hierarchical
+    map-reduce: groups of chunks are summarized concurrently (bounded by
+    MAP_REDUCE_CONCURRENCY), and the partial summaries are reduced again
+    until the whole document fits in MAX_CONTEXT_TOKENS.
+    """
+    items = _generation_items(workspace.chunks)
+    semaphore = asyncio.Semaphore(MAP_REDUCE_CONCURRENCY)
+    summarized = False
+
+    for _ in range(MAP_REDUCE_MAX_LEVELS):
+        if count_tokens(_render_items(items)) <= MAX_CONTEXT_TOKENS:
+            break
+        groups = _pack_groups(items, MAX_CONTEXT_TOKENS)
+        results = await asyncio.gather(
+            *[
+                _run_shared(
+                    (workspace.workspace_id, version, "map", content_hash(_render_items(group))),
+                    lambda group=group: _summarize_group(workspace, group, version, semaphore),
+                )
+                for group in groups
+            ]
+        )
+        items = [item for item, _ in results]
+        summarized = True
+        if any(fresh for _, fresh in results):
+            await save_derived(workspace)
+
+    return _pack_items(items, task="student_generate"), summarized
+
+
+async def _generate_mode(workspace: StudentWorkspace, mode: str, version: int) -> tuple[dict, bool]:
+    """Generate a study tool; the flag is False when the offline fallback was used."""
+    # Modes generated concurrently share one context build (and its map summaries).
+    context, summarized = await _run_shared(
+        (workspace.workspace_id, version, "context"),
+        lambda: _generation_context(workspace, version),
+    )
+    context_note = (
+        "The context is a set of summaries covering the whole document. "
+        "Cite only chunk IDs listed in the evidence brackets.\n"
+        if summarized
+        else ""
+    )
 
     prompt = f"""
 You are an educational assistant in grounded mode.
 Use ONLY the context below. If context is insufficient, return an empty valid JSON for the schema.
 Return strict JSON only. No markdown.
-
+{context_note}
 Mode: {mode}
 Context:
-{full_context}
+{context}
 
 Output schema:
-{schema_map[mode]}
+{_MODE_SCHEMAS[mode]}
 """.strip()
 
     try:
-        raw = await _generate_text(prompt, max_new_tokens=MAX_OUTPUT_TOKENS_GENERATE)
-        parsed = _extract_json_blob(raw)
+        raw = await _generate_text(prompt, **GENERATION_PROFILES[mode])
+        parsed = extract_json_object(raw)
         if not parsed:
             raise HTTPException(status_code=502, detail="Model did not return valid JSON.")
 
-        validated = _validate_mode_output(mode, parsed, max_id=len(_student_chunks))
-        return {"mode": mode, "data": validated}
+        return _validate_mode_output(mode, parsed, max_id=len(workspace.chunks)), True
     except HTTPException:
-        fallback = _fallback_generate(mode, _student_chunks)
-        return {"mode": mode, "data": _validate_mode_output(mode, fallback, max_id=len(_student_chunks))}
+        fallback = _fallback_generate(mode, workspace)
+        return _validate_mode_output(mode, fallback, max_id=len(workspace.chunks)), False
+
+
+async def _generate_and_cache(workspace: StudentWorkspace, mode: str, version: int) -> dict:
+    data, grounded = await _generate_mode(workspace, mode, version)
+    # Fallback output is cheap and should not block a later real generation.
+    if grounded and workspace.put_derived(f"generate:{mode}", version, data):
+        await save_derived(workspace)
+    return data
+
+
+async def _run_shared(key: tuple, factory):
+    """Run ``factory()`` once per key; concurrent callers await the same task."""
+    task = _inflight_tasks.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight_tasks[key] = task
+        task.add_done_callback(lambda _: _inflight_tasks.pop(key, None))
+    # Shield so a disconnecting client does not cancel work other callers await.
+    return await asyncio.shield(task)
+
+
+async def _generate_cached(workspace: StudentWorkspace, mode: str) -> tuple[dict, bool]:
+    """Return (output, cache_hit); concurrent requests for the same output share one LLM call."""
+    cached = workspace.get_derived(f"generate:{mode}")
+    if cached is not None:
+        return cached, True
+
+    version = workspace.version
+    data = await _run_shared(
+        (workspace.workspace_id, version, "generate", mode),
+        lambda: _generate_and_cache(workspace, mode, version),
+    )
+    return data, False
+
+
+async def _pregenerate(workspace_id: str) -> None:
+    """Background job: warm the generate cache for the most common modes."""
+    workspace = await get_workspace(workspace_id)
+    if workspace is None or workspace.is_empty:
+        return
+    results = await asyncio.gather(
+        *[_generate_cached(workspace, mode) for mode in PREGENERATE_MODES],
+        return_exceptions=True,
+    )
+    for mode, result in zip(PREGENERATE_MODES, results):
+        if isinstance(result, Exception):
+            print(f"⚠️  Pre-generation of '{mode}' failed for workspace '{workspace_id}': {result}")
+
+
+@router.post("/generate")
+async def student_generate(payload: GenerateRequest, workspace_id: str = Depends(_workspace_id)):
+    workspace = await _require_workspace(workspace_id)
+    data, cached = await _generate_cached(workspace, payload.mode)
+    return {"mode": payload.mode, "data": data, "cached": cached}
+
+
+@router.post("/generate/pack")
+async def student_generate_pack(payload: PackRequest, workspace_id: str = Depends(_workspace_id)):
+    """
+    Generate several study tools in one call, as server-sent events.
+
+    Modes run concurrently (bounded by PACK_CONCURRENCY) over one shared
+    generation context. Each emits a ``mode`` event (or ``error``) as soon
+    as it is ready, and ``done`` lists the outcome once all have finished.
+    """
+    modes = list(dict.fromkeys(payload.modes))
+    if not modes:
+        raise HTTPException(status_code=400, detail="Select at least one mode.")
+    workspace = await _require_workspace(workspace_id)
+    semaphore = asyncio.Semaphore(PACK_CONCURRENCY)
+
+    async def run(mode: str) -> tuple[str, str | None, str | None]:
+        """(mode, rendered ``mode`` event, error message); never raises, so every mode reports."""
+        try:
+            async with semaphore:
+                data, cached = await _generate_cached(workspace, mode)
+            return mode, _sse("mode", {"mode": mode, "data": data, "cached": cached}), None
+        except HTTPException as exc:
+            return mode, None, str(exc.detail)
+        except Exception as exc:
+            print(f"⚠️  Study pack mode '{mode}' failed: {type(exc).__name__}: {exc}")
+            return mode, None, f"Could not generate {mode}. Please try again."
+
+    async def events():
+        tasks = [asyncio.ensure_future(run(mode)) for mode in modes]
+        completed: list[str] = []
+        failed: list[str] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                mode, event, error = await next_done
+                if error is not None:
+                    failed.append(mode)
+                    yield _sse("error", {"mode": mode, "message": error})
+                    continue
+                completed.append(mode)
+                yield event
+            yield _sse("done", {"modes": completed, "failed": failed})
+        finally:
+            # Client went away: stop waiting (shared generations keep running for others).
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def student_stats():
+    return {
+        "models": _model_health.snapshot(),
+        "caches": workspace_cache_stats(),
+        "context_packing": packing_stats(),
+    }
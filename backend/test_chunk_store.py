@@ -0,0 +1,70 @@
+"""Checks for the columnar chunk store: row access and byte round-trips."""
+import hashlib
+
+from services.chunk_store import ChunkStore
+
+RECORDS = [
+    {"text": "First chunk about cells.", "chunk_id": 1, "doc_id": "doc-a", "start": 0, "end": 24, "page": 1},
+    {"text": "Ünïcødé chunk — with emoji 🧬.", "chunk_id": 2, "doc_id": "doc-a", "start": 20, "end": 50, "page": 1},
+    {"text": "", "chunk_id": 3, "doc_id": "doc-b"},  # no spans, pages or hash
+    {"text": "Last chunk.", "chunk_id": 4, "doc_id": "doc-b", "start": 0, "end": 11, "page": None},
+]
+RECORDS[0]["page_end"], RECORDS[1]["page_end"], RECORDS[3]["page_end"] = 1, 2, None
+for record in RECORDS:
+    if record["text"]:
+        record["content_hash"] = hashlib.sha256(record["text"].encode("utf-8")).hexdigest()
+
+
+def _expected(record: dict) -> dict:
+    optional = {key: None for key in ("start", "end", "page", "page_end")}
+    return {"namespace": "", "content_hash": "", **optional, **record}
+
+
+def test_records_are_reproduced():
+    store = ChunkStore.from_records(RECORDS)
+    assert len(store) == len(RECORDS)
+    assert [store.record(row) for row in range(len(store))] == [_expected(r) for r in RECORDS]
+    assert list(store.texts(1)) == [(r["chunk_id"], r["text"]) for r in RECORDS[1:]]
+    assert store.preview(1, limit=7) == "Ünïcødé"
+
+
+def test_bytes_round_trip():
+    store = ChunkStore.from_records(RECORDS)
+    store.namespace = "student-1"
+    restored = ChunkStore.from_bytes(store.to_bytes())
+    assert restored.namespace == "student-1"
+    assert [restored.record(row) for row in range(len(restored))] == [
+        store.record(row) for row in range(len(store))
+    ]
+    assert restored.hash_index() == store.hash_index() == {
+        r["content_hash"]: r["chunk_id"] for r in RECORDS if "content_hash" in r
+    }
+    assert restored.nbytes == store.nbytes
+
+
+def test_extend_after_round_trip():
+    restored = ChunkStore.from_bytes(ChunkStore.from_records(RECORDS[:2]).to_bytes())
+    restored.extend(RECORDS[2:])
+    assert [restored.record(row) for row in range(len(restored))] == [_expected(r) for r in RECORDS]
+
+
+def test_empty_store_round_trip():
+    restored = ChunkStore.from_bytes(ChunkStore().to_bytes())
+    assert len(restored) == 0 and restored.hash_index() == {} and list(restored.texts()) == []
+
+
+def test_mismatched_columns_are_rejected():
+    store = ChunkStore.from_records(RECORDS)
+    store._text = store._text[:-3]
+    try:
+        ChunkStore.from_bytes(store.to_bytes())
+    except ValueError:
+        return
+    raise AssertionError("a truncated text buffer was accepted")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,65 @@
+"""Checks for token-aware chunking: offsets, budgets, overlap and pages."""
+from services.chunker import chunk_document, count_tokens, truncate_to_tokens
+
+PAGES = [
+    "Photosynthesis converts light energy into chemical energy. It happens in chloroplasts! "
+    "The light reactions split water and release oxygen. ",
+    "The Calvin cycle fixes carbon dioxide into sugars. Rubisco is the key enzyme; it is slow. "
+    "Plants in hot climates use C4 or CAM pathways to limit photorespiration. ",
+    "Überraschung: non-ASCII words — and emoji 🌱 — must keep offsets aligned. Done?",
+]
+TEXT = "".join(PAGES)
+PAGE_STARTS = [sum(len(p) for p in PAGES[:i]) for i in range(len(PAGES))]
+
+
+def test_offsets_slice_the_source():
+    chunks = chunk_document(TEXT, target_tokens=20, overlap_tokens=5, page_starts=PAGE_STARTS)
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert chunk["text"] == TEXT[chunk["start"] : chunk["end"]]
+        assert chunk["text"] == chunk["text"].strip()
+        assert 0 < chunk["tokens"] <= 20
+        assert count_tokens(chunk["text"]) == chunk["tokens"]
+
+
+def test_chunks_cover_text_in_order_with_overlap():
+    chunks = chunk_document(TEXT, target_tokens=20, overlap_tokens=5, page_starts=PAGE_STARTS)
+    assert chunks[0]["start"] == 0
+    assert chunks[-1]["end"] == len(TEXT.rstrip())
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous["start"] < chunk["start"] < previous["end"]  # overlapping, always advancing
+
+
+def test_pages():
+    chunks = chunk_document(TEXT, target_tokens=20, overlap_tokens=0, page_starts=PAGE_STARTS)
+    for chunk in chunks:
+        first = max(i for i, start in enumerate(PAGE_STARTS) if start <= chunk["start"]) + 1
+        last = max(i for i, start in enumerate(PAGE_STARTS) if start <= chunk["end"] - 1) + 1
+        assert (chunk["page"], chunk["page_end"]) == (first, last)
+    assert chunks[-1]["page_end"] == len(PAGES)
+    assert all(c["page"] == 1 for c in chunk_document(TEXT, 20, 0))
+
+
+def test_edge_cases():
+    assert chunk_document("", 20, 5) == []
+    assert chunk_document("   \n\t ", 20, 5) == []
+    single = chunk_document("  One sentence.  ", 20, 5)
+    assert [(c["start"], c["end"]) for c in single] == [(2, 15)]
+    # An overlap at or above the budget must still make progress.
+    assert chunk_document(TEXT, target_tokens=4, overlap_tokens=10)[-1]["end"] == len(TEXT.rstrip())
+
+
+def test_truncate_to_tokens():
+    assert truncate_to_tokens(TEXT, 10_000) == TEXT
+    assert truncate_to_tokens(TEXT, 0) == ""
+    cut = truncate_to_tokens(TEXT, 15)
+    assert TEXT.startswith(cut) and count_tokens(cut) <= 15
+    assert cut[-1] in ".!?"  # whole sentences fit, so the cut is on a sentence boundary
+    assert truncate_to_tokens("word " * 50, 5) == "word word word word word"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,69 @@
+"""Checks for the linear-time JSON object scanner used on LLM output."""
+from utils.json_extract import JSONObjectScanner, extract_json_object, extract_json_objects
+
+LLM_OUTPUT = (
+    'Sure! Here is the verdict {not json} and then:\n'
+    '```json\n{"label": "fake", "reason": "uses \\"braces\\" like } and {", "scores": {"a": 1}}\n```\n'
+    'and a second one {"label": "real"} trailing {'
+)
+
+
+def test_braces_inside_strings_are_ignored():
+    objects = extract_json_objects(LLM_OUTPUT)
+    assert objects == [
+        {"label": "fake", "reason": 'uses "braces" like } and {', "scores": {"a": 1}},
+        {"label": "real"},
+    ]
+    assert extract_json_object(LLM_OUTPUT)["label"] == "fake"
+
+
+def test_incremental_feed_matches_whole_text():
+    for step in (1, 2, 7, 64):
+        scanner = JSONObjectScanner()
+        found = []
+        for i in range(0, len(LLM_OUTPUT), step):
+            found += scanner.feed(LLM_OUTPUT[i : i + step])
+        found += scanner.close()
+        assert found == extract_json_objects(LLM_OUTPUT), step
+
+
+def test_objects_are_reported_when_they_close():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('prefix {"a": ') == []
+    assert scanner.feed('1} {"b"') == [{"a": 1}]
+    assert scanner.feed(": 2}") == [{"b": 2}]
+
+
+def test_invalid_outer_span_falls_back_to_inner_objects():
+    text = '{"outer": oops, "inner": {"x": 1}, "other": {"y": 2}}'
+    assert extract_json_objects(text) == [{"x": 1}, {"y": 2}]
+
+
+def test_unclosed_brace_flushes_on_close():
+    scanner = JSONObjectScanner()
+    assert scanner.feed('{"answer": {"label": "fake"}, "confidence": 0.') == []
+    assert scanner.close() == [{"label": "fake"}]
+    assert scanner.close() == []
+
+
+def test_no_objects():
+    assert extract_json_object("") is None
+    assert extract_json_object(None) is None
+    assert extract_json_object("no braces at all") is None
+    assert extract_json_objects("{ unbalanced {{{ ") == []
+
+
+def test_adversarial_input_stays_linear():
+    import time
+
+    text = "{" * 20_000 + '"' + "}" * 20_000
+    started = time.perf_counter()
+    extract_json_objects(text)
+    assert time.perf_counter() - started < 2.0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,84 @@
+"""Checks for upload type sniffing, size limits and spooling."""
+import asyncio
+import hashlib
+import io
+
+from fastapi import HTTPException, UploadFile
+
+from utils import uploads
+from utils.uploads import IMAGE_TYPES, read_upload, sniff_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def _read(data: bytes, max_bytes: int = 1024 * 1024, allowed=IMAGE_TYPES, size: int | None = None):
+    upload = UploadFile(io.BytesIO(data), filename="upload.bin", size=size)
+    return asyncio.run(read_upload(upload, max_bytes, allowed))
+
+
+def _status(data: bytes, **kwargs) -> int:
+    try:
+        _read(data, **kwargs).close()
+    except HTTPException as exc:
+        return exc.status_code
+    return 200
+
+
+def test_sniff_type_uses_magic_bytes():
+    assert sniff_type(PNG) == "image/png"
+    assert sniff_type(b"\xff\xd8\xff\xe0" + b"\x00" * 16) == "image/jpeg"
+    assert sniff_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_type(b"GIF89a" + b"\x00" * 8) == "image/gif"
+    assert sniff_type(b"BM" + b"\x00" * 30) == "image/bmp"
+    assert sniff_type(b"BM short") is None
+    assert sniff_type(b"II*\x00" + b"\x00" * 8) == "image/tiff"
+    assert sniff_type(b"junk\n%PDF-1.7") == "application/pdf"
+    assert sniff_type(b"<html>%PDF-".rjust(2000)) is None  # marker beyond the first KB
+    assert sniff_type(b"") is None
+    assert sniff_type(b"\x89PNG") is None
+
+
+def test_declared_type_is_ignored():
+    assert _status(b"<?php echo 1; ?>" * 10) == 400
+    assert _status(b"%PDF-1.4 document", allowed=uploads.DOCUMENT_TYPES) == 200
+    assert _status(b"%PDF-1.4 document", allowed=IMAGE_TYPES) == 400
+    assert _status(b"") == 400
+
+
+def test_size_limits():
+    assert _status(PNG, max_bytes=len(PNG)) == 200
+    assert _status(PNG, max_bytes=len(PNG) - 1) == 413
+    assert _status(PNG, max_bytes=len(PNG), size=len(PNG) + 1) == 413  # rejected before reading
+    big = PNG + b"\x00" * (3 * uploads.READ_CHUNK_BYTES)
+    assert _status(big, max_bytes=2 * uploads.READ_CHUNK_BYTES) == 413  # while streaming
+
+
+def test_small_upload_stays_in_memory():
+    with _read(PNG) as upload:
+        assert not upload.spooled_to_disk
+        assert upload.content_type == "image/png"
+        assert upload.size == len(PNG) and upload.to_bytes() == PNG
+        assert upload.sha256 == hashlib.sha256(PNG).hexdigest()
+
+
+def test_large_upload_is_spooled():
+    data = PNG + bytes(range(256)) * 8 * 1024  # ~2 MB, several read chunks
+    spool_bytes, uploads.SPOOL_BYTES = uploads.SPOOL_BYTES, 256 * 1024
+    try:
+        upload = _read(data, max_bytes=len(data))
+    finally:
+        uploads.SPOOL_BYTES = spool_bytes
+    with upload:
+        assert upload.spooled_to_disk
+        assert upload.size == len(data) and upload.head == data[: uploads.HEAD_BYTES]
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert upload.to_bytes() == data
+        with upload.open() as stream:
+            assert stream.read() == data
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,90 @@
+"""Checks for compare-and-swap workspace saves against a local blob store."""
+import asyncio
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from services import student_workspace as sw
+from services.blob_store import LocalBlobStore, get_blob_store, set_blob_store
+
+
+def _use_temp_store() -> str:
+    root = tempfile.mkdtemp(prefix="workspace-test-")
+    set_blob_store(LocalBlobStore(root))
+    return root
+
+
+def _add(workspace: sw.StudentWorkspace, text: str) -> None:
+    chunk = {"text": text, "content_hash": sw.content_hash(text), "start": 0, "end": len(text), "page": 1}
+    vector = np.random.default_rng(len(text)).random((1, sw.EMBEDDING_DIM), dtype=np.float32)
+    workspace.add_document({"doc_id": text, "filename": f"{text}.txt"}, [chunk], vector)
+
+
+def _save(workspace: sw.StudentWorkspace) -> None:
+    asyncio.run(sw.save_workspace(workspace))
+
+
+def _claims(workspace_id: str) -> list[int]:
+    return [rev for rev in range(1, 20) if get_blob_store().get(sw._claim_key(workspace_id, rev)) is not None]
+
+
+def test_stale_copy_cannot_overwrite_newer_save():
+    _use_temp_store()
+    first = sw.StudentWorkspace("cas")
+    _add(first, "alpha")
+    _save(first)
+    assert first.revision == 1
+
+    mine, theirs = sw._load_from_blobs("cas"), sw._load_from_blobs("cas")
+    _add(theirs, "beta")
+    _save(theirs)
+    assert theirs.revision == 2
+
+    _add(mine, "gamma")
+    try:
+        _save(mine)
+    except sw.WorkspaceConflict:
+        pass
+    else:
+        raise AssertionError("a stale copy overwrote a newer revision")
+    stored = sw._load_from_blobs("cas")
+    assert stored.revision == 2
+    assert [d["doc_id"] for d in stored.documents] == ["alpha", "beta"]
+
+
+def test_live_foreign_claim_blocks_save():
+    _use_temp_store()
+    workspace = sw.StudentWorkspace("claimed")
+    _save(workspace)
+    claim = {"owner": "another-instance", "at": time.time()}
+    get_blob_store().put(sw._claim_key("claimed", 2), json.dumps(claim).encode("utf-8"))
+    _add(workspace, "delta")
+    try:
+        _save(workspace)
+    except sw.WorkspaceConflict:
+        pass
+    else:
+        raise AssertionError("saved over a revision another instance is writing")
+    assert sw._stored_revision("claimed") == 1
+
+
+def test_abandoned_claim_is_skipped_and_old_claims_pruned():
+    _use_temp_store()
+    workspace = sw.StudentWorkspace("abandoned")
+    _save(workspace)
+    claim = {"owner": "dead-instance", "at": time.time() - sw.CLAIM_TIMEOUT_SECONDS - 1}
+    get_blob_store().put(sw._claim_key("abandoned", 2), json.dumps(claim).encode("utf-8"))
+    for text in ("one", "two", "three"):
+        _add(workspace, text)
+        _save(workspace)
+    assert workspace.revision == sw._stored_revision("abandoned") == 5
+    assert _claims("abandoned") == [4, 5]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
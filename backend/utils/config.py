@@ -25,13 +25,27 @@ HUGGINGFACE_EMBEDDING_URL = (
 )
 
 # ── Limits & Defaults ────────────────────────────────────────────────────────
-MAX_INPUT_CHARS = 5000          # Max characters accepted from user
-LLM_MAX_TOKENS = 1024           # Max tokens for LLM generation
+MAX_INPUT_TOKENS = 1200         # Max news tokens sent to the LLMs
+EVIDENCE_MAX_TOKENS = 600       # Token budget for the explanation evidence block
 LLM_TEMPERATURE = 0.2           # Low temperature for deterministic output
 EMBEDDING_DIM = 384             # Dimension of all-MiniLM-L6-v2 embeddings
 TOP_K_RESULTS = 5               # Number of similar articles to retrieve
 EMBEDDING_CACHE_SIZE = 512      # LRU cache size for embeddings
 
+# ── Generation profiles ───────────────────────────────────────────────────────
+# max_tokens caps generation and stop sequences cut trailing text; both calls
+# also stop streaming as soon as a complete JSON object with the keys arrives.
+CLASSIFICATION_PROFILE = {
+    "max_tokens": 160,
+    "stop": ["\n\nNews to analyze:"],
+    "json_keys": ("label",),
+}
+EXPLANATION_PROFILE = {
+    "max_tokens": 600,
+    "stop": ["\n\nNews:"],
+    "json_keys": ("detailed_explanation",),
+}
+
 # ── Trusted Knowledge-Base seed articles ──────────────────────────────────────
 SEED_ARTICLES = [
     {
@@ -0,0 +1,145 @@
+"""
+RealityCheck AI — JSON Extraction
+Finds JSON objects embedded in free-form LLM output in a single linear pass.
+
+The scanner tracks brace depth and string/escape state, so braces inside
+string values are ignored, and it can be fed a token stream incrementally:
+each complete top-level object is parsed the moment its closing brace
+arrives. Every character is scanned once and every candidate is handed to
+``json.loads`` at most once, so malformed or adversarial output cannot
+trigger the quadratic backtracking of greedy ``\\{.*\\}`` regexes.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+
+_SPECIAL = re.compile(r'[{}"\\]')
+_OBJECT_START = re.compile(r'\{\s*["}]')  # cheap test before calling json.loads
+
+
+class JSONObjectScanner:
+    """
+    Incremental extractor of JSON objects from arbitrary text.
+
+    ``feed`` returns the objects completed by the new text. When a balanced
+    top-level span is not valid JSON, its innermost objects are tried
+    instead; ``close`` does the same for objects left inside an unclosed
+    brace at end of input.
+    """
+
+    def __init__(self):
+        self._pieces: list[str] = []
+        self._base = 0  # absolute offset of the first retained piece
+        self._length = 0  # absolute offset just past the last fed character
+        self._stack: list[list] = []  # open braces: [start, has_children]
+        self._closed: list[tuple[int, int, int, int]] = []  # (start, end, depth, parent_start)
+        self._flat: list[tuple[int, int]] = []  # closed spans without nested objects
+        self._in_string = False
+        self._escaped = -1  # offset of a character escaped by a backslash
+
+    def _text(self, start: int, end: int) -> str:
+        buffer = "".join(self._pieces)
+        self._pieces = [buffer]
+        return buffer[start - self._base : end - self._base]
+
+    def _parse(self, spans: list[tuple[int, int]]) -> list[dict]:
+        objects = []
+        for start, end in spans:
+            candidate = self._text(start, end)
+            if not _OBJECT_START.match(candidate):
+                continue
+            try:
+                value = json.loads(candidate)
+            except (json.JSONDecodeError, RecursionError):
+                continue
+            if isinstance(value, dict):
+                objects.append(value)
+        return objects
+
+    def _reset_spans(self) -> None:
+        self._closed = []
+        self._flat = []
+
+    def feed(self, text: str) -> list[dict]:
+        offset = self._length
+        self._length += len(text)
+        if self._stack:
+            self._pieces.append(text)
+
+        completed: list[dict] = []
+        for match in _SPECIAL.finditer(text):
+            pos = offset + match.start()
+            if pos == self._escaped:
+                continue
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    self._escaped = pos + 1  # may fall in the next fed piece
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == "{":
+                if self._stack:
+                    self._stack[-1][1] = True
+                else:
+                    # Earlier text can no longer be part of an object.
+                    self._reset_spans()
+                    self._pieces = [text]
+                    self._base = offset
+                self._stack.append([pos, False])
+            elif not self._stack:
+                continue  # quotes and stray braces in surrounding prose
+            elif char == '"':
+                self._in_string = True
+            elif char == "}":
+                start, has_children = self._stack.pop()
+                end = pos + 1
+                if not has_children:
+                    self._flat.append((start, end))
+                if self._stack:
+                    self._closed.append((start, end, len(self._stack), self._stack[-1][0]))
+                    continue
+                objects = self._parse([(start, end)])
+                if not objects and has_children:
+                    objects = self._parse(self._flat)
+                completed.extend(objects)
+                self._reset_spans()
+        if not self._stack:
+            self._pieces = []
+        return completed
+
+    def close(self) -> list[dict]:
+        """Flush objects nested inside braces that were never closed."""
+        if not self._stack:
+            return []
+        open_starts = [entry[0] for entry in self._stack]
+        maximal = [
+            (start, end)
+            for start, end, depth, parent in self._closed
+            if depth <= len(open_starts) and open_starts[depth - 1] == parent
+        ]
+        objects = self._parse(maximal) or self._parse(self._flat)
+        self._stack = []
+        self._in_string = False
+        self._pieces = []
+        self._reset_spans()
+        return objects
+
+
+def extract_json_objects(text: str) -> list[dict]:
+    """All JSON objects found in ``text``, in order of appearance."""
+    scanner = JSONObjectScanner()
+    return scanner.feed(text or "") + scanner.close()
+
+
+def extract_json_object(text: str) -> dict | None:
+    """The first JSON object found in ``text``, or None."""
+    scanner = JSONObjectScanner()
+    objects = scanner.feed(text or "")
+    if objects:
+        return objects[0]
+    objects = scanner.close()
+    return objects[0] if objects else None
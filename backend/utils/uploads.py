@@ -0,0 +1,183 @@
+"""
+RealityCheck AI — Upload Reader
+Bounded, streaming reads of multipart uploads, shared by every endpoint that
+accepts a file.
+
+The first chunk is sniffed for the real file type (magic bytes, not the
+client's Content-Type), so invalid uploads are rejected before the rest is
+read, and reading stops as soon as the endpoint's byte limit is exceeded.
+Small files stay in memory; larger ones are spooled to a temporary file and
+exposed as a read-only memory map, so per-request memory stays bounded. The
+SHA-256 of the content is computed while streaming.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from typing import BinaryIO, Collection
+
+from fastapi import HTTPException, UploadFile
+
+READ_CHUNK_BYTES = 256 * 1024
+HEAD_BYTES = 64 * 1024  # kept in memory for sniffing and header-only metadata scans
+SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+MAX_DOCUMENT_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_DOCUMENT_BYTES", str(25 * 1024 * 1024)))
+
+IMAGE_TYPES = frozenset({"image/png", "image/jpeg", "image/webp", "image/gif", "image/bmp", "image/tiff"})
+OCR_IMAGE_TYPES = frozenset({"image/png", "image/jpeg", "image/webp", "image/bmp"})
+DOCUMENT_TYPES = OCR_IMAGE_TYPES | {"application/pdf"}
+
+
+def sniff_type(head: bytes) -> str | None:
+    """MIME type from a file's leading bytes, or None if unrecognized."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:2] == b"BM" and len(head) >= 26:
+        return "image/bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if b"%PDF-" in head[:1024]:  # readers tolerate leading junk before the header
+        return "application/pdf"
+    return None
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    limit = f"{max_bytes / (1024 * 1024):.3g} MB" if max_bytes >= 1024 * 1024 else f"{max_bytes // 1024} KB"
+    return HTTPException(status_code=413, detail=f"File too large. Maximum size is {limit}.")
+
+
+class Upload:
+    """
+    A fully received, validated upload.
+
+    ``data`` is ``bytes`` for small files and a read-only ``mmap`` for spooled
+    ones; both support ``len`` and slicing. ``open()`` returns an independent
+    binary stream. Call ``close()`` (or use ``with``) to release the spool.
+    """
+
+    def __init__(self, filename: str, content_type: str, head: bytes, size: int, sha256: str):
+        self.filename = filename
+        self.content_type = content_type
+        self.head = head
+        self.size = size
+        self.sha256 = sha256
+        self.data: bytes | mmap.mmap = b""
+        self._path: str | None = None
+        self._handle: BinaryIO | None = None
+
+    @classmethod
+    def in_memory(cls, filename: str, content_type: str, content: bytes, sha256: str) -> "Upload":
+        upload = cls(filename, content_type, content[:HEAD_BYTES], len(content), sha256)
+        upload.data = content
+        return upload
+
+    @classmethod
+    def spooled(cls, filename: str, content_type: str, head: bytes, size: int, sha256: str, path: str) -> "Upload":
+        upload = cls(filename, content_type, head, size, sha256)
+        upload._path = path
+        upload._handle = open(path, "rb")
+        upload.data = mmap.mmap(upload._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return upload
+
+    @property
+    def spooled_to_disk(self) -> bool:
+        return self._path is not None
+
+    def open(self) -> BinaryIO:
+        if self._path is not None:
+            return open(self._path, "rb")
+        return io.BytesIO(self.data)
+
+    def to_bytes(self) -> bytes:
+        """The content as ``bytes`` (a copy only for spooled uploads)."""
+        return self.data if isinstance(self.data, bytes) else self.data[:]
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def __enter__(self) -> "Upload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+async def read_upload(
+    file: UploadFile,
+    max_bytes: int,
+    allowed_types: Collection[str],
+    unsupported_detail: str = "Unsupported file type.",
+) -> Upload:
+    """
+    Stream ``file`` into an Upload, enforcing ``max_bytes`` and the sniffed
+    type. Raises HTTPException 400 (missing, empty or wrong type) or 413.
+    """
+    if file is None:
+        raise HTTPException(status_code=400, detail="No file uploaded.")
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise _too_large(max_bytes)
+
+    first = await file.read(READ_CHUNK_BYTES)
+    if not first:
+        raise HTTPException(status_code=400, detail="Empty file uploaded.")
+    content_type = sniff_type(first)
+    if content_type is None or content_type not in allowed_types:
+        raise HTTPException(status_code=400, detail=unsupported_detail)
+    if len(first) > max_bytes:
+        raise _too_large(max_bytes)
+
+    filename = file.filename or ""
+    digest = hashlib.sha256(first)
+    size = len(first)
+    parts = [first]
+    spool = None
+    try:
+        while True:
+            chunk = await file.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            digest.update(chunk)
+            if spool is None and size > SPOOL_BYTES:
+                spool = tempfile.NamedTemporaryFile(prefix="upload-", delete=False)
+                spool.writelines(parts)
+                parts = []
+            if spool is not None:
+                spool.write(chunk)
+            else:
+                parts.append(chunk)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        raise
+
+    if spool is None:
+        return Upload.in_memory(filename, content_type, b"".join(parts), digest.hexdigest())
+    spool.close()
+    return Upload.spooled(filename, content_type, first[:HEAD_BYTES], size, digest.hexdigest(), spool.name)
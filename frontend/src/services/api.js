@@ -71,6 +71,21 @@ export async function healthCheck() {
   return resp.json();
 }
 
+/**
+ * Per-browser Student Assistant workspace id, so uploaded notes are found
+ * again on whichever backend instance serves the next request.
+ */
+export function getStudentWorkspaceId() {
+  const key = 'student-workspace-id';
+  let id = localStorage.getItem(key);
+  if (!id) {
+    const raw = crypto.randomUUID?.() || `${Date.now()}${Math.random().toString(36).slice(2)}`;
+    id = raw.replace(/[^A-Za-z0-9_-]/g, '');
+    localStorage.setItem(key, id);
+  }
+  return id;
+}
+
 export async function uploadStudentNotes(file) {
   if (!file) throw new Error('Please select a file to upload.');
   const formData = new FormData();
@@ -78,7 +93,7 @@ export async function uploadStudentNotes(file) {
 
   const resp = await fetch(`${API_BASE}/student/upload`, {
     method: 'POST',
-    headers: getAuthHeaders(),
+    headers: { ...getAuthHeaders(), 'X-Workspace-Id': getStudentWorkspaceId() },
     body: formData,
   });
 
@@ -90,6 +105,7 @@ export async function askStudentQuestion(question) {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
+      'X-Workspace-Id': getStudentWorkspaceId(),
       ...getAuthHeaders(),
     },
     body: JSON.stringify({ question }),
@@ -98,11 +114,58 @@ export async function askStudentQuestion(question) {
   return parseResponse(resp, 'Question answering failed');
 }
 
+/**
+ * Stream an answer from /student/ask/stream (server-sent events).
+ * Calls onSources(sources) right after retrieval and onToken(text) for each
+ * generated piece; resolves with the final payload from the `done` event.
+ */
+export async function askStudentQuestionStream(question, { onSources, onToken } = {}) {
+  const resp = await fetch(`${API_BASE}/student/ask/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-Workspace-Id': getStudentWorkspaceId(),
+      ...getAuthHeaders(),
+    },
+    body: JSON.stringify({ question }),
+  });
+  if (!resp.ok || !resp.body) {
+    await parseResponse(resp, 'Question answering failed');
+    throw new Error('Streaming is not supported by this browser');
+  }
+
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = block.match(/^event: (.*)$/m)?.[1];
+      const dataLine = block.match(/^data: (.*)$/m)?.[1];
+      if (!event || !dataLine) continue;
+      const data = JSON.parse(dataLine);
+
+      if (event === 'sources') onSources?.(data.sources);
+      else if (event === 'token') onToken?.(data.text);
+      else if (event === 'done') return data;
+      else if (event === 'error') throw new Error(data.message || 'Question answering failed');
+    }
+  }
+  throw new Error('Answer stream ended unexpectedly');
+}
+
 export async function generateStudyTool(mode) {
   const resp = await fetch(`${API_BASE}/student/generate`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
+      'X-Workspace-Id': getStudentWorkspaceId(),
       ...getAuthHeaders(),
     },
     body: JSON.stringify({ mode }),
@@ -1,7 +1,9 @@
 import React, { useMemo, useState } from 'react';
 import {
   askStudentQuestion,
+  askStudentQuestionStream,
   generateStudyTool,
+  getStudentWorkspaceId,
   uploadStudentNotes,
 } from '../services/api';
 import {
@@ -151,6 +153,7 @@ export default function StudentAssistant() {
         }
 
         xhr.open('POST', `${import.meta.env.VITE_API_URL || ''}/student/upload`);
+        xhr.setRequestHeader('X-Workspace-Id', getStudentWorkspaceId());
         if (authHeader) {
           xhr.setRequestHeader('Authorization', `Bearer ${authHeader}`);
         }
@@ -164,10 +167,32 @@ export default function StudentAssistant() {
   const handleAsk = async (e) => {
     e.preventDefault();
     setAskState({ loading: true, data: null, error: '' });
+    const partial = { answer: '', explanation_simple: '', sources: [], confidence: 0 };
+    let streamed = false;
     try {
-      const data = await askStudentQuestion(question.trim());
+      const data = await askStudentQuestionStream(question.trim(), {
+        onSources: (sources) => {
+          streamed = true;
+          partial.sources = sources;
+          setAskState({ loading: true, data: { ...partial }, error: '' });
+        },
+        onToken: (text) => {
+          partial.answer += text;
+          setAskState({ loading: true, data: { ...partial }, error: '' });
+        },
+      });
       setAskState({ loading: false, data, error: '' });
     } catch (err) {
+      if (!streamed) {
+        // Fall back to the blocking endpoint if the stream could not start.
+        try {
+          const data = await askStudentQuestion(question.trim());
+          setAskState({ loading: false, data, error: '' });
+          return;
+        } catch (fallbackErr) {
+          err = fallbackErr;
+        }
+      }
       setAskState({ loading: false, data: null, error: err.message || 'Ask failed.' });
     }
   };